@@ -0,0 +1,34 @@
+"""add_plan_version_and_refinement_status
+
+Revision ID: b7d2e41c9a35
+Revises: aecf5cebd673
+Create Date: 2026-10-19 12:00:00.000000+08:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e41c9a35'
+down_revision = 'aecf5cebd673'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 行程版本号：每次写入加 1，用于乐观锁
+    op.add_column(
+        'travel_plans',
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1')
+    )
+    # 后台 AI 优化状态：pending / done / failed / superseded，未使用草稿模式时为空
+    op.add_column(
+        'travel_plans',
+        sa.Column('refinement_status', sa.String(length=20), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('travel_plans', 'refinement_status')
+    op.drop_column('travel_plans', 'version')
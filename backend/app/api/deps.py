@@ -0,0 +1,179 @@
+"""
+接口公共依赖：登录用户识别与用户资料缓存
+"""
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.security import decode_token
+from app.services.database_service import db
+import ipaddress
+import logging
+import secrets
+import time
+
+logger = logging.getLogger(__name__)
+
+security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# /me 返回的用户资料字段（不含密码哈希）
+PROFILE_FIELDS = ("id", "email", "username", "phone", "avatar", "created_at", "updated_at")
+
+
+def _is_trusted_proxy(host: Optional[str]) -> bool:
+    """连接对端是否为 TRUSTED_PROXIES 中的反向代理"""
+    try:
+        address = ipaddress.ip_address(host or "")
+    except ValueError:
+        return False
+    for proxy in settings.TRUSTED_PROXIES.split(","):
+        try:
+            if proxy.strip() and address in ipaddress.ip_network(proxy.strip(), strict=False):
+                return True
+        except ValueError:
+            logger.warning(f"TRUSTED_PROXIES 中的地址无效: {proxy}")
+    return False
+
+
+def client_ip(request: Request) -> Optional[str]:
+    """
+    客户端 IP
+
+    开启 TRUST_PROXY_HEADERS 且请求来自受信任的代理时，取代理写入的 X-Real-IP；
+    没有时取 X-Forwarded-For 最右边的地址，即受信任代理追加的那一跳。
+    最左边的地址由客户端自己填写，可以伪造，不能用来限流。
+    """
+    peer = request.client.host if request.client else None
+    if settings.TRUST_PROXY_HEADERS and _is_trusted_proxy(peer):
+        real_ip = request.headers.get("x-real-ip")
+        if real_ip:
+            return real_ip.strip()
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[-1].strip()
+    return peer
+
+
+def user_profile(user: Dict[str, Any]) -> Dict[str, Any]:
+    """从用户记录中取出可返回给前端的资料"""
+    return {field: user.get(field) for field in PROFILE_FIELDS}
+
+
+class UserProfileCache:
+    """
+    用户资料缓存
+
+    登录和首次访问 /me 时写入，资料更新时失效，有效期内 /me 不再查询数据库。
+    多进程部署时其他进程最多在 ttl 秒内返回旧资料。
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max(max_entries, 0)
+        self._entries: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(user_id, None)
+            return None
+        self._entries.move_to_end(user_id)
+        return entry[1]
+
+    def put(self, user_id: int, profile: Dict[str, Any]):
+        if self.ttl <= 0 or not self.max_entries:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, profile)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+
+# 创建服务实例
+user_profile_cache = UserProfileCache(settings.AUTH_PROFILE_CACHE_TTL, settings.AUTH_TOKEN_CACHE_SIZE)
+
+
+async def get_current_claims(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
+    """获取当前令牌的 claims"""
+    claims = decode_token(credentials.credentials)
+
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="无效的访问令牌"
+        )
+
+    return claims
+
+
+async def get_current_user_id(claims: Dict[str, Any] = Depends(get_current_claims)) -> int:
+    """获取当前用户ID"""
+    return int(claims["sub"])
+
+
+async def get_optional_user_id(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> Optional[int]:
+    """获取当前用户ID；未登录时返回 None"""
+    if credentials is None:
+        return None
+    claims = decode_token(credentials.credentials)
+    return int(claims["sub"]) if claims is not None else None
+
+
+async def require_metrics_token(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """校验 /metrics 访问令牌；未配置 METRICS_TOKEN 时视为未开放"""
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+
+    if credentials is None or not secrets.compare_digest(
+        credentials.credentials.encode("utf-8"), settings.METRICS_TOKEN.encode("utf-8")
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="无效的指标访问令牌"
+        )
+
+
+async def get_current_user_profile(user_id: int = Depends(get_current_user_id)) -> Dict[str, Any]:
+    """获取当前用户资料，优先使用缓存"""
+    profile = user_profile_cache.get(user_id)
+    if profile is not None:
+        return profile
+
+    # 检查数据库服务
+    if not db.is_enabled():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="数据库服务不可用"
+        )
+
+    try:
+        user = await db.get_user_by_id(user_id)
+    except Exception as e:
+        logger.error(f"获取用户信息失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取用户信息失败: {str(e)}"
+        )
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="用户不存在"
+        )
+
+    profile = user_profile(user)
+    user_profile_cache.put(user_id, profile)
+    return profile
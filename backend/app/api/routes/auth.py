@@ -3,11 +3,26 @@
 使用 Supabase 作为数据存储，保留 JWT 认证
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from app.core.security import create_access_token, verify_password, get_password_hash, verify_token
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile, status
+from app.core.security import (
+    create_access_token,
+    verify_password_async,
+    verify_and_update_password_async,
+    get_password_hash_async,
+    PasswordHashBusyError,
+)
+from app.api.deps import (
+    client_ip,
+    get_current_user_id,
+    get_current_user_profile,
+    user_profile,
+    user_profile_cache,
+)
 from app.schemas.user import UserCreate, UserLogin, UserResponse, Token
-from app.services.database_service import db
+from app.services.database_service import db, DuplicateValueError
+from app.services.login_throttle_service import login_throttle
+from app.services.user_index_service import user_index
+from app.services.avatar_service import avatar_service, AvatarError
 from datetime import timedelta
 from app.core.config import settings
 import logging
@@ -15,7 +30,61 @@ import logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-security = HTTPBearer()
+
+
+def _hash_busy(e: PasswordHashBusyError) -> HTTPException:
+    """密码哈希线程池排队已满时返回 503，并提示重试时间"""
+    logger.warning(f"密码哈希排队已满，建议 {e.retry_after} 秒后重试")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+# 唯一约束冲突字段对应的提示
+DUPLICATE_MESSAGES = {
+    "email": "邮箱已被注册",
+    "username": "用户名已被占用",
+}
+
+
+def _duplicate(e: DuplicateValueError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=DUPLICATE_MESSAGES.get(e.field, "邮箱或用户名已被占用")
+    )
+
+
+@router.get("/availability")
+async def check_availability(username: str = Query(..., min_length=1, max_length=50)):
+    """
+    检查用户名是否可用（供注册页实时提示，最终以注册结果为准）
+
+    接口无需登录，只回答用户名；邮箱是否已注册不在这里提供，避免被用来枚举已注册邮箱
+    """
+    
+    # 检查数据库服务
+    if not db.is_enabled():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="数据库服务不可用"
+        )
+    
+    try:
+        return {
+            "code": 200,
+            "message": "success",
+            "data": {
+                "username": await user_index.is_available("username", username)
+            }
+        }
+    except Exception as e:
+        logger.error(f"检查用户名失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"检查失败: {str(e)}"
+        )
 
 
 @router.post("/register", response_model=dict)
@@ -30,30 +99,24 @@ async def register(user_data: UserCreate):
         )
     
     try:
-        # 检查邮箱是否已存在
-        existing_user = await db.get_user_by_email(user_data.email)
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="邮箱已被注册"
-            )
-        
-        # 检查用户名是否已存在
-        existing_username = await db.get_user_by_username(user_data.username)
-        if existing_username:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="用户名已被占用"
-            )
+        # 布隆过滤器命中时先查库确认，避免为注定冲突的注册计算密码哈希；
+        # 未命中时直接写入，重复与否以数据库唯一约束为准
+        for column, value in (("email", user_data.email), ("username", user_data.username)):
+            if not await user_index.is_available(column, value):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=DUPLICATE_MESSAGES[column]
+                )
         
         # 创建新用户
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await get_password_hash_async(user_data.password)
         new_user = await db.create_user(
             email=user_data.email,
             username=user_data.username,
             hashed_password=hashed_password,
             phone=user_data.phone
         )
+        user_index.add(email=new_user['email'], username=new_user['username'])
         
         logger.info(f"用户注册成功: {new_user['email']}")
         
@@ -65,6 +128,10 @@ async def register(user_data: UserCreate):
         
     except HTTPException:
         raise
+    except DuplicateValueError as e:
+        raise _duplicate(e)
+    except PasswordHashBusyError as e:
+        raise _hash_busy(e)
     except Exception as e:
         logger.error(f"注册失败: {str(e)}")
         raise HTTPException(
@@ -74,7 +141,7 @@ async def register(user_data: UserCreate):
 
 
 @router.post("/login", response_model=Token)
-async def login(user_data: UserLogin):
+async def login(user_data: UserLogin, request: Request):
     """用户登录"""
     
     # 检查数据库服务
@@ -84,21 +151,52 @@ async def login(user_data: UserLogin):
             detail="数据库服务不可用"
         )
     
+    # 失败次数过多时在查库和验证密码之前直接拒绝
+    ip = client_ip(request)
+    retry_after = await login_throttle.check(ip, user_data.email)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"登录失败次数过多，请 {retry_after} 秒后再试",
+            headers={"Retry-After": str(retry_after)}
+        )
+    
     try:
         # 查找用户
-        user = await db.get_user_by_email(user_data.email)
+        user = await db.get_user_by_email(user_data.email, with_password=True)
         
-        if not user or not verify_password(user_data.password, user['hashed_password']):
+        if not user:
+            await login_throttle.record_failure(ip, user_data.email)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="邮箱或密码错误"
             )
         
+        verified, new_hash = await verify_and_update_password_async(user_data.password, user['hashed_password'])
+        if not verified:
+            await login_throttle.record_failure(ip, user_data.email)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="邮箱或密码错误"
+            )
+        await login_throttle.record_success(user_data.email)
+        
+        # 哈希轮数与当前配置不一致时，用本次登录的明文密码透明升级
+        if new_hash:
+            try:
+                await db.update_user(user['id'], {"hashed_password": new_hash})
+                logger.info(f"用户 {user['id']} 的密码哈希已按当前参数更新")
+            except Exception as e:
+                logger.warning(f"更新密码哈希失败，下次登录时重试: {str(e)}")
+        
         # 创建访问令牌
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            subject=user['id'], expires_delta=access_token_expires
+            subject=user['id'],
+            expires_delta=access_token_expires
         )
+        profile = user_profile(user)
+        user_profile_cache.put(user['id'], profile)
         
         logger.info(f"用户登录成功: {user['email']}")
         
@@ -108,20 +206,14 @@ async def login(user_data: UserLogin):
             "data": {
                 "token": access_token,
                 "token_type": "bearer",
-                "user": {
-                    "id": user['id'],
-                    "email": user['email'],
-                    "username": user['username'],
-                    "phone": user.get('phone'),
-                    "avatar": user.get('avatar'),
-                    "created_at": user['created_at'],
-                    "updated_at": user['updated_at']
-                }
+                "user": profile
             }
         }
         
     except HTTPException:
         raise
+    except PasswordHashBusyError as e:
+        raise _hash_busy(e)
     except Exception as e:
         logger.error(f"登录失败: {str(e)}")
         raise HTTPException(
@@ -131,10 +223,21 @@ async def login(user_data: UserLogin):
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+async def get_current_user(profile: dict = Depends(get_current_user_profile)):
+    """获取当前用户信息（令牌与资料均有缓存，命中时不访问数据库）"""
+    return {
+        "code": 200,
+        "message": "获取成功",
+        "data": profile
+    }
+
+
+@router.put("/update", response_model=UserResponse)
+async def update_user_info(
+    update_data: dict,
+    user_id: int = Depends(get_current_user_id)
 ):
-    """获取当前用户信息"""
+    """更新用户信息"""
     
     # 检查数据库服务
     if not db.is_enabled():
@@ -144,55 +247,59 @@ async def get_current_user(
         )
     
     try:
-        # 验证令牌
-        token = credentials.credentials
-        user_id = verify_token(token)
+        # 允许更新的字段
+        allowed_fields = ['username', 'phone', 'avatar']
+        filtered_data = {k: v for k, v in update_data.items() if k in allowed_fields}
         
-        if user_id is None:
+        if not filtered_data:
             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="无效的访问令牌"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="没有可更新的字段"
             )
         
-        # 获取用户信息
-        user = await db.get_user_by_id(int(user_id))
+        # base64 头像转存为图片文件，数据库只保存 URL
+        if 'avatar' in filtered_data:
+            filtered_data['avatar'] = await avatar_service.normalize(filtered_data['avatar'])
         
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="用户不存在"
-            )
+        # 更新用户信息，用户名重复由数据库唯一约束拒绝
+        updated_user = await db.update_user(user_id, filtered_data)
+        if 'username' in filtered_data:
+            user_index.add(username=updated_user['username'])
+        
+        profile = user_profile(updated_user)
+        user_profile_cache.put(user_id, profile)
+        
+        logger.info(f"用户信息更新成功: {user_id}")
         
         return {
             "code": 200,
-            "message": "获取成功",
-            "data": {
-                "id": user['id'],
-                "email": user['email'],
-                "username": user['username'],
-                "phone": user.get('phone'),
-                "avatar": user.get('avatar'),
-                "created_at": user['created_at'],
-                "updated_at": user['updated_at']
-            }
+            "message": "更新成功",
+            "data": profile
         }
         
     except HTTPException:
         raise
+    except DuplicateValueError as e:
+        raise _duplicate(e)
+    except AvatarError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
-        logger.error(f"获取用户信息失败: {str(e)}")
+        logger.error(f"更新用户信息失败: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"获取用户信息失败: {str(e)}"
+            detail=f"更新失败: {str(e)}"
         )
 
 
-@router.put("/update", response_model=UserResponse)
-async def update_user_info(
-    update_data: dict,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+@router.post("/avatar", response_model=UserResponse)
+async def upload_avatar(
+    file: UploadFile = File(...),
+    user_id: int = Depends(get_current_user_id)
 ):
-    """更新用户信息"""
+    """上传头像：按内容哈希存储并生成缩略图，用户记录只保存图片 URL"""
     
     # 检查数据库服务
     if not db.is_enabled():
@@ -202,68 +309,46 @@ async def update_user_info(
         )
     
     try:
-        # 验证令牌
-        token = credentials.credentials
-        user_id = verify_token(token)
-        
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="无效的访问令牌"
-            )
-        
-        # 允许更新的字段
-        allowed_fields = ['username', 'phone', 'avatar']
-        filtered_data = {k: v for k, v in update_data.items() if k in allowed_fields}
-        
-        if not filtered_data:
+        data = await file.read(settings.AVATAR_MAX_BYTES + 1)
+        if not data:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="没有可更新的字段"
+                detail="头像文件为空"
             )
         
-        # 如果要更新用户名，检查是否已存在
-        if 'username' in filtered_data:
-            existing_user = await db.get_user_by_username(filtered_data['username'])
-            if existing_user and existing_user['id'] != int(user_id):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="用户名已被占用"
-                )
+        avatar_url, _ = await avatar_service.store(data)
+        updated_user = await db.update_user(user_id, {"avatar": avatar_url})
         
-        # 更新用户信息
-        updated_user = await db.update_user(int(user_id), filtered_data)
+        profile = user_profile(updated_user)
+        user_profile_cache.put(user_id, profile)
         
-        logger.info(f"用户信息更新成功: {user_id}")
+        logger.info(f"用户头像更新成功: {user_id}")
         
         return {
             "code": 200,
-            "message": "更新成功",
-            "data": {
-                "id": updated_user['id'],
-                "email": updated_user['email'],
-                "username": updated_user['username'],
-                "phone": updated_user.get('phone'),
-                "avatar": updated_user.get('avatar'),
-                "created_at": updated_user['created_at'],
-                "updated_at": updated_user['updated_at']
-            }
+            "message": "头像上传成功",
+            "data": profile
         }
         
     except HTTPException:
         raise
+    except AvatarError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
-        logger.error(f"更新用户信息失败: {str(e)}")
+        logger.error(f"上传头像失败: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"更新失败: {str(e)}"
+            detail=f"上传头像失败: {str(e)}"
         )
 
 
 @router.put("/change-password")
 async def change_password(
     password_data: dict,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    user_id: int = Depends(get_current_user_id)
 ):
     """修改密码"""
     
@@ -275,16 +360,6 @@ async def change_password(
         )
     
     try:
-        # 验证令牌
-        token = credentials.credentials
-        user_id = verify_token(token)
-        
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="无效的访问令牌"
-            )
-        
         # 获取旧密码和新密码
         old_password = password_data.get('old_password')
         new_password = password_data.get('new_password')
@@ -296,7 +371,7 @@ async def change_password(
             )
         
         # 获取用户信息
-        user = await db.get_user_by_id(int(user_id))
+        user = await db.get_user_by_id(user_id, with_password=True)
         
         if not user:
             raise HTTPException(
@@ -305,15 +380,16 @@ async def change_password(
             )
         
         # 验证旧密码
-        if not verify_password(old_password, user['hashed_password']):
+        if not await verify_password_async(old_password, user['hashed_password']):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="旧密码错误"
             )
         
         # 更新密码
-        new_hashed_password = get_password_hash(new_password)
-        await db.update_user(int(user_id), {"hashed_password": new_hashed_password})
+        new_hashed_password = await get_password_hash_async(new_password)
+        await db.update_user(user_id, {"hashed_password": new_hashed_password})
+        user_profile_cache.invalidate(user_id)
         
         logger.info(f"用户密码修改成功: {user_id}")
         
@@ -325,6 +401,8 @@ async def change_password(
         
     except HTTPException:
         raise
+    except PasswordHashBusyError as e:
+        raise _hash_busy(e)
     except Exception as e:
         logger.error(f"修改密码失败: {str(e)}")
         raise HTTPException(
@@ -4,13 +4,13 @@
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List, Optional
 from decimal import Decimal
-from app.core.security import verify_token
+from app.api.deps import get_current_user_id
 from app.services.database_service import db
 from app.schemas.expense import (
     ExpenseCreate,
+    ExpenseBatchCreate,
     ExpenseUpdate,
     ExpenseResponse,
     ExpenseListResponse,
@@ -23,21 +23,17 @@ import logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-security = HTTPBearer()
 
 
-async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
-    """获取当前用户ID"""
-    token = credentials.credentials
-    user_id = verify_token(token)
-    
-    if user_id is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的访问令牌"
-        )
-    
-    return int(user_id)
+def _expense_insert_data(expense_data: ExpenseCreate) -> dict:
+    """把请求模型转换为数据库写入数据"""
+    return {
+        "travel_plan_id": expense_data.travel_plan_id,
+        "category": expense_data.category,
+        "amount": float(expense_data.amount),
+        "description": expense_data.description,
+        "expense_date": expense_data.expense_date.isoformat() if isinstance(expense_data.expense_date, date) else expense_data.expense_date
+    }
 
 
 @router.post("/", response_model=ExpenseDetailResponse)
@@ -64,17 +60,8 @@ async def create_expense(
                     detail="行程不存在或无权限访问"
                 )
         
-        # 准备数据
-        expense_dict = {
-            "travel_plan_id": expense_data.travel_plan_id,
-            "category": expense_data.category,
-            "amount": float(expense_data.amount),
-            "description": expense_data.description,
-            "expense_date": expense_data.expense_date.isoformat() if isinstance(expense_data.expense_date, date) else expense_data.expense_date
-        }
-        
         # 创建费用记录
-        expense = await db.create_expense(current_user_id, expense_dict)
+        expense = await db.create_expense(current_user_id, _expense_insert_data(expense_data))
         
         logger.info(f"创建费用记录成功: {expense['id']}")
         
@@ -94,6 +81,53 @@ async def create_expense(
         )
 
 
+@router.post("/batch", response_model=ExpenseListResponse)
+async def create_expenses_batch(
+    batch_data: ExpenseBatchCreate,
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """批量创建费用记录（例如语音批量记账确认后一次写入）"""
+    
+    # 检查数据库服务
+    if not db.is_enabled():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="数据库服务不可用"
+        )
+    
+    try:
+        # 每个涉及的行程只验证一次
+        for travel_plan_id in {e.travel_plan_id for e in batch_data.expenses}:
+            travel_plan = await db.get_travel_plan_by_id(travel_plan_id, current_user_id)
+            if not travel_plan:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"行程 {travel_plan_id} 不存在或无权限访问"
+                )
+        
+        expenses = await db.create_expenses(
+            current_user_id,
+            [_expense_insert_data(e) for e in batch_data.expenses]
+        )
+        
+        logger.info(f"批量创建费用记录成功，共 {len(expenses)} 条")
+        
+        return {
+            "code": 200,
+            "message": "费用记录批量创建成功",
+            "data": expenses
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批量创建费用记录失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量创建费用记录失败: {str(e)}"
+        )
+
+
 @router.get("/travel-plan/{travel_plan_id}", response_model=ExpenseListResponse)
 async def get_expenses_by_travel_plan(
     travel_plan_id: int,
@@ -3,10 +3,10 @@
 使用 Supabase 作为数据存储
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from typing import List, Optional
-from app.core.security import verify_token
+from app.api.deps import get_current_user_id
+from app.core.responses import raw_json_response
 from app.services.database_service import db
 from app.schemas.travel_plan import (
     TravelPlanCreate, 
@@ -14,30 +14,16 @@ from app.schemas.travel_plan import (
     TravelPlanResponse,
     TravelPlanListResponse,
     TravelPlanDetailResponse,
-    TravelPlanGenerateRequest
+    TravelPlanGenerateRequest,
+    ItineraryRegenerateRequest
 )
-from app.services.ai_travel_service import ai_travel_service
+from app.services.ai_travel_service import AIServiceUnavailableError, ai_travel_service
 from datetime import datetime, date
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-security = HTTPBearer()
-
-
-async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
-    """获取当前用户ID"""
-    token = credentials.credentials
-    user_id = verify_token(token)
-    
-    if user_id is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的访问令牌"
-        )
-    
-    return int(user_id)
 
 
 @router.get("/", response_model=TravelPlanListResponse)
@@ -60,11 +46,7 @@ async def get_travel_plans(
         
         logger.info(f"获取用户 {current_user_id} 的行程列表成功，共 {len(travel_plans)} 条")
         
-        return {
-            "code": 200,
-            "message": "获取成功",
-            "data": travel_plans
-        }
+        return raw_json_response(travel_plans, "获取成功")
         
     except Exception as e:
         logger.error(f"获取行程列表失败: {str(e)}")
@@ -100,11 +82,7 @@ async def get_travel_plan(
         
         logger.info(f"获取行程 {plan_id} 详情成功")
         
-        return {
-            "code": 200,
-            "message": "获取成功",
-            "data": travel_plan
-        }
+        return raw_json_response(travel_plan, "获取成功")
         
     except HTTPException:
         raise
@@ -155,11 +133,7 @@ async def create_travel_plan(
         
         logger.info(f"创建行程成功: {travel_plan['id']}")
         
-        return {
-            "code": 200,
-            "message": "创建成功",
-            "data": travel_plan
-        }
+        return raw_json_response(travel_plan, "创建成功")
         
     except HTTPException:
         raise
@@ -171,9 +145,54 @@ async def create_travel_plan(
         )
 
 
+async def _refine_draft_plan(plan_id: int, user_id: int, version: int, request: TravelPlanGenerateRequest):
+    """
+    后台调用AI优化草稿行程
+    
+    只有行程版本号仍是草稿创建时的 version 才替换草稿；期间用户修改过行程（包括重新生成某天/活动）
+    则放弃优化结果，保留用户的修改。结果记录在 refinement_status 中，前端据此判断是否需要刷新。
+    """
+    try:
+        ai_result = await ai_travel_service.generate_travel_plan(
+            destination=request.destination,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            budget=float(request.budget),
+            people_count=request.people_count,
+            preferences=request.preferences,
+            special_requirements=request.special_requirements,
+            user_id=user_id
+        )
+        
+        if not ai_result.get("ai_generated"):
+            logger.info(f"行程 {plan_id} AI 优化未成功，保留草稿")
+            await db.update_travel_plan(plan_id, user_id, {"refinement_status": "failed"})
+            return
+        
+        updated = await db.update_travel_plan(plan_id, user_id, {
+            "itinerary": ai_result.get("itinerary", []),
+            "total_cost": ai_result.get("estimated_cost", 0),
+            "refinement_status": "done"
+        }, expected_version=version)
+        
+        if updated is None:
+            logger.info(f"行程 {plan_id} 在优化期间已被修改，放弃AI优化结果")
+            await db.update_travel_plan(plan_id, user_id, {"refinement_status": "superseded"})
+            return
+        logger.info(f"行程 {plan_id} 已替换为AI优化版本")
+        
+    except Exception as e:
+        logger.error(f"后台优化行程 {plan_id} 失败: {str(e)}")
+        try:
+            await db.update_travel_plan(plan_id, user_id, {"refinement_status": "failed"})
+        except Exception as status_error:
+            logger.warning(f"记录行程 {plan_id} 优化状态失败: {str(status_error)}")
+
+
 @router.post("/generate", response_model=TravelPlanDetailResponse)
 async def generate_travel_plan(
     request: TravelPlanGenerateRequest,
+    background_tasks: BackgroundTasks,
     current_user_id: int = Depends(get_current_user_id)
 ):
     """AI生成行程规划"""
@@ -197,18 +216,30 @@ async def generate_travel_plan(
                 detail="结束日期不能早于开始日期"
             )
         
-        # 调用AI服务生成行程
-        logger.info(f"开始生成AI行程: {request.destination}")
-        
-        ai_result = await ai_travel_service.generate_travel_plan(
-            destination=request.destination,
-            start_date=request.start_date,
-            end_date=request.end_date,
-            budget=float(request.budget),
-            people_count=request.people_count,
-            preferences=request.preferences,
-            special_requirements=request.special_requirements
-        )
+        if request.draft_first:
+            # 先用本地景点库生成草稿，AI 结果稍后在后台写回
+            logger.info(f"生成草稿行程: {request.destination}")
+            ai_result = ai_travel_service.generate_draft_plan(
+                destination=request.destination,
+                start_date=request.start_date,
+                end_date=request.end_date,
+                people_count=request.people_count,
+                preferences=request.preferences
+            )
+        else:
+            # 调用AI服务生成行程
+            logger.info(f"开始生成AI行程: {request.destination}")
+            
+            ai_result = await ai_travel_service.generate_travel_plan(
+                destination=request.destination,
+                start_date=request.start_date,
+                end_date=request.end_date,
+                budget=float(request.budget),
+                people_count=request.people_count,
+                preferences=request.preferences,
+                special_requirements=request.special_requirements,
+                user_id=current_user_id
+            )
         
         # 准备数据
         plan_dict = {
@@ -220,19 +251,25 @@ async def generate_travel_plan(
             "people_count": request.people_count,
             "preferences": request.preferences,
             "itinerary": ai_result.get("itinerary", []),
-            "status": "draft"
+            "total_cost": ai_result.get("estimated_cost", 0),
+            "status": "draft",
+            "refinement_status": "pending" if request.draft_first else None
         }
         
         # 创建行程
         travel_plan = await db.create_travel_plan(current_user_id, plan_dict)
         
-        logger.info(f"AI行程生成成功: {travel_plan['id']}")
+        if request.draft_first:
+            background_tasks.add_task(
+                _refine_draft_plan, travel_plan['id'], current_user_id, travel_plan.get('version', 1), request
+            )
+            logger.info(f"草稿行程已创建: {travel_plan['id']}，AI 优化在后台进行")
+            message = "草稿行程已生成，AI 正在后台优化"
+        else:
+            logger.info(f"AI行程生成成功: {travel_plan['id']}")
+            message = "AI行程生成成功"
         
-        return {
-            "code": 200,
-            "message": "AI行程生成成功",
-            "data": travel_plan
-        }
+        return raw_json_response(travel_plan, message)
         
     except HTTPException:
         raise
@@ -244,6 +281,155 @@ async def generate_travel_plan(
         )
 
 
+def _version_conflict() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="行程已被修改，请刷新后重试"
+    )
+
+
+async def _patch_itinerary_day(plan: dict, current_user_id: int, new_day: dict) -> dict:
+    """只替换行程中的某一天，并同步更新总费用；读取后行程被修改过（如后台AI优化完成）时返回 409"""
+    itinerary = [
+        new_day if item.get("day") == new_day["day"] else item
+        for item in (plan.get("itinerary") or [])
+    ]
+    total_cost = sum(float(item.get("total_cost") or 0) for item in itinerary)
+    
+    updated = await db.update_travel_plan(
+        plan["id"],
+        current_user_id,
+        {"itinerary": itinerary, "total_cost": total_cost},
+        expected_version=plan.get("version")
+    )
+    if updated is None:
+        raise _version_conflict()
+    return updated
+
+
+@router.post("/{plan_id}/days/{day}/regenerate", response_model=TravelPlanDetailResponse)
+async def regenerate_travel_plan_day(
+    plan_id: int,
+    day: int,
+    request: Optional[ItineraryRegenerateRequest] = None,
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """AI重新生成行程中的某一天"""
+    
+    # 检查数据库服务
+    if not db.is_enabled():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="数据库服务不可用"
+        )
+    
+    try:
+        plan = await db.get_travel_plan_by_id(plan_id, current_user_id)
+        
+        if not plan:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="行程不存在或无权限访问"
+            )
+        
+        try:
+            new_day = await ai_travel_service.regenerate_day(
+                plan,
+                day,
+                instructions=request.instructions if request else None,
+                user_id=current_user_id
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except AIServiceUnavailableError as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e)
+            )
+        
+        updated_plan = await _patch_itinerary_day(plan, current_user_id, new_day)
+        
+        logger.info(f"行程 {plan_id} 第 {day} 天重新生成成功")
+        
+        return raw_json_response(updated_plan, "重新生成成功")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"重新生成行程失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"重新生成行程失败: {str(e)}"
+        )
+
+
+@router.post(
+    "/{plan_id}/days/{day}/activities/{activity_index}/regenerate",
+    response_model=TravelPlanDetailResponse
+)
+async def regenerate_travel_plan_activity(
+    plan_id: int,
+    day: int,
+    activity_index: int,
+    request: Optional[ItineraryRegenerateRequest] = None,
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """AI重新生成某一天中的单个活动（activity_index 从 0 开始）"""
+    
+    # 检查数据库服务
+    if not db.is_enabled():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="数据库服务不可用"
+        )
+    
+    try:
+        plan = await db.get_travel_plan_by_id(plan_id, current_user_id)
+        
+        if not plan:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="行程不存在或无权限访问"
+            )
+        
+        try:
+            new_day = await ai_travel_service.regenerate_activity(
+                plan,
+                day,
+                activity_index,
+                instructions=request.instructions if request else None,
+                user_id=current_user_id
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except AIServiceUnavailableError as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e)
+            )
+        
+        updated_plan = await _patch_itinerary_day(plan, current_user_id, new_day)
+        
+        logger.info(f"行程 {plan_id} 第 {day} 天第 {activity_index + 1} 个活动重新生成成功")
+        
+        return raw_json_response(updated_plan, "重新生成成功")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"重新生成活动失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"重新生成活动失败: {str(e)}"
+        )
+
+
 @router.put("/{plan_id}", response_model=TravelPlanDetailResponse)
 async def update_travel_plan(
     plan_id: int,
@@ -286,15 +472,15 @@ async def update_travel_plan(
             update_dict['total_cost'] = float(update_dict['total_cost'])
         
         # 更新行程
-        updated_plan = await db.update_travel_plan(plan_id, current_user_id, update_dict)
+        updated_plan = await db.update_travel_plan(
+            plan_id, current_user_id, update_dict, expected_version=existing_plan.get("version")
+        )
+        if updated_plan is None:
+            raise _version_conflict()
         
         logger.info(f"更新行程成功: {plan_id}")
         
-        return {
-            "code": 200,
-            "message": "更新成功",
-            "data": updated_plan
-        }
+        return raw_json_response(updated_plan, "更新成功")
         
     except HTTPException:
         raise
@@ -1,16 +1,57 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request, Query, WebSocket, WebSocketDisconnect, status
 from fastapi.responses import JSONResponse
-from typing import Optional
+from typing import List, Optional
+import asyncio
+import json
 import logging
-from app.services.voice_recognition_service import voice_recognition_service
+from app.core.config import settings
+from app.core.security import decode_token
+from app.schemas.voice import VoiceParseBatchRequest
+from app.services.intent_parser import intent_parser
+from app.services.voice_recognition_service import voice_recognition_service, ASRBusyError, CompressedStreamDecoder
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+def _check_upload_size(audio: UploadFile):
+    """上传文件为空或超过大小上限时直接拒绝"""
+    size = audio.size
+    if size is None:
+        audio.file.seek(0, 2)
+        size = audio.file.tell()
+        audio.file.seek(0)
+    
+    if size == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="音频文件为空"
+        )
+    if size > settings.VOICE_MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"音频文件过大，最大 {settings.VOICE_MAX_UPLOAD_BYTES // (1024 * 1024)}MB"
+        )
+
+
+def _busy_response(recognition_result: dict) -> JSONResponse:
+    """识别会话已满时快速返回 429，并通过 Retry-After 提示重试时间"""
+    retry_after = recognition_result.get("retry_after", 1)
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(retry_after)},
+        content={
+            "code": 429,
+            "message": recognition_result.get("error", "语音识别繁忙，请稍后重试"),
+            "data": {"retry_after": retry_after}
+        }
+    )
+
+
 @router.post("/recognize")
 async def recognize_voice(
-    audio: UploadFile = File(..., description="音频文件（支持 WAV, PCM 格式）"),
+    request: Request,
+    audio: UploadFile = File(..., description="音频文件（支持 WebM/Opus, OGG, MP3, WAV, PCM 格式）"),
     language: Optional[str] = "zh_cn"
 ):
     """
@@ -28,23 +69,26 @@ async def recognize_voice(
                     detail="不支持的文件类型，请上传音频文件"
                 )
         
-        # 读取音频数据
-        audio_data = await audio.read()
+        _check_upload_size(audio)
+        logger.info(f"接收到音频文件: {audio.filename}, 大小: {audio.size} bytes")
+        
+        # 按块读取上传文件，经解码/重采样流水线后送入语音识别
+        recognition_result = await voice_recognition_service.recognize_upload(
+            fileobj=audio.file,
+            audio_format=audio.content_type,
+            language=language,
+            is_disconnected=request.is_disconnected
+        )
+        
+        if recognition_result.get("busy"):
+            return _busy_response(recognition_result)
         
-        if len(audio_data) == 0:
+        if recognition_result.get("invalid_audio"):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="音频文件为空"
+                detail=f"音频无法识别: {recognition_result['error']}"
             )
         
-        logger.info(f"接收到音频文件: {audio.filename}, 大小: {len(audio_data)} bytes")
-        
-        # 调用语音识别服务
-        recognition_result = await voice_recognition_service.recognize_audio(
-            audio_data=audio_data,
-            language=language
-        )
-        
         if not recognition_result["success"]:
             return JSONResponse(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -137,9 +181,34 @@ async def parse_expense_intent(text: str):
         )
 
 
+@router.post("/parse-batch")
+async def parse_intent_batch(request: VoiceParseBatchRequest):
+    """
+    批量解析意图接口
+    
+    一次解析多段文本（旅行或费用意图），结果与输入顺序一致
+    """
+    try:
+        intents = intent_parser.parse_batch(request.texts, request.mode)
+        
+        return {
+            "code": 200,
+            "message": "解析成功",
+            "data": intents
+        }
+        
+    except Exception as e:
+        logger.error(f"批量意图解析失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量意图解析失败: {str(e)}"
+        )
+
+
 @router.post("/recognize-expense")
 async def recognize_expense_voice(
-    audio: UploadFile = File(..., description="音频文件（支持 WAV, PCM 格式）"),
+    request: Request,
+    audio: UploadFile = File(..., description="音频文件（支持 WebM/Opus, OGG, MP3, WAV, PCM 格式）"),
     language: Optional[str] = "zh_cn"
 ):
     """
@@ -156,23 +225,26 @@ async def recognize_expense_voice(
                     detail="不支持的文件类型，请上传音频文件"
                 )
         
-        # 读取音频数据
-        audio_data = await audio.read()
+        _check_upload_size(audio)
+        logger.info(f"接收到费用记录音频: {audio.filename}, 大小: {audio.size} bytes")
         
-        if len(audio_data) == 0:
+        # 按块读取上传文件，经解码/重采样流水线后送入语音识别
+        recognition_result = await voice_recognition_service.recognize_upload(
+            fileobj=audio.file,
+            audio_format=audio.content_type,
+            language=language,
+            is_disconnected=request.is_disconnected
+        )
+        
+        if recognition_result.get("busy"):
+            return _busy_response(recognition_result)
+        
+        if recognition_result.get("invalid_audio"):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="音频文件为空"
+                detail=f"音频无法识别: {recognition_result['error']}"
             )
         
-        logger.info(f"接收到费用记录音频: {audio.filename}, 大小: {len(audio_data)} bytes")
-        
-        # 调用语音识别服务
-        recognition_result = await voice_recognition_service.recognize_audio(
-            audio_data=audio_data,
-            language=language
-        )
-        
         if not recognition_result["success"]:
             return JSONResponse(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -217,6 +289,270 @@ async def recognize_expense_voice(
         )
 
 
+@router.post("/recognize-expense-batch")
+async def recognize_expense_batch(
+    request: Request,
+    audios: List[UploadFile] = File(..., description="多段音频，或一段需要按停顿切分的长录音"),
+    language: Optional[str] = "zh_cn",
+    split: bool = Query(False, description="是否按停顿把每段录音切分为多笔费用")
+):
+    """
+    批量语音记账接口
+    
+    一次上传多段录音（或一段长录音并按停顿切分），并发识别后逐条解析费用。
+    只返回识别与解析结果，不写入数据库：语音识别可能听错金额或类别，
+    客户端展示给用户确认、修改后，再通过 POST /api/expenses/batch 一次写入
+    """
+    if not audios:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="请至少上传一段音频"
+        )
+    if len(audios) > settings.VOICE_BATCH_MAX_CLIPS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"一次最多上传 {settings.VOICE_BATCH_MAX_CLIPS} 段音频"
+        )
+    
+    try:
+        for audio in audios:
+            _check_upload_size(audio)
+        
+        logger.info(f"接收到批量记账音频 {len(audios)} 段，按停顿切分: {split}")
+        
+        results = await voice_recognition_service.recognize_batch(
+            clips=[(audio.file, audio.content_type) for audio in audios],
+            split=split,
+            language=language,
+            is_disconnected=request.is_disconnected
+        )
+        
+        items = []
+        for result in results:
+            text = result.get("text", "")
+            expense = voice_recognition_service.parse_expense_intent(text) if result["success"] and text else None
+            items.append({
+                "clip": result["clip"],
+                "start_ms": result["start_ms"],
+                "end_ms": result["end_ms"],
+                "text": text,
+                "expense": expense,
+                "error": result.get("error"),
+                "retry_after": result.get("retry_after")
+            })
+        
+        recognized = sum(1 for item in items if item["expense"])
+        return {
+            "code": 200,
+            "message": f"识别 {len(items)} 段，解析出 {recognized} 笔费用",
+            "data": {
+                "items": items
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批量语音记账失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量语音记账失败: {str(e)}"
+        )
+
+
+class StreamLimitExceeded(Exception):
+    """实时语音超过大小、时长上限或长时间没有数据"""
+
+
+# 实时语音支持的音频格式：原始 PCM，或浏览器 MediaRecorder 录制的 WebM/OGG（Opus）
+STREAM_FORMATS = ("pcm", "webm", "ogg")
+
+
+async def _authenticate_stream(websocket: WebSocket) -> Optional[int]:
+    """
+    实时语音的第一条消息须为 {"token": 访问令牌}，返回用户ID；超时或令牌无效时返回 None
+
+    浏览器的 WebSocket 无法设置 Authorization 请求头，令牌也不放在 URL 查询参数里，
+    以免被写进代理的访问日志。
+    """
+    try:
+        message = await asyncio.wait_for(websocket.receive(), timeout=settings.VOICE_STREAM_IDLE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+
+    try:
+        token = json.loads(message.get("text") or "").get("token")
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(token, str):
+        return None
+
+    claims = decode_token(token)
+    return int(claims["sub"]) if claims is not None else None
+
+
+@router.websocket("/stream")
+async def stream_voice(
+    websocket: WebSocket,
+    mode: str = Query("travel", pattern="^(travel|expense)$", description="解析意图类型"),
+    language: str = "zh_cn",
+    audio_format: str = Query("pcm", alias="format", description="音频格式：pcm、webm 或 ogg")
+):
+    """
+    实时语音识别（全双工）
+    
+    连接后第一条消息发送文本 {"token": 访问令牌} 完成认证，然后边说边发送二进制音频帧
+    （format=pcm 时为 16kHz 16bit 单声道 PCM，format=webm/ogg 时为 MediaRecorder 输出的
+    Opus 数据块），说完后发送文本消息 "end"。音频超过 VOICE_MAX_UPLOAD_BYTES 字节或
+    VOICE_MAX_DURATION 秒、或超过 VOICE_STREAM_IDLE_TIMEOUT 秒没有消息时连接被关闭。
+    服务端实时推送：
+    - {"type": "partial", "text": ...}  中间结果（含动态修正）
+    - {"type": "final", "text": ..., "intent": ...}  最终结果与解析出的旅行/费用意图
+    - {"type": "error", "message": ...}
+    """
+    await websocket.accept()
+    
+    if audio_format not in STREAM_FORMATS:
+        await websocket.send_json({"type": "error", "message": f"不支持的音频格式: {audio_format}"})
+        await websocket.close()
+        return
+    
+    if not all([
+        voice_recognition_service.app_id,
+        voice_recognition_service.api_key,
+        voice_recognition_service.api_secret
+    ]):
+        await websocket.send_json({"type": "error", "message": "科大讯飞语音识别 API 未配置"})
+        await websocket.close()
+        return
+    
+    loop = asyncio.get_running_loop()
+    
+    async def receive_audio(deadline: float) -> dict:
+        """等待下一条客户端消息，超过空闲时间或总时长时中止"""
+        timeout = min(settings.VOICE_STREAM_IDLE_TIMEOUT, deadline - loop.time())
+        if timeout <= 0:
+            raise StreamLimitExceeded(f"音频时长超过 {settings.VOICE_MAX_DURATION} 秒")
+        try:
+            message = await asyncio.wait_for(websocket.receive(), timeout=timeout)
+        except asyncio.TimeoutError:
+            if loop.time() >= deadline:
+                raise StreamLimitExceeded(f"音频时长超过 {settings.VOICE_MAX_DURATION} 秒")
+            raise StreamLimitExceeded("长时间未收到音频")
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        return message
+    
+    pcm_sent = 0
+    
+    async def send_pcm(session, pcm: bytes):
+        """转发 PCM，累计时长超过上限时中止"""
+        nonlocal pcm_sent
+        pcm_sent += len(pcm)
+        if pcm_sent > voice_recognition_service.max_pcm_bytes:
+            raise StreamLimitExceeded(f"音频时长超过 {settings.VOICE_MAX_DURATION} 秒")
+        await session.send_audio(pcm)
+    
+    async def pump_audio(session, decoder: Optional[CompressedStreamDecoder]):
+        """把客户端音频帧转发给识别会话（压缩音频先交给解码器）"""
+        deadline = loop.time() + settings.VOICE_MAX_DURATION
+        received = 0
+        while True:
+            message = await receive_audio(deadline)
+            data = message.get("bytes")
+            if data:
+                received += len(data)
+                if received > settings.VOICE_MAX_UPLOAD_BYTES:
+                    raise StreamLimitExceeded(
+                        f"音频数据过大，最大 {settings.VOICE_MAX_UPLOAD_BYTES // (1024 * 1024)}MB"
+                    )
+                if decoder is None:
+                    await send_pcm(session, data)
+                else:
+                    decoder.feed(data)
+            elif message.get("text") == "end":
+                if decoder is None:
+                    await session.finish()
+                else:
+                    decoder.close()
+                return
+    
+    async def pump_decoded(session, decoder: CompressedStreamDecoder):
+        """把解码出的 PCM 转发给识别会话，输入结束并解码完后发送最后一帧"""
+        async for pcm in decoder.pcm():
+            await send_pcm(session, pcm)
+        await session.finish()
+    
+    async def forward_results(session):
+        """把中间/最终结果推送给客户端"""
+        async for kind, text in session.updates():
+            if kind == "partial":
+                await websocket.send_json({"type": "partial", "text": text})
+            elif kind == "final":
+                text = text.strip()
+                intent = None
+                if text:
+                    if mode == "expense":
+                        intent = voice_recognition_service.parse_expense_intent(text)
+                    else:
+                        intent = voice_recognition_service.parse_travel_intent(text)
+                await websocket.send_json({"type": "final", "text": text, "intent": intent})
+            else:
+                await websocket.send_json({"type": "error", "message": f"语音识别失败: {text}"})
+    
+    try:
+        user_id = await _authenticate_stream(websocket)
+        if user_id is None:
+            await websocket.send_json({"type": "error", "message": "无效的访问令牌"})
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        
+        # 离开 async with 时（包括超限、超时和客户端断开）释放识别会话名额
+        async with voice_recognition_service.open_stream(language) as session:
+            decoder = CompressedStreamDecoder() if audio_format != "pcm" else None
+            senders = {asyncio.ensure_future(pump_audio(session, decoder))}
+            if decoder is not None:
+                senders.add(asyncio.ensure_future(pump_decoded(session, decoder)))
+            forward = asyncio.ensure_future(forward_results(session))
+            try:
+                # 客户端正常发送 end 后继续等待最终结果；服务端提前给出最终结果则不再等待客户端
+                pending = set(senders)
+                while pending:
+                    done, _ = await asyncio.wait(pending | {forward}, return_when=asyncio.FIRST_COMPLETED)
+                    if forward in done:
+                        break
+                    for task in done:
+                        task.result()
+                    pending -= done
+                await forward
+            finally:
+                for task in senders | {forward}:
+                    if not task.done():
+                        task.cancel()
+                if decoder is not None:
+                    await decoder.aclose()
+        
+        await websocket.close()
+        
+    except WebSocketDisconnect:
+        logger.info("实时语音客户端已断开")
+    except StreamLimitExceeded as e:
+        await websocket.send_json({"type": "error", "message": str(e)})
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+    except ASRBusyError as e:
+        await websocket.send_json({"type": "error", "message": str(e), "retry_after": e.retry_after})
+        await websocket.close()
+    except Exception as e:
+        logger.error(f"实时语音识别失败: {str(e)}")
+        try:
+            await websocket.send_json({"type": "error", "message": f"实时语音识别失败: {str(e)}"})
+            await websocket.close()
+        except Exception:
+            pass
+
+
 @router.get("/status")
 async def check_voice_service_status():
     """检查语音识别服务状态"""
@@ -11,6 +11,14 @@ class Settings(BaseSettings):
     VERSION: str = "1.0.0"
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
     
+    # 日志配置：输出格式 json / text；每个调用位置在 LOG_SAMPLE_WINDOW 秒内最多输出
+    # LOG_SAMPLE_LIMIT 条 INFO 及以下日志（0 为不限）；LOG_PAYLOADS 控制是否记录请求体等内容
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json").lower()
+    LOG_SAMPLE_LIMIT: int = int(os.getenv("LOG_SAMPLE_LIMIT", "20"))
+    LOG_SAMPLE_WINDOW: float = float(os.getenv("LOG_SAMPLE_WINDOW", "10"))
+    LOG_PAYLOADS: bool = os.getenv("LOG_PAYLOADS", os.getenv("DEBUG", "False")).lower() == "true"
+    
     # CORS配置
     ALLOWED_HOSTS: List[str] = ["http://localhost:5173", "http://127.0.0.1:5173"]
     
@@ -24,15 +32,100 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # 密码哈希线程池：线程数（0 表示等于 CPU 核数）与最多排队的哈希任务数
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+    # bcrypt 轮数，可在部署机器上用 scripts/calibrate_password_hash.py 离线测出；低于 12 时按 12 处理
+    PASSWORD_HASH_ROUNDS: int = int(os.getenv("PASSWORD_HASH_ROUNDS", "12"))
+    # 已验证令牌缓存条数，以及 /me 用户资料缓存的有效期（秒）
+    AUTH_TOKEN_CACHE_SIZE: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+    AUTH_PROFILE_CACHE_TTL: int = int(os.getenv("AUTH_PROFILE_CACHE_TTL", "300"))
+    # /metrics 访问令牌（请求头 Authorization: Bearer <令牌>），未配置时不提供 /metrics
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+    
+    # 登录限流：LOGIN_THROTTLE_WINDOW 秒内同一 IP / 同一邮箱失败次数达到上限后锁定，
+    # 锁定时长从 BASE_LOCKOUT 秒起每次翻倍，最长 MAX_LOCKOUT 秒
+    LOGIN_THROTTLE_WINDOW: float = float(os.getenv("LOGIN_THROTTLE_WINDOW", "300"))
+    LOGIN_THROTTLE_MAX_IP_FAILURES: int = int(os.getenv("LOGIN_THROTTLE_MAX_IP_FAILURES", "20"))
+    LOGIN_THROTTLE_MAX_EMAIL_FAILURES: int = int(os.getenv("LOGIN_THROTTLE_MAX_EMAIL_FAILURES", "5"))
+    LOGIN_THROTTLE_BASE_LOCKOUT: float = float(os.getenv("LOGIN_THROTTLE_BASE_LOCKOUT", "30"))
+    LOGIN_THROTTLE_MAX_LOCKOUT: float = float(os.getenv("LOGIN_THROTTLE_MAX_LOCKOUT", "3600"))
+    # 限流状态存储：memory（单进程）/ redis（多进程共享，需要安装 redis）
+    LOGIN_THROTTLE_BACKEND: str = os.getenv("LOGIN_THROTTLE_BACKEND", "memory").lower()
+    LOGIN_THROTTLE_REDIS_URL: str = os.getenv("LOGIN_THROTTLE_REDIS_URL", "")
+    LOGIN_THROTTLE_MAX_ENTRIES: int = int(os.getenv("LOGIN_THROTTLE_MAX_ENTRIES", "100000"))
+    # 用户名/邮箱占用检查的布隆过滤器：预计用户数与误判率
+    USER_INDEX_CAPACITY: int = int(os.getenv("USER_INDEX_CAPACITY", "100000"))
+    USER_INDEX_ERROR_RATE: float = float(os.getenv("USER_INDEX_ERROR_RATE", "0.01"))
+    # 部署在反向代理之后时，从代理写入的 X-Real-IP / X-Forwarded-For 取客户端 IP；
+    # 只采信来自 TRUSTED_PROXIES（逗号分隔的 IP 或网段）的连接上的这两个请求头
+    TRUST_PROXY_HEADERS: bool = os.getenv("TRUST_PROXY_HEADERS", "False").lower() == "true"
+    TRUSTED_PROXIES: str = os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1")
     
     # 通义千问API配置
     QIANWEN_API_KEY: str = os.getenv("QIANWEN_API_KEY", "")
     QIANWEN_API_URL: str = "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"
+    # 内置通义千问服务的结构化输出模式：json_schema（按 Schema 约束）/ json_object（仅约束为 JSON）/ off
+    QIANWEN_RESPONSE_FORMAT: str = os.getenv("QIANWEN_RESPONSE_FORMAT", "json_object")
+    
+    # 多模型服务配置：JSON 数组，如 [{"name": "dashscope", "base_url": "...", "api_key": "...", "model": "qwen-turbo"}]
+    # 每项可选 "response_format"（同上，默认 json_object）；未配置时使用上面的通义千问
+    LLM_PROVIDERS: str = os.getenv("LLM_PROVIDERS", "")
+    LLM_REQUEST_TIMEOUT: float = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+    LLM_PROVIDER_COOLDOWN: float = float(os.getenv("LLM_PROVIDER_COOLDOWN", "30"))
+    # 执行模型请求的线程数上限（含对冲请求），与其他线程池任务隔离
+    LLM_MAX_WORKERS: int = int(os.getenv("LLM_MAX_WORKERS", "8"))
+    # 对冲请求：主服务超过 p95 延迟未返回时，并行请求下一个服务
+    LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "False").lower() == "true"
+    LLM_HEDGE_MIN_DELAY: float = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+    LLM_HEDGE_DEFAULT_DELAY: float = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "15"))
     
     # 科大讯飞语音识别API配置
     XFYUN_APP_ID: str = os.getenv("XFYUN_APP_ID", "")
     XFYUN_API_KEY: str = os.getenv("XFYUN_API_KEY", "")
     XFYUN_API_SECRET: str = os.getenv("XFYUN_API_SECRET", "")
+    # 识别服务地址；本地测试时可指向 scripts/mock_xfyun_server.py
+    XFYUN_BASE_URL: str = os.getenv("XFYUN_BASE_URL", "wss://iat-api.xfyun.cn/v2/iat")
+    XFYUN_CONNECT_TIMEOUT: float = float(os.getenv("XFYUN_CONNECT_TIMEOUT", "10"))
+    # 两条识别结果之间的最长等待时间
+    XFYUN_RECV_TIMEOUT: float = float(os.getenv("XFYUN_RECV_TIMEOUT", "15"))
+    # 已录制音频的发送倍速（相对实时），0 表示不限速只依赖背压；实时音频流始终按 1 倍速发送
+    XFYUN_UPLOAD_SPEED: float = float(os.getenv("XFYUN_UPLOAD_SPEED", "4"))
+    # 每帧音频字节数，1280 字节即 40ms 的 16k 16bit 音频
+    XFYUN_FRAME_BYTES: int = int(os.getenv("XFYUN_FRAME_BYTES", "1280"))
+    # 讯飞并发会话上限（按账号配额设置），以及超出后排队的最大人数与最长等待秒数
+    XFYUN_MAX_SESSIONS: int = int(os.getenv("XFYUN_MAX_SESSIONS", "10"))
+    XFYUN_MAX_QUEUE: int = int(os.getenv("XFYUN_MAX_QUEUE", "20"))
+    XFYUN_QUEUE_TIMEOUT: float = float(os.getenv("XFYUN_QUEUE_TIMEOUT", "10"))
+    
+    # 语音上传大小上限（字节）与音频最长时长（秒）
+    VOICE_MAX_UPLOAD_BYTES: int = int(os.getenv("VOICE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+    VOICE_MAX_DURATION: float = float(os.getenv("VOICE_MAX_DURATION", "120"))
+    # 实时语音连接：等待认证消息和两条音频消息之间的最长间隔（秒）
+    VOICE_STREAM_IDLE_TIMEOUT: float = float(os.getenv("VOICE_STREAM_IDLE_TIMEOUT", "10"))
+    # 批量语音记账：最多上传的片段数、单次批量并发识别数、长录音按停顿切分的最短停顿（毫秒）
+    VOICE_BATCH_MAX_CLIPS: int = int(os.getenv("VOICE_BATCH_MAX_CLIPS", "10"))
+    VOICE_BATCH_CONCURRENCY: int = int(os.getenv("VOICE_BATCH_CONCURRENCY", "3"))
+    VOICE_SPLIT_PAUSE_MS: int = int(os.getenv("VOICE_SPLIT_PAUSE_MS", "800"))
+    # 识别结果缓存：相同音频（按 PCM 内容哈希）和语言直接返回上次结果，TTL 为 0 时关闭
+    VOICE_CACHE_TTL: int = int(os.getenv("VOICE_CACHE_TTL", "600"))
+    VOICE_CACHE_MAX_ENTRIES: int = int(os.getenv("VOICE_CACHE_MAX_ENTRIES", "512"))
+    
+    # 语音活动检测：识别前裁掉首尾静音并压缩过长停顿
+    VAD_ENABLED: bool = os.getenv("VAD_ENABLED", "True").lower() == "true"
+    # 语音阈值 = 噪声底 + VAD_MARGIN_DB，且不低于 VAD_MIN_SPEECH_DB（dBFS）
+    VAD_MARGIN_DB: float = float(os.getenv("VAD_MARGIN_DB", "10"))
+    VAD_MIN_SPEECH_DB: float = float(os.getenv("VAD_MIN_SPEECH_DB", "-50"))
+    # 语音段前后保留的静音与内部停顿最长保留时长（毫秒）
+    VAD_PADDING_MS: int = int(os.getenv("VAD_PADDING_MS", "200"))
+    VAD_MAX_PAUSE_MS: int = int(os.getenv("VAD_MAX_PAUSE_MS", "600"))
+    
+    # 头像存储：local（写入 AVATAR_STORAGE_DIR，经 /media/avatars 访问）/ supabase（存入 AVATAR_BUCKET 公开存储桶）
+    AVATAR_STORAGE: str = os.getenv("AVATAR_STORAGE", "local").lower()
+    AVATAR_STORAGE_DIR: str = os.getenv("AVATAR_STORAGE_DIR", "uploads/avatars")
+    AVATAR_BASE_URL: str = os.getenv("AVATAR_BASE_URL", "http://localhost:8000/media/avatars")
+    AVATAR_BUCKET: str = os.getenv("AVATAR_BUCKET", "avatars")
+    AVATAR_MAX_BYTES: int = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
     
     # Supabase 云端存储配置
     ENABLE_CLOUD_SYNC: bool = os.getenv("ENABLE_CLOUD_SYNC", "False").lower() == "true"
@@ -0,0 +1,124 @@
+"""
+日志配置
+
+业务代码只把日志记录放进队列，由后台线程的 QueueListener 负责格式化和输出，
+请求路径上不再做 I/O。INFO 及以下级别按调用位置限流，WARNING 及以上始终输出。
+"""
+
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+# LogRecord 自带的属性，其余属性视为通过 extra 传入的结构化字段
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行 JSON，extra 中的字段原样带出"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "site": f"{record.module}:{record.lineno}",
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class CallSiteRateLimitFilter(logging.Filter):
+    """
+    按调用位置（文件 + 行号）限流
+
+    每个调用位置在 window 秒内最多放行 limit 条 INFO 及以下级别的日志，
+    被丢弃的条数记在下一条放行日志的 suppressed 字段里。limit <= 0 表示不限流。
+    """
+
+    def __init__(self, limit: int, window: float):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._sites: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            # [窗口起始时间, 窗口内已放行条数, 被丢弃条数]
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site else 0
+                site = [now, 0, suppressed]
+                self._sites[key] = site
+            if site[1] >= self.limit:
+                site[2] += 1
+                return False
+            site[1] += 1
+            if site[2]:
+                record.suppressed = site[2]
+                site[2] = 0
+        return True
+
+
+def setup_logging():
+    """配置根日志：队列 + 后台线程输出，重复调用时不重复配置"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler()
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = QueueHandler(log_queue)
+    handler.addFilter(CallSiteRateLimitFilter(settings.LOG_SAMPLE_LIMIT, settings.LOG_SAMPLE_WINDOW))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """停止后台输出线程，队列中已有的日志全部写出后返回；进程退出时自动调用"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+
+
+def truncate_payload(payload: Any, limit: int = 1000) -> str:
+    """把请求/响应内容截断成适合写日志的长度"""
+    text = payload if isinstance(payload, str) else repr(payload)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...（共 {len(text)} 字符）"
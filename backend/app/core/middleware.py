@@ -0,0 +1,80 @@
+"""
+自定义中间件
+"""
+
+import json
+import logging
+from typing import Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSizeLimitMiddleware:
+    """
+    上传大小限制（纯 ASGI 中间件）
+
+    FastAPI 会在进入路由之前把整个 multipart 请求体解析并落盘，
+    因此必须在中间件里拦截：Content-Length 超限时直接返回 413，
+    分块传输的请求体在累计超限时按客户端断开处理，停止继续接收。
+
+    limits 为 (路径前缀, 最大字节数) 列表，按顺序取第一个匹配的前缀，
+    更具体的前缀要放在前面。
+    """
+
+    def __init__(self, app, limits: Sequence[Tuple[str, int]]):
+        self.app = app
+        self.limits = tuple(limits)
+
+    def _limit_for(self, path: str) -> Optional[int]:
+        for prefix, max_bytes in self.limits:
+            if path.startswith(prefix):
+                return max_bytes
+        return None
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self._limit_for(scope["path"]) if scope["type"] == "http" else None
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    length = int(value)
+                except ValueError:
+                    break
+                if length > max_bytes:
+                    logger.warning(f"上传过大被拒绝: {scope['path']} {length} bytes")
+                    await self._reject(send, max_bytes)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    logger.warning(f"上传过大，停止接收: {scope['path']} 已接收 {received} bytes")
+                    return {"type": "http.disconnect"}
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def _reject(self, send, max_bytes: int):
+        body = json.dumps({
+            "code": 413,
+            "message": f"上传文件过大，最大 {max_bytes // (1024 * 1024)}MB",
+            "data": None
+        }, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,35 @@
+"""
+JSON 响应
+安装了 orjson 时默认用它序列化响应；数据库读出的行程可以跳过 response_model 校验直接返回
+"""
+
+import logging
+from typing import Any
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    logger.warning("orjson 未安装，响应使用标准库 json 序列化，请运行: pip install orjson")
+
+# 应用默认响应类
+DefaultJSONResponse = ORJSONResponse if ORJSON_AVAILABLE else JSONResponse
+
+
+def raw_json_response(data: Any, message: str = "获取成功", code: int = 200) -> JSONResponse:
+    """
+    按统一格式直接序列化数据库返回的数据
+
+    路由直接返回 Response 时 FastAPI 不再按 response_model 校验，省去为每个行程构造
+    DayItineraryBase/ActivityBase 和 Decimal 的开销。行程在写入前已经校验过
+    （请求体经 Pydantic 校验，AI 输出经 itinerary_validator 修复），数据库读出的行
+    只含 JSON 原生类型，可以原样返回；response_model 仍保留用于生成接口文档。
+    更早写入的行程由 scripts/backfill_itineraries.py 一次性校验修复。
+    金额（budget、total_cost、cost）因此以 JSON 数字返回，接口文档中的响应模型同样声明为数字。
+    """
+    return DefaultJSONResponse({"code": code, "message": message, "data": data})
@@ -1,19 +1,35 @@
 from datetime import datetime, timedelta
-from typing import Union, Any
+from typing import Union, Any, Callable, Dict, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from jose import jwt
 from passlib.context import CryptContext
+from passlib.hash import bcrypt as bcrypt_handler
 from app.core.config import settings
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import time
 
-# 密码加密上下文
+logger = logging.getLogger(__name__)
+
+# 校准时测量的最低轮数；默认轮数同时是配置和校准结果的下限，只升不降
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_DEFAULT_ROUNDS = 12
+BCRYPT_MAX_ROUNDS = 16
+
+# 密码加密上下文；轮数低于当前配置的旧哈希会被标记为需要更新，登录成功时自动重新哈希
 pwd_context = CryptContext(
     schemes=["bcrypt"], 
     deprecated="auto",
-    bcrypt__rounds=12,  # 指定轮数以提高安全性
-    bcrypt__default_rounds=12
+    bcrypt__default_rounds=BCRYPT_DEFAULT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_DEFAULT_ROUNDS
 )
 
 def create_access_token(subject: Union[str, Any], expires_delta: timedelta = None) -> str:
-    """创建访问令牌"""
+    """创建访问令牌；只包含用户ID，邮箱、用户名等资料可被修改，从 /me 读取"""
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
@@ -27,7 +43,6 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
     # 对长密码进行相同的预处理
     if len(plain_password.encode('utf-8')) > 72:
-        import hashlib
         plain_password = hashlib.sha256(plain_password.encode('utf-8')).hexdigest()
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -36,17 +51,218 @@ def get_password_hash(password: str) -> str:
     # bcrypt 有 72 字节的限制，需要截断或使用预哈希
     if len(password.encode('utf-8')) > 72:
         # 对长密码进行预哈希处理
-        import hashlib
         password = hashlib.sha256(password.encode('utf-8')).hexdigest()
     return pwd_context.hash(password)
 
-def verify_token(token: str) -> Union[str, None]:
-    """验证令牌并返回用户ID"""
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """验证密码；哈希参数已过时时同时返回按当前参数重新计算的哈希"""
+    if len(plain_password.encode('utf-8')) > 72:
+        plain_password = hashlib.sha256(plain_password.encode('utf-8')).hexdigest()
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+def measure_bcrypt_ms(rounds: int, samples: int = 3) -> float:
+    """测量指定轮数下验证一次密码的耗时（毫秒），取多次中的最小值"""
+    hashed = bcrypt_handler.using(rounds=rounds).hash("calibration-password")
+    best = float("inf")
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt_handler.verify("calibration-password", hashed)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+def calibrate_bcrypt_rounds(target_ms: float) -> Tuple[int, float]:
+    """
+    按本机性能选择 bcrypt 轮数，使验证耗时最接近 target_ms
+
+    bcrypt 每增加一轮耗时翻倍，先测最低轮数再按倍数推算，最后实测一次选中的轮数。
+    机器再快也不低于 BCRYPT_DEFAULT_ROUNDS。返回 (轮数, 实测耗时毫秒)。
+    """
+    base_ms = measure_bcrypt_ms(BCRYPT_MIN_ROUNDS)
+    rounds = BCRYPT_MIN_ROUNDS + round(math.log2(max(target_ms, 1.0) / base_ms))
+    rounds = min(max(rounds, BCRYPT_DEFAULT_ROUNDS), BCRYPT_MAX_ROUNDS)
+    return rounds, measure_bcrypt_ms(rounds)
+
+def password_hash_rounds() -> int:
+    """配置的 bcrypt 轮数，不低于默认轮数"""
+    rounds = settings.PASSWORD_HASH_ROUNDS
+    if rounds < BCRYPT_DEFAULT_ROUNDS:
+        logger.warning(f"PASSWORD_HASH_ROUNDS={rounds} 低于默认值，按 {BCRYPT_DEFAULT_ROUNDS} 处理")
+        return BCRYPT_DEFAULT_ROUNDS
+    return min(rounds, BCRYPT_MAX_ROUNDS)
+
+def configure_password_hashing():
+    """
+    按 PASSWORD_HASH_ROUNDS 设置 bcrypt 轮数
+
+    只设置下限（min_rounds）：低于配置轮数的旧哈希在登录时升级，
+    轮数更高的哈希保持不变，调低配置也不会把已有哈希降级。
+    """
+    rounds = password_hash_rounds()
+    pwd_context.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+    password_hasher.rounds = rounds
+
+class TokenCache:
+    """
+    已验证令牌缓存
+    
+    以令牌的 SHA-256 摘要为键（内存中不保留令牌原文），缓存解码后的 claims，
+    条目保留到令牌自身的 exp 为止。命中时不再做签名校验，按 LRU 淘汰。
+    """
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max(max_entries, 0)
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+    
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
             return None
-        return user_id
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def put(self, token: str, claims: Dict[str, Any]):
+        expires_at = claims.get("exp")
+        if not self.max_entries or not isinstance(expires_at, (int, float)):
+            return
+        key = self._key(token)
+        self._entries[key] = (float(expires_at), claims)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+# 创建服务实例
+token_cache = TokenCache(settings.AUTH_TOKEN_CACHE_SIZE)
+
+
+def decode_token(token: str) -> Optional[Dict[str, Any]]:
+    """验证令牌并返回 claims，无效时返回 None"""
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    
+    try:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
     except jwt.JWTError:
-        return None
\ No newline at end of file
+        return None
+    if claims.get("sub") is None:
+        return None
+    
+    token_cache.put(token, claims)
+    return claims
+
+def verify_token(token: str) -> Union[str, None]:
+    """验证令牌并返回用户ID"""
+    claims = decode_token(token)
+    return claims["sub"] if claims else None
+
+
+class PasswordHashBusyError(Exception):
+    """密码哈希线程池排队已满"""
+    
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """
+    密码哈希线程池
+    
+    bcrypt 每次计算约数百毫秒 CPU，放在专用线程池中执行（bcrypt 计算时会释放 GIL），
+    避免阻塞事件循环。线程数默认等于 CPU 核数；排队的任务超过 max_queue 时直接拒绝，
+    防止登录洪峰时请求无限堆积。
+    """
+    
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.max_queue = max(max_queue, 0)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        # 哈希耗时与排队等待时间的指数移动平均（秒）
+        self._avg_hash: Optional[float] = None
+        self._avg_wait: Optional[float] = None
+        self.rounds = BCRYPT_DEFAULT_ROUNDS
+    
+    def retry_after(self) -> int:
+        avg = self._avg_hash if self._avg_hash is not None else 0.3
+        return max(1, math.ceil(avg * self.pending / self.workers))
+    
+    async def run(self, func: Callable, *args):
+        """在线程池中执行 func(*args)"""
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHashBusyError("登录请求过多，请稍后重试", self.retry_after())
+        
+        submitted = time.perf_counter()
+        
+        def timed():
+            started = time.perf_counter()
+            result = func(*args)
+            return result, started - submitted, time.perf_counter() - started
+        
+        self.pending += 1
+        try:
+            result, wait, duration = await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self.pending -= 1
+        
+        self.completed += 1
+        self._avg_wait = wait if self._avg_wait is None else 0.8 * self._avg_wait + 0.2 * wait
+        self._avg_hash = duration if self._avg_hash is None else 0.8 * self._avg_hash + 0.2 * duration
+        return result
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "bcrypt_rounds": self.rounds,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "active": min(self.pending, self.workers),
+            "queued": max(self.pending - self.workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_hash_ms": round(self._avg_hash * 1000, 1) if self._avg_hash is not None else None,
+            "avg_wait_ms": round(self._avg_wait * 1000, 1) if self._avg_wait is not None else None,
+        }
+
+
+# 创建服务实例
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """在密码哈希线程池中验证密码"""
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """在密码哈希线程池中计算密码哈希"""
+    return await password_hasher.run(get_password_hash, password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """在密码哈希线程池中验证密码，并在需要时重新哈希"""
+    return await password_hasher.run(verify_and_update_password, plain_password, hashed_password)
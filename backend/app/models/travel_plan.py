@@ -18,6 +18,8 @@ class TravelPlan(Base):
     itinerary = Column(JSON, nullable=True)    # 存储完整行程JSON
     total_cost = Column(Numeric(10, 2), nullable=True, default=0.00)
     status = Column(String(20), nullable=False, default='draft')  # draft, published, completed
+    version = Column(Integer, nullable=False, default=1, server_default='1')  # 每次写入加 1，用于乐观锁
+    refinement_status = Column(String(20), nullable=True)  # 后台 AI 优化状态: pending, done, failed, superseded
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -12,6 +12,9 @@ class ExpenseBase(BaseModel):
 class ExpenseCreate(ExpenseBase):
     travel_plan_id: int = Field(..., description="关联的行程ID")
 
+class ExpenseBatchCreate(BaseModel):
+    expenses: List[ExpenseCreate] = Field(..., min_length=1, max_length=100, description="费用记录列表")
+
 class ExpenseUpdate(BaseModel):
     category: Optional[str] = Field(None, pattern="^(transport|accommodation|food|attraction|shopping|other)$")
     amount: Optional[Decimal] = Field(None, ge=0)
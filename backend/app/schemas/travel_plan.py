@@ -42,12 +42,25 @@ class DayItineraryBase(BaseModel):
     activities: List[ActivityBase] = Field(default=[], description="活动列表")
     total_cost: Decimal = Field(default=0, ge=0, description="当日总费用")
 
+# 响应中的金额是 JSON 数字（数据库行原样返回），不是 Decimal 序列化出的字符串
+class ActivityResponse(ActivityBase):
+    cost: float = Field(..., ge=0, description="费用（JSON 数字）")
+
+class DayItineraryResponse(DayItineraryBase):
+    activities: List[ActivityResponse] = Field(default=[], description="活动列表")
+    total_cost: float = Field(default=0, ge=0, description="当日总费用（JSON 数字）")
+
 class TravelPlanResponse(TravelPlanBase):
     id: int
     user_id: int
-    itinerary: Optional[List[DayItineraryBase]] = None
-    total_cost: Decimal = Field(default=0)
+    budget: float = Field(..., ge=0, description="预算金额（JSON 数字）")
+    itinerary: Optional[List[DayItineraryResponse]] = None
+    total_cost: float = Field(default=0, description="总费用（JSON 数字）")
     status: str = "draft"
+    version: int = Field(default=1, description="版本号，每次修改加 1")
+    refinement_status: Optional[str] = Field(
+        None, description="后台AI优化状态：pending（进行中，需轮询刷新）/ done / failed / superseded（期间行程被修改，已放弃）"
+    )
     created_at: datetime
     updated_at: datetime
     
@@ -62,6 +75,10 @@ class TravelPlanGenerateRequest(BaseModel):
     people_count: int = Field(..., ge=1, description="出行人数")
     preferences: List[str] = Field(default=[], description="偏好标签：美食、购物、文化、自然风光、亲子、商务等")
     special_requirements: Optional[str] = Field(None, description="特殊需求")
+    draft_first: bool = Field(default=True, description="先返回本地景点库生成的草稿行程，AI 优化结果在后台写回；为 false 时等待 AI 生成完成再返回")
+
+class ItineraryRegenerateRequest(BaseModel):
+    instructions: Optional[str] = Field(None, max_length=500, description="调整要求，例如：换成室内活动")
 
 class TravelPlanListResponse(BaseModel):
     code: int = 200
@@ -0,0 +1,7 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+
+class VoiceParseBatchRequest(BaseModel):
+    texts: List[str] = Field(..., min_length=1, max_length=500, description="待解析的文本列表")
+    mode: str = Field("travel", pattern="^(travel|expense)$", description="解析意图类型")
@@ -1,29 +1,39 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import json
-import asyncio
+import time
 import logging
+import threading
 from datetime import datetime, timedelta
 from app.core.config import settings
-from openai import OpenAI
+from app.services.poi_library_service import poi_library_service
+from app.services.llm_usage_service import llm_usage_tracker
+from app.services.itinerary_validator import (
+    StreamingActivityValidator,
+    itinerary_json_schema,
+    repair_activity,
+    repair_itinerary
+)
+from app.services.llm_provider_service import LLMProvider, LLMRequestCancelled, llm_provider_pool
 
 # 设置日志
 logger = logging.getLogger(__name__)
 
+
+class AIServiceUnavailableError(Exception):
+    """未配置大模型服务，无法调用 AI"""
+
+
 class AITravelPlannerService:
     """AI行程规划服务"""
     
     def __init__(self):
-        self.api_key = settings.QIANWEN_API_KEY
+        # OpenAI 兼容服务池（默认只有通义千问）
+        self.providers = llm_provider_pool
         
-        # 初始化 OpenAI 客户端（用于通义千问）
-        if self.api_key:
-            self.client = OpenAI(
-                api_key=self.api_key,
-                base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-            )
-            logger.info(f"通义千问 API 已配置，密钥前缀: {self.api_key[:10]}...")
+        if self.providers.is_configured():
+            names = "、".join(f"{p.name}({p.model})" for p in self.providers.providers)
+            logger.info(f"大模型服务已配置: {names}")
         else:
-            self.client = None
             logger.warning("通义千问 API KEY 未配置，将使用默认模板")
     
     async def generate_travel_plan(
@@ -34,7 +44,8 @@ class AITravelPlannerService:
         budget: float,
         people_count: int,
         preferences: List[str],
-        special_requirements: str = None
+        special_requirements: str = None,
+        user_id: Optional[int] = None
     ) -> Dict[str, Any]:
         """生成AI行程规划"""
         
@@ -54,19 +65,32 @@ class AITravelPlannerService:
         )
         
         # 检查 API 客户端是否配置
-        if not self.client:
+        if not self.providers.is_configured():
             logger.warning("通义千问 API 客户端未配置，使用默认模板")
-            return self._generate_fallback_plan(destination, start_date, days, budget, people_count)
+            return self._generate_fallback_plan(destination, start_date, days, budget, people_count, preferences)
         
         try:
             logger.info(f"正在调用通义千问 API 生成 {destination} 的行程...")
             
-            # 调用通义千问API
-            response = await self._call_qianwen_api(prompt)
+            # 调用通义千问API（结构化输出 + 流式校验）
+            response = await self._call_qianwen_api(
+                prompt,
+                max_tokens=llm_usage_tracker.suggest_max_tokens(days),
+                structured=True,
+                default_location=destination,
+                endpoint="generate",
+                user_id=user_id,
+                days=days
+            )
             logger.info("通义千问 API 调用成功")
             
-            # 解析响应并构建行程数据
-            itinerary = self._parse_ai_response(response, start_date, days)
+            # 流式校验已修复好的行程直接使用，否则解析文本并修复
+            if isinstance(response, list):
+                itinerary = response
+            else:
+                itinerary = self._parse_ai_response(response, start_date, days, destination, people_count, preferences)
+            if len(itinerary) != days:
+                raise ValueError(f"AI 返回 {len(itinerary)} 天行程，应为 {days} 天")
             
             return {
                 "success": True,
@@ -78,11 +102,31 @@ class AITravelPlannerService:
             logger.error(f"通义千问 API 调用失败: {str(e)}")
             logger.info("正在使用默认模板生成行程...")
             # 如果AI服务失败，返回默认模板
-            fallback_result = self._generate_fallback_plan(destination, start_date, days, budget, people_count)
+            fallback_result = self._generate_fallback_plan(destination, start_date, days, budget, people_count, preferences)
             fallback_result["ai_generated"] = False
             fallback_result["error"] = f"AI服务暂时不可用: {str(e)}"
             return fallback_result
     
+    def generate_draft_plan(
+        self,
+        destination: str,
+        start_date: datetime,
+        end_date: datetime,
+        people_count: int,
+        preferences: List[str]
+    ) -> Dict[str, Any]:
+        """基于本地 POI 库立即生成草稿行程（不调用大模型）"""
+        days = (end_date - start_date).days + 1
+        itinerary = self._generate_default_itinerary(start_date, days, destination, people_count, preferences)
+        
+        return {
+            "success": True,
+            "itinerary": itinerary,
+            "estimated_cost": self._calculate_total_cost(itinerary),
+            "ai_generated": False,
+            "from_poi_library": poi_library_service.has_city(destination)
+        }
+    
     def _build_prompt(
         self,
         destination: str,
@@ -122,104 +166,387 @@ class AITravelPlannerService:
 要求：活动类型仅限于 attraction(景点)/restaurant(餐厅)/transport(交通)/shopping(购物)/entertainment(娱乐) 之一，费用合理，只返回JSON无其他文字。"""
         return prompt
     
-    async def _call_qianwen_api(self, prompt: str) -> str:
-        """调用通义千问API"""
-        logger.info("调用通义千问 API")
+    async def regenerate_day(
+        self,
+        plan: Dict[str, Any],
+        day: int,
+        instructions: Optional[str] = None,
+        user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """重新生成行程中的某一天，只把紧凑上下文发给模型"""
+        itinerary = plan.get("itinerary") or []
+        target = self._find_day(itinerary, day)
+        if target is None:
+            raise ValueError(f"行程中不存在第 {day} 天")
+        
+        if not self.providers.is_configured():
+            raise AIServiceUnavailableError("通义千问 API 客户端未配置")
+        
+        context = self._build_slice_context(plan, itinerary, day)
+        prompt = f"""{context}
+请重新规划第{day}天（{target.get('date', '')}）的行程，避免与相邻天重复。
+{f'调整要求：{instructions}' if instructions else ''}
+返回JSON格式，3-4个活动：
+{{"day": {day}, "date": "{target.get('date', '')}", "activities": [{{"type": "attraction", "name": "景点名", "description": "简介", "location": "地址", "start_time": "09:00", "end_time": "12:00", "cost": 100, "rating": 4.5}}], "total_cost": 100}}
+
+要求：活动类型仅限于 attraction/restaurant/transport/shopping/entertainment 之一，费用不超过剩余预算，只返回JSON无其他文字。"""
+        
+        logger.info(f"重新生成第 {day} 天行程，提示词长度: {len(prompt)}")
+        response = await self._call_qianwen_api(
+            prompt,
+            max_tokens=llm_usage_tracker.suggest_max_tokens(1),
+            endpoint="regenerate_day",
+            user_id=user_id,
+            days=1
+        )
+        data = self._extract_json(response)
         
-        # 重试机制
-        max_retries = 3
-        for attempt in range(max_retries):
+        if not isinstance(data, dict) or not isinstance(data.get("activities"), list):
+            raise ValueError("AI 返回的单日行程格式不正确")
+        
+        new_day = {
+            "day": day,
+            "date": target.get("date", data.get("date")),
+            "activities": data["activities"],
+        }
+        repaired, _ = repair_itinerary([new_day], plan.get("destination") or "")
+        return repaired[0]
+    
+    async def regenerate_activity(
+        self,
+        plan: Dict[str, Any],
+        day: int,
+        activity_index: int,
+        instructions: Optional[str] = None,
+        user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """重新生成某一天中的单个活动，返回替换后的当天行程"""
+        itinerary = plan.get("itinerary") or []
+        target = self._find_day(itinerary, day)
+        if target is None:
+            raise ValueError(f"行程中不存在第 {day} 天")
+        
+        activities = target.get("activities") or []
+        if activity_index < 0 or activity_index >= len(activities):
+            raise ValueError(f"第 {day} 天不存在第 {activity_index + 1} 个活动")
+        
+        if not self.providers.is_configured():
+            raise AIServiceUnavailableError("通义千问 API 客户端未配置")
+        
+        old = activities[activity_index]
+        others = "、".join(
+            f"{a.get('start_time', '')}-{a.get('end_time', '')} {a.get('name', '')}"
+            for i, a in enumerate(activities) if i != activity_index
+        )
+        context = self._build_slice_context(plan, itinerary, day)
+        prompt = f"""{context}
+第{day}天其他安排：{others or '无'}
+请替换活动「{old.get('name', '')}」（类型 {old.get('type', '')}，{old.get('start_time', '')}-{old.get('end_time', '')}），时间段保持不变。
+{f'调整要求：{instructions}' if instructions else ''}
+返回单个活动的JSON：
+{{"type": "{old.get('type', 'attraction')}", "name": "名称", "description": "简介", "location": "地址", "start_time": "{old.get('start_time', '09:00')}", "end_time": "{old.get('end_time', '12:00')}", "cost": 100, "rating": 4.5}}
+
+要求：活动类型仅限于 attraction/restaurant/transport/shopping/entertainment 之一，只返回JSON无其他文字。"""
+        
+        logger.info(f"重新生成第 {day} 天第 {activity_index + 1} 个活动，提示词长度: {len(prompt)}")
+        # 单个活动约占当天输出的 1/活动数
+        response = await self._call_qianwen_api(
+            prompt,
+            max_tokens=llm_usage_tracker.suggest_max_tokens(1 / len(activities)),
+            endpoint="regenerate_activity",
+            user_id=user_id
+        )
+        activity, fixes = repair_activity(self._extract_json(response), plan.get("destination") or "")
+        
+        if activity is None:
+            raise ValueError(f"AI 返回的活动格式不正确: {'；'.join(fixes)}")
+        
+        new_activities = list(activities)
+        new_activities[activity_index] = activity
+        new_day = dict(target)
+        new_day["activities"] = new_activities
+        new_day["total_cost"] = self._sum_activity_cost(new_activities)
+        return new_day
+    
+    def _build_slice_context(self, plan: Dict[str, Any], itinerary: List[Dict[str, Any]], day: int) -> str:
+        """构建局部重生成的紧凑上下文：相邻天概要、剩余预算与约束"""
+        neighbours = []
+        for item in itinerary:
+            if abs(item.get("day", 0) - day) == 1:
+                names = "、".join(a.get("name", "") for a in item.get("activities") or [])
+                neighbours.append(f"第{item.get('day')}天：{names}")
+        
+        budget = float(plan.get("budget") or 0)
+        spent_elsewhere = sum(
+            float(item.get("total_cost") or 0) for item in itinerary if item.get("day") != day
+        )
+        remaining = max(budget - spent_elsewhere, 0)
+        preferences = plan.get("preferences") or []
+        
+        lines = [
+            f"目的地：{plan.get('destination', '')}，人数：{plan.get('people_count', 1)}人",
+            f"偏好：{'、'.join(preferences) if preferences else '无特殊偏好'}",
+            f"本天可用预算：{remaining:.0f}元",
+        ]
+        if neighbours:
+            lines.append("相邻天安排：" + "；".join(neighbours))
+        return "\n".join(lines)
+    
+    @staticmethod
+    def _find_day(itinerary: List[Dict[str, Any]], day: int) -> Optional[Dict[str, Any]]:
+        """在行程中查找指定天"""
+        for item in itinerary:
+            if item.get("day") == day:
+                return item
+        return None
+    
+    @staticmethod
+    def _sum_activity_cost(activities: List[Dict[str, Any]]) -> float:
+        """汇总活动费用"""
+        total = 0.0
+        for activity in activities:
             try:
-                logger.info(f"第 {attempt + 1} 次尝试调用 API...")
-                
-                # 使用 OpenAI 客户端调用通义千问
-                loop = asyncio.get_event_loop()
-                completion = await loop.run_in_executor(
-                    None,
-                    lambda: self.client.chat.completions.create(
-                        model="qwen-turbo",
-                        messages=[
-                            {"role": "system", "content": "你是一个专业的旅行规划助手。请严格按照要求返回JSON格式的行程计划。"},
-                            {"role": "user", "content": prompt}
-                        ],
-                        temperature=0.7,
-                        max_tokens=16000,
-                        timeout=120
+                total += float(activity.get("cost") or 0)
+            except (TypeError, ValueError):
+                continue
+        return total
+    
+    @staticmethod
+    def _response_format(provider: LLMProvider) -> Optional[Dict[str, Any]]:
+        """根据服务的配置返回 response_format 参数"""
+        mode = provider.response_format
+        if mode == "json_schema":
+            return {
+                "type": "json_schema",
+                "json_schema": {"name": "itinerary", "schema": itinerary_json_schema()}
+            }
+        if mode == "json_object":
+            return {"type": "json_object"}
+        return None
+    
+    def _request_completion(
+        self,
+        provider: LLMProvider,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        structured: bool,
+        default_location: str,
+        usage: Dict[str, Any],
+        cancelled: threading.Event
+    ) -> Any:
+        """
+        同步请求模型（在线程池中执行）；结构化模式下流式接收并逐个校验活动
+        
+        结构化模式返回流式校验时已修复好的行程（按天的列表），未识别出任何一天时返回原始文本；
+        输出因 max_tokens 被截断时抛出异常，不返回残缺的行程。非结构化模式返回文本。usage 会被就地填充 prompt_tokens/completion_tokens/ttft/truncated，
+        失败时也保留已获得的部分。cancelled 被置位（对冲请求中其他服务已先返回）时停止接收
+        """
+        started = time.perf_counter()
+        if not structured:
+            completion = provider.client.chat.completions.create(
+                model=provider.model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                timeout=settings.LLM_REQUEST_TIMEOUT
+            )
+            self._fill_usage(usage, completion.usage)
+            usage["truncated"] = completion.choices[0].finish_reason == "length"
+            return completion.choices[0].message.content
+        
+        kwargs = {}
+        response_format = self._response_format(provider)
+        if response_format:
+            kwargs["response_format"] = response_format
+        
+        stream = provider.client.chat.completions.create(
+            model=provider.model,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=max_tokens,
+            timeout=settings.LLM_REQUEST_TIMEOUT,
+            stream=True,
+            stream_options={"include_usage": True},
+            **kwargs
+        )
+        
+        validator = StreamingActivityValidator(default_location)
+        try:
+            for chunk in stream:
+                if cancelled.is_set():
+                    raise LLMRequestCancelled()
+                # 开启 include_usage 后，最后一个块只携带用量信息
+                if chunk.usage:
+                    self._fill_usage(usage, chunk.usage)
+                if not chunk.choices:
+                    continue
+                if chunk.choices[0].finish_reason == "length":
+                    usage["truncated"] = True
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if usage.get("ttft") is None:
+                    usage["ttft"] = time.perf_counter() - started
+                validator.feed(delta)
+                if validator.should_abort():
+                    raise Exception(
+                        f"结构化输出无效活动过多（丢弃 {validator.rejected} 个），提前中止生成"
                     )
+        finally:
+            stream.close()
+        
+        if usage.get("truncated"):
+            raise Exception(f"模型输出达到 max_tokens={max_tokens} 上限被截断")
+        
+        logger.info(
+            f"流式校验完成: 有效活动 {len(validator.accepted)} 个，"
+            f"修复 {validator.repaired} 个，丢弃 {validator.rejected} 个"
+        )
+        return validator.days or validator.text
+    
+    @staticmethod
+    def _fill_usage(usage: Dict[str, Any], completion_usage: Any):
+        """从接口返回的 usage 中提取 token 数"""
+        if completion_usage is None:
+            return
+        usage["prompt_tokens"] = getattr(completion_usage, "prompt_tokens", 0) or 0
+        usage["completion_tokens"] = getattr(completion_usage, "completion_tokens", 0) or 0
+    
+    async def _call_qianwen_api(
+        self,
+        prompt: str,
+        max_tokens: int = 16000,
+        structured: bool = False,
+        default_location: str = "",
+        endpoint: str = "default",
+        user_id: Optional[int] = None,
+        days: Optional[int] = None
+    ) -> Any:
+        """
+        调用通义千问API；structured=True 时可能直接返回已修复的行程列表，见 _request_completion
+        
+        故障转移和对冲由服务池负责，每个服务只请求一次，这里不再重试
+        """
+        logger.info(f"调用通义千问 API，max_tokens={max_tokens}")
+        
+        # 使用 OpenAI 客户端调用通义千问
+        messages = [
+            {"role": "system", "content": "你是一个专业的旅行规划助手。请严格按照要求返回JSON格式的行程计划。"},
+            {"role": "user", "content": prompt}
+        ]
+        
+        def request(provider: LLMProvider, cancelled: threading.Event) -> Any:
+            # 对冲时同一次调用可能并行请求多个服务，各自独立统计
+            usage: Dict[str, Any] = {}
+            started = time.perf_counter()
+            failed = True
+            try:
+                content = self._request_completion(
+                    provider, messages, max_tokens, structured, default_location, usage, cancelled
                 )
-                
-                logger.info("API 调用成功，正在解析响应...")
-                response_content = completion.choices[0].message.content
-                
-                if response_content:
-                    return response_content
-                else:
+                if not content:
                     raise Exception("API 返回空响应")
-                    
-            except Exception as e:
-                logger.error(f"API 调用出现错误 (第 {attempt + 1} 次): {str(e)}")
-                
-                # 检查是否是认证错误
-                if "401" in str(e) or "unauthorized" in str(e).lower():
-                    logger.error("API 密钥无效或已过期")
-                    raise Exception("API 密钥无效，请检查 QIANWEN_API_KEY 配置")
-                
-                # 检查是否是频率限制
-                if "429" in str(e) or "rate limit" in str(e).lower():
-                    logger.warning("API 调用频率限制，等待重试...")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(5)
-                        continue
-                    else:
-                        raise Exception("API 调用频率限制，请稍后再试")
-                
-                # 检查是否是超时错误
-                if "timeout" in str(e).lower():
-                    logger.warning(f"API 调用超时 (第 {attempt + 1} 次)")
-                    if attempt < max_retries - 1:
-                        logger.info("等待 3 秒后重试...")
-                        await asyncio.sleep(3)
-                        continue
-                    else:
-                        logger.error("API 调用多次超时，放弃重试")
-                        raise Exception("API 调用超时，请检查网络连接或稍后再试")
-                
-                # 其他错误
-                if attempt < max_retries - 1:
-                    logger.info("等待 2 秒后重试...")
-                    await asyncio.sleep(2)
-                    continue
-                else:
-                    raise Exception(f"API 调用失败: {str(e)}")
+                failed = False
+                return content
+            except LLMRequestCancelled:
+                failed = False
+                raise
+            finally:
+                llm_usage_tracker.record(
+                    endpoint,
+                    user_id=user_id,
+                    provider=provider.name,
+                    prompt_tokens=usage.get("prompt_tokens", 0),
+                    completion_tokens=usage.get("completion_tokens", 0),
+                    latency=time.perf_counter() - started,
+                    ttft=usage.get("ttft"),
+                    days=days,
+                    error=failed,
+                    truncated=usage.get("truncated", False)
+                )
+        
+        try:
+            response_content = await self.providers.run(request)
+        except Exception as e:
+            logger.error(f"API 调用出现错误: {str(e)}")
+            
+            # 检查是否是认证错误
+            if "401" in str(e) or "unauthorized" in str(e).lower():
+                logger.error("API 密钥无效或已过期")
+                raise Exception("API 密钥无效，请检查 QIANWEN_API_KEY 配置")
+            
+            # 检查是否是频率限制
+            if "429" in str(e) or "rate limit" in str(e).lower():
+                raise Exception("API 调用频率限制，请稍后再试")
+            
+            # 检查是否是超时错误
+            if "timeout" in str(e).lower():
+                raise Exception("API 调用超时，请检查网络连接或稍后再试")
+            
+            raise Exception(f"API 调用失败: {str(e)}")
+        
+        logger.info("API 调用成功，正在解析响应...")
+        return response_content
+    
+    def _extract_json(self, response: str) -> Any:
+        """从模型响应中提取JSON数据"""
+        if "```json" in response:
+            json_start = response.find("```json") + 7
+            json_end = response.find("```", json_start)
+            json_str = response[json_start:json_end].strip()
+        elif "{" in response:
+            json_start = response.find("{")
+            json_end = response.rfind("}") + 1
+            json_str = response[json_start:json_end]
+        else:
+            raise ValueError("无法找到JSON数据")
+        
+        return json.loads(json_str)
     
-    def _parse_ai_response(self, response: str, start_date: datetime, days: int) -> List[Dict[str, Any]]:
+    def _parse_ai_response(
+        self,
+        response: str,
+        start_date: datetime,
+        days: int,
+        destination: Optional[str] = None,
+        people_count: int = 1,
+        preferences: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
         """解析AI响应并构建标准格式的行程数据"""
         try:
-            # 尝试解析JSON
-            if "```json" in response:
-                json_start = response.find("```json") + 7
-                json_end = response.find("```", json_start)
-                json_str = response[json_start:json_end].strip()
-            elif "{" in response:
-                json_start = response.find("{")
-                json_end = response.rfind("}") + 1
-                json_str = response[json_start:json_end]
-            else:
-                raise ValueError("无法找到JSON数据")
-            
-            data = json.loads(json_str)
+            data = self._extract_json(response)
             
-            if "itinerary" in data:
-                return data["itinerary"]
+            if isinstance(data, dict) and "itinerary" in data:
+                itinerary = data["itinerary"]
             else:
-                return data if isinstance(data, list) else []
+                itinerary = data if isinstance(data, list) else []
+            
+            # 修复非法类型/时间/费用，丢弃无法修复的活动
+            itinerary, rejected = repair_itinerary(itinerary, destination or "")
+            if rejected:
+                logger.warning(f"AI 行程中有 {rejected} 个活动无法修复，已丢弃")
+            return itinerary
                 
         except (json.JSONDecodeError, ValueError):
             # 如果解析失败，返回默认计划
-            return self._generate_default_itinerary(start_date, days)
+            return self._generate_default_itinerary(start_date, days, destination, people_count, preferences)
     
-    def _generate_default_itinerary(self, start_date: datetime, days: int) -> List[Dict[str, Any]]:
-        """生成默认行程计划"""
+    def _generate_default_itinerary(
+        self,
+        start_date: datetime,
+        days: int,
+        destination: Optional[str] = None,
+        people_count: int = 1,
+        preferences: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """生成默认行程计划（优先使用本地 POI 库）"""
+        if destination:
+            draft = poi_library_service.build_draft_itinerary(
+                destination, start_date, days, people_count, preferences
+            )
+            if draft is not None:
+                return draft
+        
         itinerary = []
         
         for day in range(days):
@@ -278,16 +605,22 @@ class AITravelPlannerService:
         start_date: datetime,
         days: int,
         budget: float,
-        people_count: int
+        people_count: int,
+        preferences: Optional[List[str]] = None
     ) -> Dict[str, Any]:
         """生成备用计划（当AI服务不可用时）"""
-        itinerary = self._generate_default_itinerary(start_date, days)
+        itinerary = self._generate_default_itinerary(start_date, days, destination, people_count, preferences)
+        
+        if poi_library_service.has_city(destination):
+            note = "AI服务不可用，已根据本地景点库生成草稿行程"
+        else:
+            note = "使用默认模板生成，建议手动调整"
         
         return {
             "success": True,
             "itinerary": itinerary,
             "estimated_cost": self._calculate_total_cost(itinerary),
-            "note": "使用默认模板生成，建议手动调整"
+            "note": note
         }
 
 # 创建服务实例
@@ -0,0 +1,611 @@
+"""
+音频解码与重采样流水线
+把浏览器上传的 WebM/Opus、OGG、MP3 等压缩音频或任意采样率的 PCM，
+流式转换为科大讯飞要求的 16kHz 16bit 单声道 PCM
+"""
+
+import io
+import itertools
+import logging
+import re
+import struct
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import av
+    AV_AVAILABLE = True
+except ImportError:
+    AV_AVAILABLE = False
+    logger.warning("PyAV 未安装，无法解码压缩音频，请运行: pip install av")
+
+TARGET_SAMPLE_RATE = 16000
+# 接受的输入采样率范围；过低的采样率重采样后会把很小的输入放大成巨大的输出
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 192000
+# 分块处理时每块的字节数
+DECODE_CHUNK_BYTES = 64 * 1024
+# 流式读取 WAV 时文件头（data 块之前的所有块）的最大字节数
+MAX_WAV_HEADER_BYTES = 1024 * 1024
+# 抗混叠低通滤波器的阶数
+FIR_TAPS = 63
+
+# 常见压缩音频容器的文件头
+_COMPRESSED_MAGIC = (
+    b"\x1aE\xdf\xa3",  # WebM / Matroska
+    b"OggS",           # Ogg (Opus / Vorbis)
+    b"ID3",            # MP3 (ID3 标签)
+    b"\xff\xfb",       # MP3 帧
+    b"\xff\xf3",
+    b"\xff\xf2",
+    b"fLaC",           # FLAC
+)
+_COMPRESSED_TYPES = ("webm", "ogg", "opus", "mpeg", "mp3", "mp4", "aac", "flac", "x-m4a")
+_RATE_RE = re.compile(r"rate=(\d+)")
+_CHANNELS_RE = re.compile(r"channels=(\d+)")
+
+
+# WAV fmt 块中的编码类型
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioFormatError(ValueError):
+    """音频无法解码或格式不受支持"""
+
+
+class WavInfo:
+    """WAV 文件 fmt 块中的格式信息"""
+
+    def __init__(self, format_tag: int, channels: int, sample_rate: int, bits_per_sample: int):
+        self.format_tag = format_tag
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.bits_per_sample = bits_per_sample
+
+    @property
+    def sample_width(self) -> int:
+        return self.bits_per_sample // 8
+
+    @property
+    def is_float(self) -> bool:
+        return self.format_tag == WAVE_FORMAT_IEEE_FLOAT
+
+    @property
+    def is_asr_ready(self) -> bool:
+        """是否已经是讯飞要求的 16kHz 16bit 单声道 PCM"""
+        return (
+            self.format_tag == WAVE_FORMAT_PCM
+            and self.channels == 1
+            and self.sample_rate == TARGET_SAMPLE_RATE
+            and self.bits_per_sample == 16
+        )
+
+    def __repr__(self) -> str:
+        kind = "float" if self.is_float else "PCM"
+        return f"{self.sample_rate}Hz {self.bits_per_sample}bit {kind} {self.channels}ch"
+
+
+def iter_chunks(data: Union[bytes, memoryview], chunk_size: int = DECODE_CHUNK_BYTES) -> Iterator[memoryview]:
+    """按固定大小切分音频数据（零拷贝）"""
+    view = memoryview(data)
+    for i in range(0, len(view), chunk_size):
+        yield view[i:i + chunk_size]
+
+
+def is_compressed(head: bytes, content_type: Optional[str] = None) -> bool:
+    """根据文件头（优先）或 Content-Type 判断是否为压缩音频"""
+    if head.startswith(_COMPRESSED_MAGIC):
+        return True
+    if head[:4] == b"RIFF":
+        return False
+    if content_type:
+        return any(t in content_type.lower() for t in _COMPRESSED_TYPES)
+    return False
+
+
+def check_sample_rate(rate: int) -> int:
+    """校验输入采样率在 MIN_SAMPLE_RATE ~ MAX_SAMPLE_RATE 之间"""
+    if not MIN_SAMPLE_RATE <= rate <= MAX_SAMPLE_RATE:
+        raise AudioFormatError(f"不支持的采样率: {rate}Hz（支持 {MIN_SAMPLE_RATE}~{MAX_SAMPLE_RATE}Hz）")
+    return rate
+
+
+def parse_raw_format(content_type: Optional[str]) -> tuple:
+    """
+    从 audio/L16;rate=44100;channels=2 这类 Content-Type 中读取采样率和声道数
+
+    Raises:
+        AudioFormatError: 采样率超出支持范围
+    """
+    rate = TARGET_SAMPLE_RATE
+    channels = 1
+    if content_type:
+        rate_match = _RATE_RE.search(content_type)
+        channels_match = _CHANNELS_RE.search(content_type)
+        if rate_match:
+            rate = check_sample_rate(int(rate_match.group(1)))
+        if channels_match:
+            channels = int(channels_match.group(1))
+    return rate, channels
+
+
+class StreamingResampler:
+    """
+    流式重采样为 16kHz 单声道 float32
+
+    降采样时先用加窗 sinc FIR 低通滤波抗混叠，再线性插值；
+    两步都在块之间保留少量状态，内存占用与输入总长度无关。
+    """
+
+    def __init__(self, src_rate: int, dst_rate: int = TARGET_SAMPLE_RATE):
+        check_sample_rate(src_rate)
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self.ratio = src_rate / dst_rate
+        self._pos = 0.0
+        self._tail = np.zeros(0, dtype=np.float32)
+
+        self._fir: Optional[np.ndarray] = None
+        self._fir_state = np.zeros(0, dtype=np.float32)
+        if src_rate > dst_rate:
+            cutoff = 0.5 * dst_rate / src_rate * 0.9
+            n = np.arange(FIR_TAPS) - (FIR_TAPS - 1) / 2
+            taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(FIR_TAPS)
+            self._fir = (taps / taps.sum()).astype(np.float32)
+            self._fir_state = np.zeros(FIR_TAPS - 1, dtype=np.float32)
+
+    def _lowpass(self, samples: np.ndarray) -> np.ndarray:
+        x = np.concatenate([self._fir_state, samples])
+        self._fir_state = x[-(FIR_TAPS - 1):]
+        return np.convolve(x, self._fir, mode="valid").astype(np.float32)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """处理一块单声道 float32 样本，返回重采样后的样本"""
+        if self.src_rate == self.dst_rate:
+            return samples
+        if self._fir is not None:
+            samples = self._lowpass(samples)
+
+        x = np.concatenate([self._tail, samples])
+        last = len(x) - 1
+        if last < 1 or self._pos > last:
+            self._tail = x
+            return np.zeros(0, dtype=np.float32)
+
+        count = int((last - self._pos) // self.ratio) + 1
+        positions = self._pos + np.arange(count) * self.ratio
+        index = positions.astype(np.int64)
+        frac = (positions - index).astype(np.float32)
+        out = x[index] * (1 - frac) + x[np.minimum(index + 1, last)] * frac
+
+        next_pos = self._pos + count * self.ratio
+        keep_from = min(int(next_pos), last)
+        self._tail = x[keep_from:]
+        self._pos = next_pos - keep_from
+        return out.astype(np.float32)
+
+
+def to_mono_float(array: np.ndarray, channels: int, planar: bool) -> np.ndarray:
+    """把 PyAV/PCM 样本数组转换为单声道 float32（-1 ~ 1）"""
+    if np.issubdtype(array.dtype, np.integer):
+        scale = float(np.iinfo(array.dtype).max)
+        array = array.astype(np.float32) / scale
+    else:
+        array = array.astype(np.float32, copy=False)
+
+    if channels <= 1:
+        return array.reshape(-1)
+    if planar:
+        return array.reshape(channels, -1).mean(axis=0)
+    return array.reshape(-1, channels).mean(axis=1)
+
+
+def float_to_pcm16(samples: np.ndarray) -> bytes:
+    """float32 样本转换为 16bit 小端 PCM"""
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def whole_samples(pcm: Union[bytes, memoryview]) -> Union[bytes, memoryview]:
+    """丢弃末尾不足一个 16bit 样本的字节（奇数长度的原始 PCM 或 WAV data 块）"""
+    if len(pcm) % 2:
+        return memoryview(pcm)[:len(pcm) & ~1]
+    return pcm
+
+
+def _pcm_to_array(data: bytes, sample_width: int, is_float: bool) -> np.ndarray:
+    """把交错排列的 PCM 字节转换为 NumPy 数组"""
+    if is_float:
+        return np.frombuffer(data, dtype="<f4" if sample_width == 4 else "<f8")
+    if sample_width == 1:
+        # 8bit PCM 是无符号的，平移到 int8 范围
+        return (np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128).astype(np.int8)
+    if sample_width == 3:
+        # 24bit 补一个低位字节后按 int32 解释
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        padded = np.zeros((len(raw), 4), dtype=np.uint8)
+        padded[:, 1:] = raw
+        return padded.view("<i4").reshape(-1)
+    return np.frombuffer(data, dtype="<i2" if sample_width == 2 else "<i4")
+
+
+def resample_pcm_chunks(
+    chunks: Iterable[bytes],
+    sample_rate: int,
+    channels: int = 1,
+    sample_width: int = 2,
+    is_float: bool = False
+) -> Iterator[bytes]:
+    """把任意采样率/声道数/位深的 PCM 块流式转换为 16kHz 单声道 16bit PCM"""
+    if is_float and sample_width not in (4, 8):
+        raise AudioFormatError(f"不支持的浮点位深: {sample_width * 8}bit")
+    if not is_float and sample_width not in (1, 2, 3, 4):
+        raise AudioFormatError(f"不支持的位深: {sample_width * 8}bit")
+    if channels < 1:
+        raise AudioFormatError(f"非法声道数: {channels}")
+
+    frame_bytes = sample_width * channels
+    resampler = StreamingResampler(sample_rate)
+    remainder = b""
+
+    for chunk in chunks:
+        data = remainder + bytes(chunk)
+        usable = len(data) - len(data) % frame_bytes
+        remainder = data[usable:]
+        if not usable:
+            continue
+
+        array = _pcm_to_array(data[:usable], sample_width, is_float)
+        samples = to_mono_float(array, channels, planar=False)
+        out = resampler.process(samples)
+        if len(out):
+            yield float_to_pcm16(out)
+
+
+def parse_wav_header(head: Union[bytes, bytearray, memoryview]) -> Optional[Tuple[WavInfo, int, Optional[int]]]:
+    """
+    遍历 RIFF 块，解析 fmt 块并定位 data 块；只需要文件开头的一部分
+
+    Returns:
+        (格式信息, data 内容起始偏移, data 长度)；长度未知（边录边写）时为 None。
+        文件头尚未读完整时返回 None
+
+    Raises:
+        AudioFormatError: 不是合法的 WAV 文件或编码不受支持
+    """
+    view = memoryview(head)
+    if len(view) < 12:
+        return None
+    if view[:4] != b"RIFF" or view[8:12] != b"WAVE":
+        raise AudioFormatError("不是有效的WAV文件")
+
+    info: Optional[WavInfo] = None
+    pos = 12
+
+    while pos + 8 <= len(view):
+        chunk_id = view[pos:pos + 4].tobytes()
+        size = struct.unpack_from("<I", view, pos + 4)[0]
+        body = pos + 8
+
+        if chunk_id == b"fmt ":
+            if size < 16:
+                raise AudioFormatError("WAV 文件 fmt 块不完整")
+            if body + size > len(view):
+                return None
+            format_tag, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", view, body)
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and size >= 40:
+                # 真实编码在 SubFormat GUID 的前两个字节
+                format_tag = struct.unpack_from("<H", view, body + 24)[0]
+            info = WavInfo(format_tag, channels, sample_rate, bits)
+        elif chunk_id == b"data":
+            if info is None:
+                raise AudioFormatError("WAV 文件缺少 fmt 块")
+            if info.format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+                raise AudioFormatError(f"不支持的 WAV 编码: 0x{info.format_tag:04x}")
+            if info.channels < 1 or info.bits_per_sample % 8:
+                raise AudioFormatError(f"WAV 格式参数非法: {info}")
+            check_sample_rate(info.sample_rate)
+            # 边录边写的 WAV 可能把长度写成 0 或 0xFFFFFFFF，此时取到文件末尾
+            return info, body, None if size in (0, 0xFFFFFFFF) else size
+
+        # 块长度为奇数时有一个填充字节
+        pos = body + size + (size & 1)
+
+    return None
+
+
+def parse_wav(data: Union[bytes, memoryview]) -> Tuple[WavInfo, memoryview]:
+    """
+    解析完整的 WAV 文件
+
+    Returns:
+        (格式信息, data 块内容的 memoryview)，不复制音频数据
+    """
+    view = memoryview(data)
+    header = parse_wav_header(view)
+    if header is None:
+        raise AudioFormatError("WAV 文件缺少 data 块")
+
+    info, offset, size = header
+    end = len(view) if size is None else min(offset + size, len(view))
+    return info, view[offset:end]
+
+
+def iter_wav_pcm(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """流式读取 WAV：攒够文件头后逐块输出 16kHz 单声道 16bit PCM"""
+    chunks = iter(chunks)
+    head = bytearray()
+    header = None
+    for chunk in chunks:
+        head += chunk
+        header = parse_wav_header(head)
+        if header is not None:
+            break
+        if len(head) > MAX_WAV_HEADER_BYTES:
+            raise AudioFormatError("WAV 文件头过大")
+    if header is None:
+        raise AudioFormatError("WAV 文件缺少 data 块")
+
+    info, offset, size = header
+    first = bytes(head[offset:])
+    del head
+
+    def payload() -> Iterator[bytes]:
+        remaining = size
+        for piece in itertools.chain([first], chunks):
+            if remaining is not None:
+                piece = piece[:remaining]
+                remaining -= len(piece)
+            if piece:
+                yield piece
+            if remaining == 0:
+                return
+
+    if info.is_asr_ready:
+        yield from payload()
+    else:
+        logger.info(f"WAV 格式为 {info}，重采样为 16kHz 16bit 单声道")
+        yield from resample_pcm_chunks(payload(), info.sample_rate, info.channels, info.sample_width, info.is_float)
+
+
+def iter_pcm16k(chunks: Iterable[bytes], content_type: Optional[str] = None) -> Iterator[bytes]:
+    """
+    上传音频分块 -> 16kHz 16bit 单声道 PCM 分块的同步生成器流水线
+
+    根据第一个分块的文件头选择解码方式：压缩音频用 PyAV，WAV 解析 RIFF 块，
+    其余按 content_type 中声明的采样率/声道数视为原始 PCM
+    """
+    chunks = iter(chunks)
+    head = b""
+    for chunk in chunks:
+        head += bytes(chunk)
+        if len(head) >= 12:
+            break
+    if not head:
+        return
+    source = itertools.chain([head], chunks)
+
+    if is_compressed(head[:4], content_type):
+        yield from decode_compressed_chunks(source)
+    elif head[:4] == b"RIFF":
+        yield from iter_wav_pcm(source)
+    else:
+        rate, channels = parse_raw_format(content_type)
+        if rate == TARGET_SAMPLE_RATE and channels == 1:
+            yield from source
+        else:
+            yield from resample_pcm_chunks(source, rate, channels)
+
+
+def iter_file_chunks(fileobj: BinaryIO, chunk_size: int = DECODE_CHUNK_BYTES) -> Iterator[bytes]:
+    """按块读取文件对象"""
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def convert_wav(info: WavInfo, payload: memoryview) -> bytes:
+    """把不符合要求的 WAV 数据转换为 16kHz 单声道 16bit PCM"""
+    return b"".join(resample_pcm_chunks(
+        iter_chunks(payload),
+        info.sample_rate,
+        info.channels,
+        info.sample_width,
+        info.is_float
+    ))
+
+
+class _ChunkReader(io.RawIOBase):
+    """把字节块迭代器包装成 PyAV 可读取的不可寻址文件对象"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = bytes(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def decode_compressed_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """流式解码 WebM/Opus、OGG、MP3 等压缩音频为 16kHz 单声道 PCM"""
+    if not AV_AVAILABLE:
+        raise AudioFormatError("服务器未安装 PyAV，无法解码压缩音频")
+
+    try:
+        container = av.open(_ChunkReader(chunks), mode="r")
+    except Exception as e:
+        raise AudioFormatError(f"无法识别的音频格式: {str(e)}")
+
+    try:
+        if not container.streams.audio:
+            raise AudioFormatError("文件中没有音频流")
+        stream = container.streams.audio[0]
+        resampler: Optional[StreamingResampler] = None
+
+        for frame in container.decode(stream):
+            if resampler is None or resampler.src_rate != frame.sample_rate:
+                resampler = StreamingResampler(frame.sample_rate)
+            samples = to_mono_float(
+                frame.to_ndarray(),
+                len(frame.layout.channels),
+                frame.format.is_planar
+            )
+            out = resampler.process(samples)
+            if len(out):
+                yield float_to_pcm16(out)
+    except AudioFormatError:
+        raise
+    except Exception as e:
+        raise AudioFormatError(f"音频解码失败: {str(e)}")
+    finally:
+        container.close()
+
+
+def _speech_mask(frames: np.ndarray, margin_db: float, min_speech_db: float, pad: int) -> np.ndarray:
+    """
+    逐帧判断是否为语音，并向前后各扩展 pad 帧
+
+    阈值为“噪声底（能量第 10 百分位）+ margin_db”，且不低于 min_speech_db；
+    能量略低但过零率高的帧（s、x、sh 等清辅音）也视为语音。
+    """
+    x = frames.astype(np.float32) / 32768.0
+    energy_db = 10 * np.log10(np.mean(x * x, axis=1) + 1e-10)
+    zcr = np.mean(np.signbit(x[:, 1:]) != np.signbit(x[:, :-1]), axis=1)
+
+    threshold = max(float(np.percentile(energy_db, 10)) + margin_db, min_speech_db)
+    speech = (energy_db > threshold) | ((energy_db > threshold - 6) & (zcr > 0.25))
+    if pad > 0 and speech.any():
+        # 用 int32 求窗口和，int8 在窗口内语音帧超过 127 时会溢出为负数
+        speech = np.convolve(speech.astype(np.int32), np.ones(2 * pad + 1, dtype=np.int32), mode="same") > 0
+    return speech
+
+
+def trim_silence(
+    pcm: Union[bytes, memoryview],
+    frame_ms: int = 20,
+    margin_db: float = 10.0,
+    min_speech_db: float = -50.0,
+    padding_ms: int = 200,
+    max_pause_ms: int = 600
+) -> Tuple[Union[bytes, memoryview], Dict[str, Any]]:
+    """
+    基于短时能量和过零率的语音活动检测，裁掉首尾静音并压缩过长的停顿
+
+    语音段前后各保留 padding_ms，内部停顿最多保留 max_pause_ms。
+
+    Returns:
+        (处理后的 16kHz 16bit PCM, 统计信息)；未检测到语音时原样返回
+    """
+    pcm = whole_samples(pcm)
+    frame_len = TARGET_SAMPLE_RATE * frame_ms // 1000
+    samples = np.frombuffer(pcm, dtype="<i2")
+    frame_count = len(samples) // frame_len
+    stats = {
+        "original_ms": len(samples) * 1000 // TARGET_SAMPLE_RATE,
+        "kept_ms": len(samples) * 1000 // TARGET_SAMPLE_RATE,
+        "removed_ms": 0,
+        "speech_detected": True,
+    }
+    if frame_count < 3:
+        return pcm, stats
+
+    frames = samples[:frame_count * frame_len].reshape(frame_count, frame_len)
+    speech = _speech_mask(frames, margin_db, min_speech_db, padding_ms // frame_ms)
+    if not speech.any():
+        stats["speech_detected"] = False
+        return pcm, stats
+
+    keep = speech.copy()
+    first, last = np.flatnonzero(speech)[[0, -1]]
+    keep[:first] = False
+    keep[last + 1:] = False
+
+    # 内部静音段只保留前后各一半的 max_pause
+    max_pause = max_pause_ms // frame_ms
+    edges = np.diff(np.concatenate(([1], speech[first:last + 1].astype(np.int8), [1])))
+    for start, end in zip(np.flatnonzero(edges == -1), np.flatnonzero(edges == 1)):
+        if end - start > max_pause:
+            head = max_pause // 2
+            keep[first + start + head:first + end - (max_pause - head)] = False
+
+    # 不足一帧的尾部随最后一帧一起保留/丢弃
+    if keep.all():
+        return pcm, stats
+
+    kept = frames[keep].tobytes()
+    if keep[-1]:
+        kept += samples[frame_count * frame_len:].tobytes()
+
+    kept_ms = len(kept) // 2 * 1000 // TARGET_SAMPLE_RATE
+    stats["kept_ms"] = kept_ms
+    stats["removed_ms"] = stats["original_ms"] - kept_ms
+    return kept, stats
+
+
+def split_on_pauses(
+    pcm: Union[bytes, memoryview],
+    min_pause_ms: int = 800,
+    min_segment_ms: int = 300,
+    frame_ms: int = 20,
+    margin_db: float = 10.0,
+    min_speech_db: float = -50.0,
+    padding_ms: int = 200
+) -> List[Tuple[int, int, memoryview]]:
+    """
+    按长停顿把一段录音切分成多段（例如连续口述的多笔费用）
+
+    Returns:
+        [(开始毫秒, 结束毫秒, 该段 PCM 的 memoryview)]；未检测到停顿时只有一段
+    """
+    view = memoryview(whole_samples(pcm))
+    frame_len = TARGET_SAMPLE_RATE * frame_ms // 1000
+    samples = np.frombuffer(view, dtype="<i2")
+    frame_count = len(samples) // frame_len
+    if frame_count < 3:
+        return [(0, len(samples) * 1000 // TARGET_SAMPLE_RATE, view)]
+
+    frames = samples[:frame_count * frame_len].reshape(frame_count, frame_len)
+    speech = _speech_mask(frames, margin_db, min_speech_db, padding_ms // frame_ms)
+    if not speech.any():
+        return []
+
+    # 找出所有语音段，间隔短于 min_pause 的相邻段合并
+    edges = np.diff(np.concatenate(([0], speech.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    min_gap = min_pause_ms // frame_ms - 2 * (padding_ms // frame_ms)
+    segments: List[List[int]] = []
+    for start, end in zip(starts, ends):
+        if segments and start - segments[-1][1] < max(min_gap, 1):
+            segments[-1][1] = end
+        else:
+            segments.append([start, end])
+
+    result = []
+    bytes_per_frame = frame_len * 2
+    for start, end in segments:
+        if (end - start) * frame_ms < min_segment_ms:
+            continue
+        result.append((
+            int(start) * frame_ms,
+            int(end) * frame_ms,
+            view[start * bytes_per_frame:end * bytes_per_frame]
+        ))
+    return result
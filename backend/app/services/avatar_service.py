@@ -0,0 +1,211 @@
+"""
+头像存储服务
+上传的图片按内容哈希命名，裁剪为正方形并生成多种尺寸后写入本地目录或 Supabase Storage，
+数据库只保存不可变的图片 URL
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import os
+import re
+from typing import Dict, Optional, Tuple
+from starlette.staticfiles import StaticFiles
+from app.core.config import settings
+from app.services.database_service import db
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    logger.warning("Pillow 未安装，无法处理头像上传，请运行: pip install Pillow")
+
+# 允许上传的图片格式
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}
+# 头像主图边长，以及额外生成的缩略图边长
+AVATAR_SIZE = 256
+THUMBNAIL_SIZES = (64,)
+# 解码前限制像素总数，防止解压炸弹
+MAX_IMAGE_PIXELS = 40_000_000
+# 保存的头像路径：哈希前两位/内容哈希/边长.jpg；Supabase 的公开 URL 末尾可能带一个 "?"
+STORED_PATH_RE = re.compile(r"[0-9a-f]{2}/[0-9a-f]{64}/\d+\.jpg\??")
+# 内容不可变，浏览器和 CDN 可以永久缓存
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class AvatarError(ValueError):
+    """头像图片无效"""
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """为按内容哈希命名的静态文件加上永久缓存头"""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+def decode_data_url(data_url: str) -> bytes:
+    """解析 data:image/...;base64,... 形式的头像"""
+    header, _, payload = data_url.partition(",")
+    if not header.startswith("data:image/") or ";base64" not in header:
+        raise AvatarError("头像必须是 base64 编码的图片")
+    try:
+        return base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        raise AvatarError("头像 base64 数据无效")
+
+
+def render_avatar(data: bytes) -> Dict[int, bytes]:
+    """居中裁剪为正方形，按各尺寸输出 JPEG，返回 {边长: 图片数据}"""
+    if not PIL_AVAILABLE:
+        raise AvatarError("服务器未安装图片处理库")
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.format not in ALLOWED_FORMATS:
+            raise AvatarError(f"不支持的图片格式: {image.format}")
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except AvatarError:
+        raise
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise AvatarError("无法识别的图片")
+
+    # 透明背景铺白色
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    else:
+        image = image.convert("RGB")
+
+    renditions = {}
+    for size in (AVATAR_SIZE, *THUMBNAIL_SIZES):
+        square = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        square.save(buffer, format="JPEG", quality=85, optimize=True)
+        renditions[size] = buffer.getvalue()
+    return renditions
+
+
+class LocalAvatarStorage:
+    """写入本地目录，由 /media/avatars 静态路由提供访问"""
+
+    def __init__(self, directory: str, base_url: str):
+        self.directory = directory
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(os.path.join(self.directory, path))
+
+    def save(self, path: str, content: bytes):
+        target = os.path.join(self.directory, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # 先写临时文件再原子替换，避免并发请求读到半个文件
+        temp = f"{target}.{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(content)
+        os.replace(temp, target)
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path}"
+
+    @property
+    def url_prefix(self) -> str:
+        return f"{self.base_url}/"
+
+
+class SupabaseAvatarStorage:
+    """写入 Supabase Storage 的公开存储桶"""
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+
+    def _bucket(self):
+        return db.client.storage.from_(self.bucket)
+
+    def exists(self, path: str) -> bool:
+        return self._bucket().exists(path)
+
+    def save(self, path: str, content: bytes):
+        self._bucket().upload(path, content, {
+            "content-type": "image/jpeg",
+            "cache-control": "31536000",
+            "upsert": "true",
+        })
+
+    def url(self, path: str) -> str:
+        return self._bucket().get_public_url(path)
+
+    @property
+    def url_prefix(self) -> str:
+        return f"{settings.SUPABASE_URL.rstrip('/')}/storage/v1/object/public/{self.bucket}/"
+
+
+class AvatarService:
+    """头像处理与存储"""
+
+    def __init__(self):
+        if settings.AVATAR_STORAGE == "supabase" and db.is_enabled():
+            self.storage = SupabaseAvatarStorage(settings.AVATAR_BUCKET)
+        else:
+            self.storage = LocalAvatarStorage(settings.AVATAR_STORAGE_DIR, settings.AVATAR_BASE_URL)
+
+    @staticmethod
+    def _path(digest: str, size: int) -> str:
+        return f"{digest[:2]}/{digest}/{size}.jpg"
+
+    def is_stored_url(self, url: str) -> bool:
+        """是否为本服务保存的头像 URL（存储地址前缀 + 内容哈希路径）"""
+        prefix = self.storage.url_prefix
+        return url.startswith(prefix) and STORED_PATH_RE.fullmatch(url[len(prefix):]) is not None
+
+    def _store(self, data: bytes) -> Tuple[str, Dict[int, str]]:
+        if len(data) > settings.AVATAR_MAX_BYTES:
+            raise AvatarError(f"头像图片过大，最大 {settings.AVATAR_MAX_BYTES // (1024 * 1024)}MB")
+
+        digest = hashlib.sha256(data).hexdigest()
+        main_path = self._path(digest, AVATAR_SIZE)
+        # 相同内容已经处理过，直接复用
+        if not self.storage.exists(main_path):
+            renditions = render_avatar(data)
+            # 主图最后写入，存在即代表所有尺寸都已就绪
+            for size in sorted(renditions):
+                self.storage.save(self._path(digest, size), renditions[size])
+            logger.info(f"头像已保存: {digest}")
+
+        urls = {size: self.storage.url(self._path(digest, size)) for size in (AVATAR_SIZE, *THUMBNAIL_SIZES)}
+        return urls[AVATAR_SIZE], urls
+
+    async def store(self, data: bytes) -> Tuple[str, Dict[int, str]]:
+        """在线程池中处理并保存头像，返回 (主图 URL, {边长: URL})"""
+        return await asyncio.get_running_loop().run_in_executor(None, self._store, data)
+
+    async def normalize(self, avatar: Optional[str]) -> Optional[str]:
+        """
+        处理 /update 传入的头像字段：data URL 转存为文件后返回其 URL，
+        空值表示清除头像；URL 只接受本服务保存过的头像，不能指向任意外部地址
+        """
+        if not avatar:
+            return None
+        if avatar.startswith("data:"):
+            url, _ = await self.store(decode_data_url(avatar))
+            return url
+        if not self.is_stored_url(avatar):
+            raise AvatarError("头像必须是已上传的头像 URL 或 base64 图片")
+        return avatar
+
+
+# 创建服务实例
+avatar_service = AvatarService()
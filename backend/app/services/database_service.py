@@ -4,6 +4,7 @@ Supabase 数据库服务
 """
 
 import logging
+import re
 from typing import Dict, List, Any, Optional
 from datetime import datetime, date
 from app.core.config import settings
@@ -17,6 +18,35 @@ except ImportError:
     SUPABASE_AVAILABLE = False
     logger.warning("Supabase库未安装，请运行: pip install supabase")
 
+# 用户查询只取需要的列；密码哈希仅在登录和修改密码时读取
+USER_COLUMNS = "id,email,username,phone,avatar,created_at,updated_at"
+USER_AUTH_COLUMNS = f"{USER_COLUMNS},hashed_password"
+# 行程查询的列与 TravelPlanResponse 字段一致，读出的行可以直接作为响应返回
+TRAVEL_PLAN_COLUMNS = (
+    "id,user_id,title,destination,start_date,end_date,budget,people_count,"
+    "preferences,itinerary,total_cost,status,version,refinement_status,created_at,updated_at"
+)
+
+
+class DuplicateValueError(Exception):
+    """写入违反唯一约束（如邮箱、用户名已存在）"""
+    
+    def __init__(self, field: Optional[str], message: str):
+        super().__init__(message)
+        self.field = field
+
+
+def _raise_if_duplicate(e: Exception):
+    """把 PostgreSQL 唯一约束冲突（23505）转换为 DuplicateValueError"""
+    if getattr(e, "code", None) != "23505":
+        return
+    text = f"{getattr(e, 'details', '') or ''} {getattr(e, 'message', '') or str(e)}"
+    match = re.search(r"Key \((\w+)\)", text)
+    field = match.group(1) if match else None
+    if field is None:
+        field = next((name for name in ("email", "username") if name in text), None)
+    raise DuplicateValueError(field, text.strip()) from e
+
 
 class SupabaseService:
     """Supabase 数据库服务 - 完整的数据库访问层"""
@@ -76,22 +106,24 @@ class SupabaseService:
             }).execute()
             
             if response.data:
-                logger.info(f"创建用户成功: {email}")
+                logger.debug(f"创建用户成功: {email}")
                 return response.data[0]
             else:
                 raise Exception("创建用户失败：无返回数据")
                 
         except Exception as e:
+            _raise_if_duplicate(e)
             logger.error(f"创建用户失败: {str(e)}")
             raise
     
-    async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+    async def get_user_by_email(self, email: str, with_password: bool = False) -> Optional[Dict[str, Any]]:
         """根据邮箱获取用户"""
         if not self.is_enabled():
             raise Exception("数据库服务未启用")
         
         try:
-            response = self.client.table("users").select("*").eq("email", email).execute()
+            columns = USER_AUTH_COLUMNS if with_password else USER_COLUMNS
+            response = self.client.table("users").select(columns).eq("email", email).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"查询用户失败: {str(e)}")
@@ -103,19 +135,20 @@ class SupabaseService:
             raise Exception("数据库服务未启用")
         
         try:
-            response = self.client.table("users").select("*").eq("username", username).execute()
+            response = self.client.table("users").select(USER_COLUMNS).eq("username", username).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"查询用户失败: {str(e)}")
             raise
     
-    async def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
+    async def get_user_by_id(self, user_id: int, with_password: bool = False) -> Optional[Dict[str, Any]]:
         """根据ID获取用户"""
         if not self.is_enabled():
             raise Exception("数据库服务未启用")
         
         try:
-            response = self.client.table("users").select("*").eq("id", user_id).execute()
+            columns = USER_AUTH_COLUMNS if with_password else USER_COLUMNS
+            response = self.client.table("users").select(columns).eq("id", user_id).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"查询用户失败: {str(e)}")
@@ -130,15 +163,66 @@ class SupabaseService:
             response = self.client.table("users").update(update_data).eq("id", user_id).execute()
             
             if response.data:
-                logger.info(f"更新用户成功: {user_id}")
+                logger.debug(f"更新用户成功: {user_id}")
                 return response.data[0]
             else:
                 raise Exception("更新用户失败")
                 
         except Exception as e:
+            _raise_if_duplicate(e)
             logger.error(f"更新用户失败: {str(e)}")
             raise
     
+    async def get_users_with_inline_avatar(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        """按 id 顺序取出头像仍是 base64 data URL 的用户（id, avatar），供迁移脚本分批处理"""
+        if not self.is_enabled():
+            raise Exception("数据库服务未启用")
+        
+        try:
+            response = (
+                self.client.table("users")
+                .select("id,avatar")
+                .like("avatar", "data:%")
+                .gt("id", after_id)
+                .order("id")
+                .limit(limit)
+                .execute()
+            )
+            return response.data or []
+        except Exception as e:
+            logger.error(f"查询待迁移头像失败: {str(e)}")
+            raise
+    
+    async def user_exists(self, column: str, value: str) -> bool:
+        """按唯一索引列（email / username）判断用户是否存在，只查询 id 列"""
+        if not self.is_enabled():
+            raise Exception("数据库服务未启用")
+        
+        try:
+            response = self.client.table("users").select("id").eq(column, value).limit(1).execute()
+            return bool(response.data)
+        except Exception as e:
+            logger.error(f"查询用户失败: {str(e)}")
+            raise
+    
+    async def list_user_identities(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """按 id 分页获取所有用户的邮箱和用户名"""
+        if not self.is_enabled():
+            raise Exception("数据库服务未启用")
+        
+        try:
+            response = (
+                self.client.table("users")
+                .select("email,username")
+                .order("id")
+                .range(offset, offset + limit - 1)
+                .execute()
+            )
+            return response.data or []
+        except Exception as e:
+            logger.error(f"查询用户列表失败: {str(e)}")
+            raise
+    
     # ========================================
     # 旅行计划相关操作 (Travel Plans)
     # ========================================
@@ -161,7 +245,8 @@ class SupabaseService:
                 "preferences": plan_data.get("preferences"),
                 "itinerary": plan_data.get("itinerary"),
                 "status": plan_data.get("status", "draft"),
-                "total_cost": plan_data.get("total_cost", 0)
+                "total_cost": plan_data.get("total_cost", 0),
+                "refinement_status": plan_data.get("refinement_status")
             }
             
             # 移除 None 值
@@ -170,7 +255,7 @@ class SupabaseService:
             response = self.client.table("travel_plans").insert(insert_data).execute()
             
             if response.data:
-                logger.info(f"创建行程成功: {response.data[0]['id']}")
+                logger.debug(f"创建行程成功: {response.data[0]['id']}")
                 return response.data[0]
             else:
                 raise Exception("创建行程失败")
@@ -185,7 +270,7 @@ class SupabaseService:
             raise Exception("数据库服务未启用")
         
         try:
-            response = self.client.table("travel_plans").select("*").eq(
+            response = self.client.table("travel_plans").select(TRAVEL_PLAN_COLUMNS).eq(
                 "id", plan_id
             ).eq("user_id", user_id).execute()
             
@@ -200,7 +285,7 @@ class SupabaseService:
             raise Exception("数据库服务未启用")
         
         try:
-            query = self.client.table("travel_plans").select("*").eq("user_id", user_id)
+            query = self.client.table("travel_plans").select(TRAVEL_PLAN_COLUMNS).eq("user_id", user_id)
             
             if status:
                 query = query.eq("status", status)
@@ -212,22 +297,60 @@ class SupabaseService:
             logger.error(f"查询行程列表失败: {str(e)}")
             raise
     
-    async def update_travel_plan(self, plan_id: int, user_id: int, update_data: Dict[str, Any]) -> Dict[str, Any]:
-        """更新旅行计划"""
+    async def get_travel_plans_page(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        """按 id 顺序分批取出所有用户的行程，供数据修复脚本遍历"""
+        if not self.is_enabled():
+            raise Exception("数据库服务未启用")
+        
+        try:
+            response = (
+                self.client.table("travel_plans")
+                .select(TRAVEL_PLAN_COLUMNS)
+                .gt("id", after_id)
+                .order("id")
+                .limit(limit)
+                .execute()
+            )
+            return response.data or []
+        except Exception as e:
+            logger.error(f"分批查询行程失败: {str(e)}")
+            raise
+    
+    async def update_travel_plan(
+        self,
+        plan_id: int,
+        user_id: int,
+        update_data: Dict[str, Any],
+        expected_version: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        更新旅行计划
+        
+        传入 expected_version 时按乐观锁写入：仅当行程版本号仍为 expected_version 时更新并把版本号加 1，
+        版本号不一致（期间已被修改）时返回 None
+        """
         if not self.is_enabled():
             raise Exception("数据库服务未启用")
         
         try:
             # 移除 None 值
             update_data = {k: v for k, v in update_data.items() if v is not None}
+            if expected_version is not None:
+                update_data["version"] = expected_version + 1
             
-            response = self.client.table("travel_plans").update(update_data).eq(
+            query = self.client.table("travel_plans").update(update_data).eq(
                 "id", plan_id
-            ).eq("user_id", user_id).execute()
+            ).eq("user_id", user_id)
+            if expected_version is not None:
+                query = query.eq("version", expected_version)
+            response = query.execute()
             
             if response.data:
-                logger.info(f"更新行程成功: {plan_id}")
+                logger.debug(f"更新行程成功: {plan_id}")
                 return response.data[0]
+            elif expected_version is not None:
+                logger.info(f"行程 {plan_id} 版本已变化，未写入")
+                return None
             else:
                 raise Exception("更新行程失败或无权限")
                 
@@ -245,7 +368,7 @@ class SupabaseService:
                 "id", plan_id
             ).eq("user_id", user_id).execute()
             
-            logger.info(f"删除行程成功: {plan_id}")
+            logger.debug(f"删除行程成功: {plan_id}")
             return True
             
         except Exception as e:
@@ -277,7 +400,7 @@ class SupabaseService:
             response = self.client.table("expenses").insert(insert_data).execute()
             
             if response.data:
-                logger.info(f"创建费用成功: {response.data[0]['id']}")
+                logger.debug(f"创建费用成功: {response.data[0]['id']}")
                 return response.data[0]
             else:
                 raise Exception("创建费用失败")
@@ -286,6 +409,39 @@ class SupabaseService:
             logger.error(f"创建费用失败: {str(e)}")
             raise
     
+    async def create_expenses(self, user_id: int, expenses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """批量创建费用记录（一次写入）"""
+        if not self.is_enabled():
+            raise Exception("数据库服务未启用")
+        
+        if not expenses:
+            return []
+        
+        try:
+            rows = []
+            for expense_data in expenses:
+                insert_data = {
+                    "user_id": user_id,
+                    "travel_plan_id": expense_data.get("travel_plan_id"),
+                    "category": expense_data.get("category"),
+                    "amount": expense_data.get("amount"),
+                    "description": expense_data.get("description"),
+                    "expense_date": expense_data.get("expense_date") or expense_data.get("date")
+                }
+                rows.append({k: v for k, v in insert_data.items() if v is not None})
+            
+            response = self.client.table("expenses").insert(rows).execute()
+            
+            if response.data:
+                logger.debug(f"批量创建费用成功: {len(response.data)} 条")
+                return response.data
+            else:
+                raise Exception("批量创建费用失败")
+                
+        except Exception as e:
+            logger.error(f"批量创建费用失败: {str(e)}")
+            raise
+    
     async def get_expense_by_id(self, expense_id: int, user_id: int) -> Optional[Dict[str, Any]]:
         """获取单个费用记录"""
         if not self.is_enabled():
@@ -348,7 +504,7 @@ class SupabaseService:
             ).eq("user_id", user_id).execute()
             
             if response.data:
-                logger.info(f"更新费用成功: {expense_id}")
+                logger.debug(f"更新费用成功: {expense_id}")
                 return response.data[0]
             else:
                 raise Exception("更新费用失败或无权限")
@@ -367,7 +523,7 @@ class SupabaseService:
                 "id", expense_id
             ).eq("user_id", user_id).execute()
             
-            logger.info(f"删除费用成功: {expense_id}")
+            logger.debug(f"删除费用成功: {expense_id}")
             return True
             
         except Exception as e:
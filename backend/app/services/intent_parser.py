@@ -0,0 +1,279 @@
+"""
+语音意图解析引擎
+启动时预编译所有正则并构建 Aho-Corasick 关键词自动机，每段文本只需一次扫描即可匹配全部关键词
+"""
+
+import re
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 费用金额（按优先级排序，避免误匹配）
+AMOUNT_PATTERNS = [
+    r"花了?(\d+\.?\d*)元",
+    r"花了?(\d+\.?\d*)块",
+    r"消费了?(\d+\.?\d*)元?",
+    r"支付了?(\d+\.?\d*)元?",
+    r"花费(\d+\.?\d*)元?",
+    r"(\d+\.?\d*)块钱",
+    r"(\d+\.?\d*)rmb",
+    r"(\d+\.?\d*)元",  # 最后匹配纯数字+元，避免过早匹配
+]
+
+# 费用类别关键词（类别和关键词的顺序即优先级）
+EXPENSE_CATEGORY_KEYWORDS = {
+    "transport": ["打车", "出租车", "滴滴", "公交", "地铁", "火车", "高铁", "飞机", "机票", "车票", "交通", "油费", "停车"],
+    "accommodation": ["酒店", "住宿", "旅馆", "民宿", "客栈", "宾馆", "房费"],
+    "food": ["吃饭", "餐厅", "饭店", "美食", "午餐", "晚餐", "早餐", "夜宵", "小吃", "餐费", "喝咖啡", "奶茶"],
+    "attraction": ["门票", "景点", "游览", "参观", "博物馆", "公园", "游乐园", "动物园"],
+    "shopping": ["购物", "买", "商场", "超市", "纪念品", "特产", "商店"],
+    "other": ["其他", "杂费", "费用"],
+}
+
+# 提取地点/商家名称
+LOCATION_PATTERNS = [
+    r"在(.{2,10}?)(?:吃饭|消费|购物|花了)",
+    r"(.{2,10}?)(?:餐厅|饭店|商场|超市|店)",
+]
+
+# 相对日期关键词 -> 天数偏移
+DATE_KEYWORDS = {
+    "昨天": -1,
+    "前天": -2,
+    "今天": 0,
+    "刚才": 0,
+}
+
+# 旅行目的地（简单规则，可以用NLP优化）
+DESTINATION_PATTERNS = [
+    r"去([\u4e00-\u9fa5]+)",
+    r"到([\u4e00-\u9fa5]+)",
+    r"想去([\u4e00-\u9fa5]+)",
+    r"([\u4e00-\u9fa5]+)旅游",
+    r"([\u4e00-\u9fa5]+)旅行",
+]
+
+DAYS_PATTERNS = [
+    r"(\d+)天",
+    r"(\d+)日",
+    r"(\d+)个晚上",
+]
+
+# (正则, 倍数)
+BUDGET_PATTERNS = [
+    (r"预算(\d+)元", 1),
+    (r"预算(\d+)块", 1),
+    (r"(\d+)元预算", 1),
+    (r"(\d+)块钱", 1),
+    (r"预算.*?(\d+)", 1),
+    (r"(\d+)万", 10000),
+]
+
+PEOPLE_PATTERNS = [
+    r"(\d+)人",
+    r"(\d+)个人",
+]
+
+TRAVEL_PREFERENCE_KEYWORDS = {
+    "美食": ["美食", "吃", "小吃", "餐厅", "美味"],
+    "购物": ["购物", "买东西", "商场", "逛街"],
+    "文化": ["文化", "历史", "博物馆", "古迹", "遗产"],
+    "自然风光": ["风景", "自然", "山水", "海边", "沙滩", "森林"],
+    "亲子": ["亲子", "带孩子", "小孩", "儿童"],
+    "休闲": ["休闲", "放松", "度假"],
+    "冒险": ["冒险", "刺激", "极限"],
+    "摄影": ["拍照", "摄影", "打卡"],
+}
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick 多关键词匹配
+
+    构建时把所有关键词放进一棵带失败指针的字典树，匹配时对文本只扫描一遍，
+    返回命中的 (关键词, 附加数据)。同一关键词可以挂多个附加数据。
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, Any]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, Any]]] = [[]]
+
+        for keyword, payload in keywords:
+            state = 0
+            for ch in keyword:
+                if ch not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][ch] = len(self._goto) - 1
+                state = self._goto[state][ch]
+            self._output[state].append((keyword, payload))
+
+        # 广度优先计算失败指针，并把后缀状态的输出合并进来
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                if state:
+                    fallback = self._fail[state]
+                    while fallback and ch not in self._goto[fallback]:
+                        fallback = self._fail[fallback]
+                    self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find_all(self, text: str) -> List[Tuple[str, Any]]:
+        """扫描一遍文本，返回所有命中的 (关键词, 附加数据)，按出现位置排序"""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        matches = []
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                matches.extend(output[state])
+        return matches
+
+
+class IntentParser:
+    """旅行/费用意图解析，所有规则在构造时编译一次"""
+
+    def __init__(self):
+        self.amount_patterns = [re.compile(p, re.IGNORECASE) for p in AMOUNT_PATTERNS]
+        self.location_patterns = [re.compile(p) for p in LOCATION_PATTERNS]
+        self.amount_strip = re.compile(r"\d+\.?\d*[元块钱rmb]*")
+        self.verb_strip = re.compile(r"[花了消费支付]")
+
+        self.destination_patterns = [re.compile(p) for p in DESTINATION_PATTERNS]
+        self.days_patterns = [re.compile(p) for p in DAYS_PATTERNS]
+        self.budget_patterns = [re.compile(p) for p, _ in BUDGET_PATTERNS]
+        self.budget_factors = [factor for _, factor in BUDGET_PATTERNS]
+        self.people_patterns = [re.compile(p) for p in PEOPLE_PATTERNS]
+
+        # 费用：类别关键词和日期关键词放在同一个自动机里，一次扫描得到全部命中
+        expense_keywords = []
+        for category_rank, (category, keywords) in enumerate(EXPENSE_CATEGORY_KEYWORDS.items()):
+            for keyword_rank, keyword in enumerate(keywords):
+                expense_keywords.append((keyword, ("category", (category_rank, keyword_rank), category)))
+        for date_rank, (keyword, offset) in enumerate(DATE_KEYWORDS.items()):
+            expense_keywords.append((keyword, ("date", date_rank, offset)))
+        self.expense_matcher = KeywordMatcher(expense_keywords)
+
+        self.preference_order = list(TRAVEL_PREFERENCE_KEYWORDS)
+        self.preference_matcher = KeywordMatcher(
+            (keyword, preference)
+            for preference, keywords in TRAVEL_PREFERENCE_KEYWORDS.items()
+            for keyword in keywords
+        )
+
+    @staticmethod
+    def _first_group(patterns: List["re.Pattern"], text: str):
+        """按优先级依次尝试，返回第一个命中的 (匹配对象, 序号)"""
+        for index, pattern in enumerate(patterns):
+            match = pattern.search(text)
+            if match:
+                return match, index
+        return None, -1
+
+    def parse_expense(self, text: str) -> Dict[str, Any]:
+        """解析费用记录意图"""
+        result = {
+            "amount": None,
+            "category": None,
+            "description": None,
+            "expense_date": datetime.now().isoformat(),
+            "raw_text": text
+        }
+
+        match, _ = self._first_group(self.amount_patterns, text)
+        if match:
+            try:
+                result["amount"] = float(match.group(1))
+            except ValueError:
+                pass
+
+        # 类别取优先级最高的类别中排在最前的关键词；日期取优先级最高的关键词
+        best_category = None
+        best_date = None
+        for keyword, (kind, rank, value) in self.expense_matcher.find_all(text):
+            if kind == "category":
+                if best_category is None or rank < best_category[0]:
+                    best_category = (rank, value, keyword)
+            elif best_date is None or rank < best_date[0]:
+                best_date = (rank, value)
+
+        if best_category:
+            result["category"] = best_category[1]
+            result["description"] = best_category[2]
+        else:
+            # 默认为其他类别
+            result["category"] = "other"
+
+        match, _ = self._first_group(self.location_patterns, text)
+        if match:
+            location = match.group(1).strip()
+            if location and len(location) <= 20:
+                if result["description"]:
+                    result["description"] = f"{location} - {result['description']}"
+                else:
+                    result["description"] = location
+
+        # 如果没有描述，去掉金额和动词，保留描述性文字
+        if not result["description"] and result["amount"]:
+            desc = self.amount_strip.sub("", text).strip()
+            desc = self.verb_strip.sub("", desc).strip()
+            if desc and len(desc) <= 50:
+                result["description"] = desc
+            else:
+                result["description"] = "消费"
+
+        if best_date:
+            result["expense_date"] = (datetime.now() + timedelta(days=best_date[1])).isoformat()
+
+        return result
+
+    def parse_travel(self, text: str) -> Dict[str, Any]:
+        """解析旅行规划意图"""
+        result = {
+            "destination": None,
+            "days": None,
+            "budget": None,
+            "people_count": 1,
+            "preferences": [],
+            "raw_text": text
+        }
+
+        match, _ = self._first_group(self.destination_patterns, text)
+        if match:
+            result["destination"] = match.group(1)
+
+        match, _ = self._first_group(self.days_patterns, text)
+        if match:
+            result["days"] = int(match.group(1))
+
+        match, index = self._first_group(self.budget_patterns, text)
+        if match:
+            result["budget"] = int(match.group(1)) * self.budget_factors[index]
+
+        match, _ = self._first_group(self.people_patterns, text)
+        if match:
+            result["people_count"] = int(match.group(1))
+
+        matched = {preference for _, preference in self.preference_matcher.find_all(text)}
+        result["preferences"] = [p for p in self.preference_order if p in matched]
+
+        return result
+
+    def parse_batch(self, texts: List[str], mode: str = "travel") -> List[Dict[str, Any]]:
+        """批量解析"""
+        parse = self.parse_expense if mode == "expense" else self.parse_travel
+        return [parse(text) for text in texts]
+
+
+# 创建服务实例
+intent_parser = IntentParser()
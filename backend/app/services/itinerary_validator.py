@@ -0,0 +1,296 @@
+"""
+行程结构化输出校验
+基于 DayItineraryBase/ActivityBase 生成 JSON Schema，并对模型输出的活动做流式校验与修复
+"""
+
+import bisect
+import json
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
+
+from app.schemas.travel_plan import ActivityBase, DayItineraryBase
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_TYPES = ("attraction", "restaurant", "hotel", "transport", "shopping", "entertainment")
+# 与 ActivityBase 的长度限制一致，超长时截断而不是丢弃整个活动
+MAX_TEXT_LENGTH = 255
+MAX_DESCRIPTION_LENGTH = 1000
+
+# 模型常见的非法类型 -> 合法类型
+TYPE_ALIASES = {
+    "sightseeing": "attraction", "scenic": "attraction", "scenery": "attraction",
+    "museum": "attraction", "park": "attraction", "culture": "attraction",
+    "景点": "attraction", "游览": "attraction", "文化": "attraction",
+    "food": "restaurant", "dining": "restaurant", "meal": "restaurant",
+    "lunch": "restaurant", "dinner": "restaurant", "breakfast": "restaurant",
+    "餐厅": "restaurant", "美食": "restaurant", "餐饮": "restaurant",
+    "accommodation": "hotel", "lodging": "hotel", "住宿": "hotel", "酒店": "hotel",
+    "traffic": "transport", "transportation": "transport", "交通": "transport",
+    "shop": "shopping", "购物": "shopping",
+    "show": "entertainment", "leisure": "entertainment", "娱乐": "entertainment",
+}
+
+_TIME_RE = re.compile(r"(\d{1,2})\s*[:：点时]\s*(\d{1,2})?")
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+@lru_cache(maxsize=1)
+def itinerary_json_schema() -> Dict[str, Any]:
+    """由 Pydantic 模型导出的行程 JSON Schema（只计算一次）"""
+    day_schema = DayItineraryBase.model_json_schema(ref_template="#/$defs/{model}")
+    defs = day_schema.pop("$defs", {})
+    defs["DayItineraryBase"] = day_schema
+
+    return {
+        "type": "object",
+        "properties": {
+            "itinerary": {
+                "type": "array",
+                "items": {"$ref": "#/$defs/DayItineraryBase"}
+            }
+        },
+        "required": ["itinerary"],
+        "$defs": defs
+    }
+
+
+def normalize_time(value: Any) -> Optional[str]:
+    """把 9:00、09:00:00、9点30 等格式统一为 HH:MM"""
+    if value is None:
+        return None
+    match = _TIME_RE.search(str(value))
+    if not match:
+        return None
+    hour = int(match.group(1))
+    minute = int(match.group(2) or 0)
+    if hour > 23 or minute > 59:
+        return None
+    return f"{hour:02d}:{minute:02d}"
+
+
+def normalize_cost(value: Any) -> Optional[float]:
+    """把 100、"100元"、"约80-120" 等统一为非负数"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value) if value >= 0 else None
+    if value is None:
+        return 0.0
+    numbers = _NUMBER_RE.findall(str(value))
+    if not numbers:
+        return 0.0
+    # 区间取平均值
+    values = [float(n) for n in numbers[:2]]
+    return sum(values) / len(values)
+
+
+def repair_activity(raw: Any, default_location: str = "") -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    校验并尽量修复单个活动
+
+    Returns:
+        (修复后的活动, 修复说明)；无法修复时活动为 None
+    """
+    if not isinstance(raw, dict):
+        return None, ["活动不是对象"]
+
+    fixes = []
+    activity = dict(raw)
+
+    name = str(activity.get("name") or "").strip()
+    if not name:
+        return None, ["缺少活动名称"]
+    if len(name) > MAX_TEXT_LENGTH:
+        fixes.append("截断 name")
+    activity["name"] = name[:MAX_TEXT_LENGTH]
+
+    activity_type = str(activity.get("type") or "").strip().lower()
+    if activity_type not in ACTIVITY_TYPES:
+        repaired = TYPE_ALIASES.get(activity_type, "attraction")
+        fixes.append(f"type {activity_type or '缺失'} -> {repaired}")
+        activity["type"] = repaired
+    else:
+        activity["type"] = activity_type
+
+    for field in ("start_time", "end_time"):
+        normalized = normalize_time(activity.get(field))
+        if normalized is None:
+            return None, [f"{field} 无法解析: {activity.get(field)}"]
+        if normalized != activity.get(field):
+            fixes.append(f"{field} {activity.get(field)} -> {normalized}")
+        activity[field] = normalized
+
+    cost = normalize_cost(activity.get("cost"))
+    if cost is None:
+        return None, [f"cost 非法: {activity.get('cost')}"]
+    if cost != activity.get("cost"):
+        fixes.append(f"cost {activity.get('cost')} -> {cost}")
+    activity["cost"] = cost
+
+    location = str(activity.get("location") or "").strip()
+    if not location:
+        location = default_location or name
+        fixes.append("补全 location")
+    elif len(location) > MAX_TEXT_LENGTH:
+        fixes.append("截断 location")
+    activity["location"] = location[:MAX_TEXT_LENGTH]
+
+    description = activity.get("description")
+    if description is not None:
+        description = str(description)
+        if len(description) > MAX_DESCRIPTION_LENGTH:
+            fixes.append("截断 description")
+        activity["description"] = description[:MAX_DESCRIPTION_LENGTH]
+
+    rating = activity.get("rating")
+    if rating is not None:
+        try:
+            activity["rating"] = min(max(float(rating), 0.0), 5.0)
+        except (TypeError, ValueError):
+            activity["rating"] = None
+            fixes.append("移除非法 rating")
+
+    try:
+        ActivityBase.model_validate(activity)
+    except Exception as e:
+        return None, [f"校验失败: {str(e)}"]
+
+    return activity, fixes
+
+
+def repair_itinerary(itinerary: List[Dict[str, Any]], default_location: str = "") -> Tuple[List[Dict[str, Any]], int]:
+    """
+    修复完整行程中的所有活动，丢弃无法修复的活动并重算每日费用
+
+    Returns:
+        (修复后的行程, 被丢弃的活动数)
+    """
+    repaired_days = []
+    rejected = 0
+
+    for day in itinerary:
+        if not isinstance(day, dict):
+            continue
+        activities = []
+        for raw in day.get("activities") or []:
+            activity, fixes = repair_activity(raw, default_location)
+            if activity is None:
+                rejected += 1
+                logger.warning(f"丢弃活动: {fixes}")
+                continue
+            activities.append(activity)
+
+        repaired = dict(day)
+        repaired["activities"] = activities
+        repaired["total_cost"] = sum(a["cost"] for a in activities)
+        repaired_days.append(repaired)
+
+    return repaired_days, rejected
+
+
+class StreamingActivityValidator:
+    """
+    流式活动校验器
+
+    逐块喂入模型输出，每当一个活动对象闭合就立即校验/修复，
+    以便在无效活动过多时提前中止生成；某一天闭合时用已修复的活动组装成当天行程，
+    生成结束后 days 即为修复完成的行程，无需再整体解析修复一遍。
+    """
+
+    def __init__(self, default_location: str = ""):
+        self.default_location = default_location
+        self.accepted: List[Dict[str, Any]] = []
+        self.days: List[Dict[str, Any]] = []
+        self.rejected = 0
+        self.repaired = 0
+        # 输出按块保存，只在截取闭合对象时拼接对应的几块，避免每次喂入都复制全文
+        self._chunks: List[str] = []
+        self._offsets: List[int] = []
+        self._length = 0
+        # 未闭合的括号：(字符, 起始位置, 当时已接受的活动数)
+        self._stack: List[Tuple[str, int, int]] = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """喂入一段输出，返回本次新闭合并通过校验的活动"""
+        base = self._length
+        self._chunks.append(chunk)
+        self._offsets.append(base)
+        self._length += len(chunk)
+        new_activities = []
+
+        for offset, ch in enumerate(chunk):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._stack.append((ch, base + offset, len(self.accepted)))
+            elif ch in "}]" and self._stack:
+                opener, start, accepted_before = self._stack.pop()
+                # 父容器是数组的对象：可能是活动，也可能是某一天
+                if ch == "}" and opener == "{" and self._stack and self._stack[-1][0] == "[":
+                    activity = self._check_object(self._slice(start, base + offset + 1), accepted_before)
+                    if activity is not None:
+                        new_activities.append(activity)
+
+        return new_activities
+
+    def _slice(self, start: int, end: int) -> str:
+        """截取完整输出中 [start, end) 的内容"""
+        first = bisect.bisect_right(self._offsets, start) - 1
+        parts = []
+        for index in range(first, len(self._chunks)):
+            offset = self._offsets[index]
+            if offset >= end:
+                break
+            parts.append(self._chunks[index][max(start - offset, 0):end - offset])
+        return "".join(parts)
+
+    def _check_object(self, fragment: str, accepted_before: int) -> Optional[Dict[str, Any]]:
+        """校验一个闭合对象；天对象（含 activities）用其中已修复的活动组装"""
+        try:
+            obj = json.loads(fragment)
+        except json.JSONDecodeError:
+            self.rejected += 1
+            return None
+
+        if not isinstance(obj, dict):
+            return None
+
+        if "activities" in obj:
+            day = {k: v for k, v in obj.items() if k != "activities"}
+            day["activities"] = self.accepted[accepted_before:]
+            day["total_cost"] = sum(a["cost"] for a in day["activities"])
+            self.days.append(day)
+            return None
+
+        activity, fixes = repair_activity(obj, self.default_location)
+        if activity is None:
+            self.rejected += 1
+            logger.debug(f"流式校验丢弃活动: {fixes}")
+            return None
+
+        if fixes:
+            self.repaired += 1
+        self.accepted.append(activity)
+        return activity
+
+    @property
+    def text(self) -> str:
+        """到目前为止的完整输出"""
+        return "".join(self._chunks)
+
+    def should_abort(self, min_samples: int = 6, max_reject_ratio: float = 0.5) -> bool:
+        """无效活动占比过高时建议中止本次生成"""
+        total = len(self.accepted) + self.rejected
+        return total >= min_samples and self.rejected / total > max_reject_ratio
@@ -0,0 +1,270 @@
+"""
+大模型服务提供方管理
+维护一组 OpenAI 兼容的接口地址与模型，按滚动延迟和错误率路由，并支持对冲请求
+"""
+
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from openai import OpenAI
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 滚动统计窗口
+LATENCY_WINDOW = 50
+# 连续失败多少次后进入冷却期
+COOLDOWN_AFTER_FAILURES = 3
+
+
+class LLMRequestCancelled(Exception):
+    """对冲请求中落后的一方被取消（已有其他服务先返回）"""
+
+
+class LLMProvider:
+    """单个 OpenAI 兼容服务，附带滚动延迟与错误统计"""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        api_key: str,
+        model: str,
+        order: int = 0,
+        response_format: str = "json_object"
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.model = model
+        self.order = order
+        # 结构化输出模式：json_schema / json_object / off，不同服务支持程度不同
+        self.response_format = response_format.lower()
+        # 重试和故障转移由服务池负责，客户端自身不再重试
+        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._outcomes: deque = deque(maxlen=LATENCY_WINDOW)
+        self._consecutive_failures = 0
+        self._cooldown_until = 0.0
+        self.in_flight = 0
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+            self._outcomes.append(True)
+            self._consecutive_failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._outcomes.append(False)
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= COOLDOWN_AFTER_FAILURES:
+                self._cooldown_until = time.monotonic() + settings.LLM_PROVIDER_COOLDOWN
+                logger.warning(f"模型服务 {self.name} 连续失败 {self._consecutive_failures} 次，进入冷却")
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return self._outcomes.count(False) / len(self._outcomes)
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, math.ceil(len(samples) * q) - 1))
+        return samples[index]
+
+    def in_cooldown(self) -> bool:
+        return time.monotonic() < self._cooldown_until
+
+    def score(self) -> float:
+        """
+        健康度评分，越小越好
+
+        没有成功样本时按请求超时估计延迟：从未请求过的服务排在已知健康的服务之后、按配置顺序
+        依次尝试，一直失败的服务再乘上错误率排到最后
+        """
+        p50 = self.latency_percentile(0.5)
+        if p50 is None:
+            p50 = settings.LLM_REQUEST_TIMEOUT
+        return p50 * (1 + 4 * self.error_rate())
+
+    def hedge_delay(self) -> float:
+        """对冲延迟：取该服务的 p95 延迟，不低于配置的下限"""
+        p95 = self.latency_percentile(0.95)
+        if p95 is None:
+            return settings.LLM_HEDGE_DEFAULT_DELAY
+        return max(p95, settings.LLM_HEDGE_MIN_DELAY)
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50 = self.latency_percentile(0.5)
+        p95 = self.latency_percentile(0.95)
+        return {
+            "name": self.name,
+            "model": self.model,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate(), 3),
+            "in_cooldown": self.in_cooldown(),
+            "in_flight": self.in_flight,
+        }
+
+
+class LLMProviderPool:
+    """
+    按健康度路由的模型服务池
+
+    请求在专用线程池中执行，线程数有上限，落后的对冲请求不会占满默认线程池。
+    请求函数签名为 fn(provider, cancelled)：已有其他服务先返回时 cancelled 被置位，
+    流式请求应在收到下一块时检查并抛出 LLMRequestCancelled 以尽快释放线程。
+    """
+
+    def __init__(self, providers: List[LLMProvider], hedge_enabled: bool = False, max_workers: int = 8):
+        self.providers = providers
+        self.hedge_enabled = hedge_enabled
+        self._executor = ThreadPoolExecutor(max_workers=max(max_workers, 1), thread_name_prefix="llm")
+
+    def is_configured(self) -> bool:
+        return bool(self.providers)
+
+    def ranked(self) -> List[LLMProvider]:
+        """冷却中的排最后，其余按评分和配置顺序排序"""
+        return sorted(self.providers, key=lambda p: (p.in_cooldown(), p.score(), p.order))
+
+    async def _invoke(
+        self,
+        provider: LLMProvider,
+        fn: Callable[[LLMProvider, threading.Event], Any],
+        cancelled: threading.Event
+    ) -> Any:
+        """在线程池中调用同步的请求函数并更新统计；被取消的请求不计入服务统计"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        provider.in_flight += 1
+        try:
+            result = await loop.run_in_executor(self._executor, fn, provider, cancelled)
+        except LLMRequestCancelled:
+            raise
+        except Exception:
+            provider.record_failure()
+            raise
+        finally:
+            provider.in_flight -= 1
+
+        provider.record_success(time.perf_counter() - started)
+        return result
+
+    async def run(self, fn: Callable[[LLMProvider, threading.Event], Any]) -> Any:
+        """
+        依次尝试最健康的服务，每个服务只请求一次；开启对冲时，主请求超过 p95 延迟仍未返回则向
+        下一个服务并行发起请求，取先成功的结果。所有服务都失败时抛出最后一个错误。
+        """
+        if not self.providers:
+            raise Exception("未配置任何模型服务")
+
+        candidates = self.ranked()
+        last_error: Optional[BaseException] = None
+        next_idx = 0
+        cancel_events: Dict["asyncio.Future", threading.Event] = {}
+
+        def start(provider: LLMProvider) -> "asyncio.Future":
+            cancelled = threading.Event()
+            task = asyncio.ensure_future(self._invoke(provider, fn, cancelled))
+            cancel_events[task] = cancelled
+            return task
+
+        while next_idx < len(candidates):
+            primary = candidates[next_idx]
+            next_idx += 1
+            pending = {start(primary)}
+
+            if self.hedge_enabled and next_idx < len(candidates):
+                done, pending = await asyncio.wait(pending, timeout=primary.hedge_delay())
+                if not done:
+                    secondary = candidates[next_idx]
+                    next_idx += 1
+                    logger.info(f"模型服务 {primary.name} 超过对冲延迟，并行请求 {secondary.name}")
+                    pending.add(start(secondary))
+                else:
+                    pending = done
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        # 线程中的请求无法强制中断：通知落后的请求尽快停止，结果丢弃
+                        for other in pending:
+                            cancel_events[other].set()
+                            other.add_done_callback(_consume_result)
+                        return task.result()
+                    last_error = task.exception()
+                    logger.warning(f"模型服务请求失败，尝试下一个: {str(last_error)}")
+
+        raise last_error or Exception("所有模型服务均不可用")
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [p.snapshot() for p in self.ranked()]
+
+
+def _consume_result(task: "asyncio.Future"):
+    """取走后台请求的异常，避免 "exception was never retrieved" 警告"""
+    if not task.cancelled():
+        task.exception()
+
+
+def _load_providers() -> List[LLMProvider]:
+    """
+    从 LLM_PROVIDERS（JSON 数组）读取服务列表；未配置时使用通义千问
+
+    每项可选 response_format（json_schema / json_object / off，默认 json_object），
+    内置的通义千问使用 QIANWEN_RESPONSE_FORMAT
+    """
+    configs: List[Dict[str, Any]] = []
+    if settings.LLM_PROVIDERS:
+        try:
+            configs = json.loads(settings.LLM_PROVIDERS)
+        except json.JSONDecodeError as e:
+            logger.error(f"LLM_PROVIDERS 配置解析失败: {str(e)}")
+    elif settings.QIANWEN_API_KEY:
+        configs = [{
+            "name": "dashscope",
+            "base_url": "https://dashscope.aliyuncs.com/compatible-mode/v1",
+            "api_key": settings.QIANWEN_API_KEY,
+            "model": "qwen-turbo",
+            "response_format": settings.QIANWEN_RESPONSE_FORMAT,
+        }]
+
+    providers = []
+    for order, config in enumerate(configs):
+        try:
+            providers.append(LLMProvider(
+                name=config.get("name") or f"provider-{order}",
+                base_url=config["base_url"],
+                api_key=config.get("api_key") or "EMPTY",
+                model=config["model"],
+                order=order,
+                response_format=config.get("response_format") or "json_object",
+            ))
+        except KeyError as e:
+            logger.error(f"模型服务配置缺少字段 {e}: {config.get('name')}")
+
+    return providers
+
+
+# 创建服务实例
+llm_provider_pool = LLMProviderPool(
+    _load_providers(),
+    hedge_enabled=settings.LLM_HEDGE_ENABLED,
+    max_workers=settings.LLM_MAX_WORKERS
+)
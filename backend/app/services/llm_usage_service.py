@@ -0,0 +1,152 @@
+"""
+大模型调用用量统计
+记录每次调用的 token 数、首 token 时间和总耗时，并据此估算 max_tokens
+"""
+
+import logging
+import math
+import threading
+from collections import OrderedDict, defaultdict, deque
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# 尚无观测数据时，每天行程大约消耗的输出 token 数
+DEFAULT_TOKENS_PER_DAY = 700
+# 估算时的固定开销（JSON 外层结构等）与安全系数
+TOKENS_OVERHEAD = 200
+SAFETY_FACTOR = 1.25
+MIN_MAX_TOKENS = 512
+MAX_MAX_TOKENS = 16000
+# 每天 token 数的滑动窗口大小
+SAMPLE_WINDOW = 200
+# 按用户统计时最多保留的用户数，超出后淘汰最久没有调用的用户
+MAX_TRACKED_USERS = 10000
+
+
+class _Aggregate:
+    """单个维度（接口或用户）的累计统计"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.truncated = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_ttft = 0.0
+        self.ttft_samples = 0
+
+    def add(self, prompt_tokens: int, completion_tokens: int, latency: float,
+            ttft: Optional[float], error: bool, truncated: bool):
+        self.calls += 1
+        self.errors += int(error)
+        self.truncated += int(truncated)
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        if ttft is not None:
+            self.total_ttft += ttft
+            self.ttft_samples += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        calls = self.calls or 1
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "truncated": self.truncated,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_prompt_tokens": round(self.prompt_tokens / calls, 1),
+            "avg_completion_tokens": round(self.completion_tokens / calls, 1),
+            "avg_latency_ms": round(self.total_latency / calls * 1000, 1),
+            "max_latency_ms": round(self.max_latency * 1000, 1),
+            "avg_ttft_ms": round(self.total_ttft / self.ttft_samples * 1000, 1) if self.ttft_samples else None,
+        }
+
+
+class LLMUsageTracker:
+    """
+    按接口和用户聚合大模型调用用量
+
+    按用户的统计只保留最近调用过的 max_users 个用户，且不出现在 snapshot 中，
+    /metrics 只输出汇总后的用户数
+    """
+
+    def __init__(self, max_users: int = MAX_TRACKED_USERS):
+        self._lock = threading.Lock()
+        self.max_users = max(max_users, 1)
+        self._by_endpoint: Dict[str, _Aggregate] = defaultdict(_Aggregate)
+        self._by_user: "OrderedDict[int, _Aggregate]" = OrderedDict()
+        self._by_provider: Dict[str, _Aggregate] = defaultdict(_Aggregate)
+        self._tokens_per_day: deque = deque(maxlen=SAMPLE_WINDOW)
+
+    def record(
+        self,
+        endpoint: str,
+        user_id: Optional[int] = None,
+        provider: Optional[str] = None,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        latency: float = 0.0,
+        ttft: Optional[float] = None,
+        days: Optional[int] = None,
+        error: bool = False,
+        truncated: bool = False
+    ):
+        """记录一次调用"""
+        with self._lock:
+            self._by_endpoint[endpoint].add(prompt_tokens, completion_tokens, latency, ttft, error, truncated)
+            if user_id is not None:
+                aggregate = self._by_user.pop(user_id, None) or _Aggregate()
+                aggregate.add(prompt_tokens, completion_tokens, latency, ttft, error, truncated)
+                self._by_user[user_id] = aggregate
+                while len(self._by_user) > self.max_users:
+                    self._by_user.popitem(last=False)
+            if provider is not None:
+                self._by_provider[provider].add(prompt_tokens, completion_tokens, latency, ttft, error, truncated)
+            # 被截断的样本只代表下限，不参与每天 token 数的估算
+            if days and completion_tokens and not error and not truncated:
+                self._tokens_per_day.append(completion_tokens / days)
+
+        logger.info(
+            f"LLM 调用 [{endpoint}] 服务={provider} 用户={user_id} prompt={prompt_tokens} completion={completion_tokens} "
+            f"ttft={'-' if ttft is None else f'{ttft * 1000:.0f}ms'} 总耗时={latency * 1000:.0f}ms"
+            f"{' (输出被截断)' if truncated else ''}"
+        )
+
+    def tokens_per_day_p95(self) -> float:
+        """每天行程输出 token 数的 p95"""
+        with self._lock:
+            samples = sorted(self._tokens_per_day)
+        if not samples:
+            return DEFAULT_TOKENS_PER_DAY
+        index = min(len(samples) - 1, math.ceil(len(samples) * 0.95) - 1)
+        return samples[index]
+
+    def suggest_max_tokens(self, days: float) -> int:
+        """根据天数和历史统计估算 max_tokens；days 可以是小数，如单个活动按当天活动数折算"""
+        estimate = self.tokens_per_day_p95() * (days if days > 0 else 1) * SAFETY_FACTOR + TOKENS_OVERHEAD
+        return int(min(max(estimate, MIN_MAX_TOKENS), MAX_MAX_TOKENS))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出当前统计（不含按用户的明细）"""
+        with self._lock:
+            by_endpoint = {k: v.to_dict() for k, v in self._by_endpoint.items()}
+            tracked_users = len(self._by_user)
+            by_provider = {k: v.to_dict() for k, v in self._by_provider.items()}
+            samples = len(self._tokens_per_day)
+
+        return {
+            "by_endpoint": by_endpoint,
+            "tracked_users": tracked_users,
+            "by_provider": by_provider,
+            "tokens_per_day_p95": round(self.tokens_per_day_p95(), 1),
+            "tokens_per_day_samples": samples,
+        }
+
+
+# 创建服务实例
+llm_usage_tracker = LLMUsageTracker()
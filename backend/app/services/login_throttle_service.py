@@ -0,0 +1,254 @@
+"""
+登录限流服务
+按 IP 和邮箱分别统计滑动窗口内的失败次数，超限后指数递增地锁定，
+被锁定的请求在查询数据库和 bcrypt 验证之前直接拒绝
+"""
+
+import abc
+import ipaddress
+import json
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as redis_asyncio
+    from redis.exceptions import WatchError
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+# 读取旧状态（不存在时为 None），返回 (新状态, 过期秒数)
+StateUpdate = Callable[[Optional[Dict[str, Any]]], Tuple[Dict[str, Any], float]]
+
+
+class ThrottleBackend(abc.ABC):
+    """
+    限流状态存储接口
+
+    状态是一个可 JSON 序列化的字典，ttl 秒后自动过期。多进程部署时换成共享存储
+    （如 Redis），各进程就能看到同一份失败计数和锁定状态。
+    """
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取状态，不存在或已过期时返回 None"""
+
+    @abc.abstractmethod
+    async def update(self, key: str, func: StateUpdate) -> Dict[str, Any]:
+        """
+        原子地读取-修改-写回状态，返回新状态
+
+        并发的失败请求不能互相覆盖计数，否则攻击者可以并发猜密码绕过上限。
+        func 可能被重试多次，不能有副作用。
+        """
+
+    @abc.abstractmethod
+    async def delete(self, key: str):
+        """删除状态"""
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__}
+
+
+class MemoryThrottleBackend(ThrottleBackend):
+    """进程内存储，超过 max_entries 时淘汰最久未更新的条目"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(max_entries, 1)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._get(key)
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._entries[key]
+            return None
+        return entry[1]
+
+    async def update(self, key: str, func: StateUpdate) -> Dict[str, Any]:
+        # 读取和写回之间没有 await，在单个事件循环内天然是原子的
+        state, ttl = func(self._get(key))
+        self._entries[key] = (time.time() + ttl, state)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return state
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": "memory", "entries": len(self._entries), "max_entries": self.max_entries}
+
+
+class RedisThrottleBackend(ThrottleBackend):
+    """Redis 存储，供多进程/多实例部署共享限流状态；更新用 WATCH/MULTI 乐观事务"""
+
+    def __init__(self, url: str):
+        self.client = redis_asyncio.from_url(url)
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return f"login_throttle:{key}"
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self.client.get(self._key(key))
+        return json.loads(raw) if raw else None
+
+    async def update(self, key: str, func: StateUpdate) -> Dict[str, Any]:
+        name = self._key(key)
+        async with self.client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(name)
+                    raw = await pipe.get(name)
+                    state, ttl = func(json.loads(raw) if raw else None)
+                    pipe.multi()
+                    pipe.set(name, json.dumps(state), ex=max(1, math.ceil(ttl)))
+                    await pipe.execute()
+                    return state
+                except WatchError:
+                    # 其他进程在读取之后改写了这个键，按最新状态重算
+                    continue
+
+    async def delete(self, key: str):
+        await self.client.delete(self._key(key))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": "redis"}
+
+
+class LoginThrottle:
+    """
+    登录限流
+
+    每个键（ip:<地址> 或 email:<邮箱>）记录窗口内的失败时间戳。失败次数达到上限后锁定
+    base_lockout 秒，之后每次再被锁定时长翻倍，最长 max_lockout 秒；锁定等级在最后一次
+    失败后 max_lockout 秒内没有新的失败才会清零。登录成功只清除该邮箱的记录，
+    不清除 IP 的记录，避免攻击者用自己的账号重置计数。
+    """
+
+    def __init__(
+        self,
+        backend: ThrottleBackend,
+        window: float,
+        max_ip_failures: int,
+        max_email_failures: int,
+        base_lockout: float,
+        max_lockout: float
+    ):
+        self.backend = backend
+        self.window = window
+        self.limits = {"ip": max_ip_failures, "email": max_email_failures}
+        self.base_lockout = base_lockout
+        self.max_lockout = max_lockout
+        self.rejected = 0
+        self.lockouts = 0
+        self._loopback_warned = False
+
+    def _keys(self, ip: Optional[str], email: Optional[str]) -> List[Tuple[str, str]]:
+        keys = []
+        if ip and _is_loopback(ip):
+            # 回环地址通常是未开启 TRUST_PROXY_HEADERS 的本机反向代理，所有用户共用这一个
+            # 地址，按它限流会让一个人的失败锁住所有人
+            if not self._loopback_warned:
+                self._loopback_warned = True
+                logger.warning(f"登录请求来自回环地址 {ip}，不按 IP 限流；部署在反向代理之后时请开启 TRUST_PROXY_HEADERS")
+        elif ip:
+            keys.append(("ip", f"ip:{ip}"))
+        if email:
+            keys.append(("email", f"email:{email.strip().lower()}"))
+        return keys
+
+    async def check(self, ip: Optional[str], email: Optional[str]) -> int:
+        """返回需要等待的秒数，0 表示允许尝试登录"""
+        now = time.time()
+        wait = 0.0
+        for _, key in self._keys(ip, email):
+            state = await self.backend.get(key)
+            if state and state.get("locked_until", 0) > now:
+                wait = max(wait, state["locked_until"] - now)
+        if wait > 0:
+            self.rejected += 1
+            return max(1, math.ceil(wait))
+        return 0
+
+    def _add_failure(self, kind: str, state: Optional[Dict[str, Any]], now: float) -> Tuple[Dict[str, Any], float]:
+        """在状态中记入一次失败，达到上限时升级锁定；返回 (新状态, 过期秒数)"""
+        state = dict(state or {"failures": [], "level": 0, "locked_until": 0})
+        failures = [t for t in state["failures"] if t > now - self.window]
+        failures.append(now)
+
+        if len(failures) >= self.limits[kind]:
+            state["level"] += 1
+            state["locked_until"] = now + self.lockout_for(state["level"])
+            failures = []
+
+        state["failures"] = failures
+        # 状态至少保留到锁定结束后 max_lockout 秒，用于累计锁定等级
+        ttl = max(self.window, state["locked_until"] - now) + self.max_lockout
+        return state, ttl
+
+    def lockout_for(self, level: int) -> float:
+        """第 level 次锁定的时长：base_lockout 起逐次翻倍，最长 max_lockout"""
+        return min(self.base_lockout * 2 ** (level - 1), self.max_lockout)
+
+    async def record_failure(self, ip: Optional[str], email: Optional[str]):
+        """记录一次失败，超过上限时锁定"""
+        now = time.time()
+        for kind, key in self._keys(ip, email):
+            state = await self.backend.update(key, lambda old: self._add_failure(kind, old, now))
+            if state["locked_until"] > now and not state["failures"]:
+                self.lockouts += 1
+                logger.warning(f"登录失败次数过多，锁定 {key} {state['locked_until'] - now:.0f} 秒")
+
+    async def record_success(self, email: Optional[str]):
+        for _, key in self._keys(None, email):
+            await self.backend.delete(key)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.backend.snapshot(),
+            "window": self.window,
+            "max_ip_failures": self.limits["ip"],
+            "max_email_failures": self.limits["email"],
+            "rejected": self.rejected,
+            "lockouts": self.lockouts,
+        }
+
+
+def _is_loopback(ip: str) -> bool:
+    try:
+        return ipaddress.ip_address(ip).is_loopback
+    except ValueError:
+        return False
+
+
+def _create_backend() -> ThrottleBackend:
+    if settings.LOGIN_THROTTLE_BACKEND == "redis":
+        if REDIS_AVAILABLE and settings.LOGIN_THROTTLE_REDIS_URL:
+            return RedisThrottleBackend(settings.LOGIN_THROTTLE_REDIS_URL)
+        logger.warning("Redis 未安装或未配置 LOGIN_THROTTLE_REDIS_URL，登录限流使用进程内存储（pip install redis）")
+    return MemoryThrottleBackend(settings.LOGIN_THROTTLE_MAX_ENTRIES)
+
+
+# 创建服务实例
+login_throttle = LoginThrottle(
+    _create_backend(),
+    window=settings.LOGIN_THROTTLE_WINDOW,
+    max_ip_failures=settings.LOGIN_THROTTLE_MAX_IP_FAILURES,
+    max_email_failures=settings.LOGIN_THROTTLE_MAX_EMAIL_FAILURES,
+    base_lockout=settings.LOGIN_THROTTLE_BASE_LOCKOUT,
+    max_lockout=settings.LOGIN_THROTTLE_MAX_LOCKOUT
+)
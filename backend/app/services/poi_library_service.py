@@ -0,0 +1,188 @@
+"""
+本地 POI 库服务
+从 app/data/poi 下的城市文件生成草稿行程，无需调用大模型
+"""
+
+import json
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+POI_DATA_DIR = Path(__file__).resolve().parent.parent / "data" / "poi"
+
+# 每天的时间段模板：(开始时间, 类型)
+DAY_SLOTS = [
+    ("09:00", "attraction"),
+    ("12:00", "restaurant"),
+    ("14:00", "attraction"),
+    ("18:00", "restaurant"),
+]
+MEAL_DURATION_HOURS = 1.5
+LAST_ATTRACTION_START = "16:00"
+MEAL_MAX_DELAY_MINUTES = 120
+
+
+class POILibraryService:
+    """本地景点/餐厅库，提供毫秒级草稿行程"""
+
+    def __init__(self, data_dir: Path = POI_DATA_DIR):
+        self.data_dir = data_dir
+        self.cities: Dict[str, Dict[str, Any]] = {}
+        self.aliases: Dict[str, str] = {}
+        self._load()
+
+    def _load(self):
+        """启动时加载所有城市数据"""
+        if not self.data_dir.is_dir():
+            logger.warning(f"POI 数据目录不存在: {self.data_dir}")
+            return
+
+        for path in sorted(self.data_dir.glob("*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.error(f"加载 POI 文件失败 {path.name}: {str(e)}")
+                continue
+
+            city = path.stem
+            self.cities[city] = data
+            self.aliases[city.lower()] = city
+            for alias in data.get("aliases", []):
+                self.aliases[alias.lower()] = city
+
+        logger.info(f"POI 库加载完成，共 {len(self.cities)} 个城市")
+
+    def find_city(self, destination: str) -> Optional[str]:
+        """根据目的地匹配城市（支持别名和包含关系，如“北京故宫”）"""
+        if not destination:
+            return None
+
+        key = destination.strip().lower()
+        if key in self.aliases:
+            return self.aliases[key]
+
+        for alias, city in self.aliases.items():
+            if alias in key:
+                return city
+        return None
+
+    def has_city(self, destination: str) -> bool:
+        """是否收录了该目的地"""
+        return self.find_city(destination) is not None
+
+    def build_draft_itinerary(
+        self,
+        destination: str,
+        start_date: datetime,
+        days: int,
+        people_count: int = 1,
+        preferences: Optional[List[str]] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        根据 POI 库生成草稿行程
+
+        Returns:
+            行程列表；目的地未收录时返回 None
+        """
+        city = self.find_city(destination)
+        if city is None:
+            return None
+
+        data = self.cities[city]
+        preferences = preferences or []
+        attractions = self._rank(data.get("attractions", []), preferences)
+        restaurants = self._rank(data.get("restaurants", []), preferences)
+        people_count = max(people_count, 1)
+
+        itinerary = []
+        attraction_idx = 0
+        restaurant_idx = 0
+
+        for day in range(days):
+            current_date = start_date + timedelta(days=day)
+            activities = []
+
+            cursor = "00:00"
+
+            for slot_template, slot_type in DAY_SLOTS:
+                # 上一个活动超时则顺延；错过饭点或下午已过则跳过该时段
+                slot_start = max(slot_template, cursor)
+                if slot_type == "restaurant":
+                    if not restaurants or self._minutes(slot_start) - self._minutes(slot_template) > MEAL_MAX_DELAY_MINUTES:
+                        continue
+                    poi = restaurants[restaurant_idx % len(restaurants)]
+                    restaurant_idx += 1
+                    duration = MEAL_DURATION_HOURS
+                else:
+                    if slot_start >= LAST_ATTRACTION_START:
+                        continue
+                    poi = self._next_open(attractions, attraction_idx, slot_start)
+                    if poi is None:
+                        continue
+                    attraction_idx = attractions.index(poi) + 1
+                    duration = poi.get("duration_hours", 2)
+
+                end_time = self._end_time(slot_start, duration, poi.get("close"))
+                cursor = end_time
+                activities.append({
+                    "type": poi.get("type", slot_type),
+                    "name": poi["name"],
+                    "description": poi.get("description"),
+                    "location": poi.get("location") or city,
+                    "start_time": slot_start,
+                    "end_time": end_time,
+                    "cost": poi.get("cost", 0) * people_count,
+                    "rating": poi.get("rating"),
+                })
+
+            itinerary.append({
+                "day": day + 1,
+                "date": current_date.strftime("%Y-%m-%d"),
+                "activities": activities,
+                "total_cost": sum(a["cost"] for a in activities),
+            })
+
+        return itinerary
+
+    @staticmethod
+    def _rank(pois: List[Dict[str, Any]], preferences: List[str]) -> List[Dict[str, Any]]:
+        """按偏好命中数和评分排序"""
+        return sorted(
+            pois,
+            key=lambda p: (-len(set(p.get("tags", [])) & set(preferences)), -p.get("rating", 0))
+        )
+
+    @staticmethod
+    def _next_open(pois: List[Dict[str, Any]], start_idx: int, slot_start: str) -> Optional[Dict[str, Any]]:
+        """从 start_idx 起轮询，找到在该时间段营业的景点"""
+        if not pois:
+            return None
+
+        for offset in range(len(pois)):
+            poi = pois[(start_idx + offset) % len(pois)]
+            if poi.get("open", "00:00") <= slot_start < poi.get("close", "23:59"):
+                return poi
+        return None
+
+    @staticmethod
+    def _minutes(hhmm: str) -> int:
+        """HH:MM 转换为分钟数"""
+        hour, minute = map(int, hhmm.split(":"))
+        return hour * 60 + minute
+
+    @classmethod
+    def _end_time(cls, start: str, duration_hours: float, close: Optional[str]) -> str:
+        """计算结束时间，不晚于闭馆时间"""
+        total = min(cls._minutes(start) + int(duration_hours * 60), 23 * 60 + 59)
+        end = f"{total // 60:02d}:{total % 60:02d}"
+        if close and start < close < end:
+            return close
+        return end
+
+
+# 创建服务实例
+poi_library_service = POILibraryService()
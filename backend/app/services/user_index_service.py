@@ -0,0 +1,147 @@
+"""
+用户名/邮箱占用索引
+用布隆过滤器记录已注册的邮箱和用户名：过滤器判定“不存在”时一定可用，无需查库；
+判定“可能存在”时再走唯一索引查询确认
+"""
+
+import hashlib
+import logging
+import math
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.services.database_service import db
+
+logger = logging.getLogger(__name__)
+
+# 启动时分页加载用户的每页条数
+REBUILD_PAGE_SIZE = 1000
+
+
+class BloomFilter:
+    """按容量和期望误判率确定位数组大小与哈希次数的布隆过滤器"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # 双重哈希：一次 blake2b 得到两个 64 位值，组合出 k 个位置
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class UserIndex:
+    """
+    已注册邮箱与用户名的布隆过滤器索引
+
+    启动时从数据库重建，注册和修改用户名时追加。布隆过滤器不支持删除，改名后旧用户名
+    仍会命中，由数据库查询兜底。多进程部署时其他进程新注册的用户不会出现在本进程的
+    过滤器里，因此“可用”只作为提示，注册最终以数据库唯一约束为准。
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.emails = BloomFilter(capacity, error_rate)
+        self.usernames = BloomFilter(capacity, error_rate)
+        self.ready = False
+        self._rebuilding = False
+        # 重建期间新增的条目，重建完成后补进新过滤器
+        self._pending: List[Tuple[Optional[str], Optional[str]]] = []
+        self.definite_misses = 0
+        self.db_lookups = 0
+
+    @staticmethod
+    def _normalize(value: str) -> str:
+        return value.strip().lower()
+
+    async def rebuild(self):
+        """从数据库加载全部邮箱和用户名，构建新的过滤器后整体替换"""
+        if not db.is_enabled() or self._rebuilding:
+            return
+
+        self._rebuilding = True
+        try:
+            rows = []
+            offset = 0
+            while True:
+                page = await db.list_user_identities(offset, REBUILD_PAGE_SIZE)
+                rows.extend(page)
+                if len(page) < REBUILD_PAGE_SIZE:
+                    break
+                offset += REBUILD_PAGE_SIZE
+
+            # 用户数超过配置容量时按两倍用户数分配，保持误判率
+            capacity = max(self.capacity, 2 * len(rows))
+            emails = BloomFilter(capacity, self.error_rate)
+            usernames = BloomFilter(capacity, self.error_rate)
+            for row in rows:
+                if row.get("email"):
+                    emails.add(self._normalize(row["email"]))
+                if row.get("username"):
+                    usernames.add(self._normalize(row["username"]))
+            for email, username in self._pending:
+                if email:
+                    emails.add(self._normalize(email))
+                if username:
+                    usernames.add(self._normalize(username))
+
+            self.emails, self.usernames = emails, usernames
+            self.ready = True
+            logger.info(f"用户名/邮箱索引已重建: {len(rows)} 个用户")
+        except Exception as e:
+            logger.error(f"用户名/邮箱索引重建失败，回退为直接查库: {str(e)}")
+        finally:
+            self._pending = []
+            self._rebuilding = False
+
+    def add(self, email: Optional[str] = None, username: Optional[str] = None):
+        if email:
+            self.emails.add(self._normalize(email))
+        if username:
+            self.usernames.add(self._normalize(username))
+        if self._rebuilding:
+            self._pending.append((email, username))
+
+    def probably_taken(self, column: str, value: str) -> bool:
+        """过滤器判定可能已被占用；索引未就绪时一律返回 True"""
+        if not self.ready:
+            return True
+        bloom = self.emails if column == "email" else self.usernames
+        return self._normalize(value) in bloom
+
+    async def is_available(self, column: str, value: str) -> bool:
+        """邮箱/用户名是否可用：过滤器未命中时直接返回，命中时查库确认"""
+        if not self.probably_taken(column, value):
+            self.definite_misses += 1
+            return True
+        self.db_lookups += 1
+        return not await db.user_exists(column, value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "emails": self.emails.count,
+            "usernames": self.usernames.count,
+            "bits": self.emails.size,
+            "hash_count": self.emails.hash_count,
+            "definite_misses": self.definite_misses,
+            "db_lookups": self.db_lookups,
+        }
+
+
+# 创建服务实例
+user_index = UserIndex(settings.USER_INDEX_CAPACITY, settings.USER_INDEX_ERROR_RATE)
@@ -1,18 +1,241 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Callable, Awaitable, AsyncIterator, Tuple, Union, BinaryIO, Iterable
 import json
 import base64
 import hmac
 import hashlib
-import time
 from datetime import datetime
-from urllib.parse import urlencode
-import websocket
+from urllib.parse import urlencode, urlparse
+import websockets
 import asyncio
 import logging
+import math
+import queue
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from app.core.config import settings
+from app.services.intent_parser import intent_parser
+from app.services.audio_pipeline import (
+    AudioFormatError,
+    TARGET_SAMPLE_RATE,
+    convert_wav,
+    decode_compressed_chunks,
+    is_compressed,
+    iter_chunks,
+    iter_file_chunks,
+    iter_pcm16k,
+    parse_raw_format,
+    parse_wav,
+    resample_pcm_chunks,
+    split_on_pauses,
+    trim_silence,
+    whole_samples,
+)
 
 logger = logging.getLogger(__name__)
 
+# 检测 HTTP 客户端断开的轮询间隔（秒）
+DISCONNECT_POLL_INTERVAL = 0.5
+# 16kHz 16bit 单声道 PCM 每秒字节数
+PCM_BYTES_PER_SECOND = TARGET_SAMPLE_RATE * 2
+
+
+class FramePacer:
+    """
+    音频帧发送节奏控制
+    
+    按绝对时间表（第 n 帧在 n * 帧时长 / speed 时发送）等待，而不是每帧固定 sleep，
+    不会因发送耗时累积漂移。speed <= 0 表示不限速，只依赖 WebSocket 发送缓冲区的背压。
+    """
+    
+    def __init__(self, frame_duration: float, speed: float):
+        self.interval = frame_duration / speed if speed > 0 else 0.0
+        self._start: Optional[float] = None
+    
+    async def wait(self, frame_index: int):
+        """等待第 frame_index 帧的发送时刻"""
+        if self.interval <= 0:
+            # 仍然让出事件循环，避免长音频独占
+            await asyncio.sleep(0)
+            return
+        
+        loop = asyncio.get_event_loop()
+        if self._start is None:
+            self._start = loop.time()
+        
+        delay = self._start + frame_index * self.interval - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class TranscriptAssembler:
+    """
+    拼接 IAT 流式结果
+    
+    开启 dwa=wpgs 后，服务端会用 pgs=rpl 和 rg=[起, 止] 替换之前的片段，
+    按 sn 保存每个片段才能得到正确的文本。
+    """
+    
+    def __init__(self):
+        self._segments: Dict[int, str] = {}
+        self._next_sn = 1
+    
+    def feed(self, result: Dict[str, Any]) -> str:
+        """处理一条识别结果，返回当前完整文本"""
+        sn = result.get("sn", self._next_sn)
+        self._next_sn = sn + 1
+        
+        # 每个词取第一个候选
+        words = "".join(
+            cw_list[0].get("w", "")
+            for cw_list in (ws_item.get("cw", []) for ws_item in result.get("ws", []))
+            if cw_list
+        )
+        
+        if result.get("pgs") == "rpl":
+            start, end = result.get("rg", [sn, sn])
+            for replaced in range(start, end + 1):
+                self._segments.pop(replaced, None)
+        
+        self._segments[sn] = words
+        return self.text
+    
+    @property
+    def text(self) -> str:
+        return "".join(self._segments[sn] for sn in sorted(self._segments))
+
+
+class ASRBusyError(Exception):
+    """识别会话已满且排队超限或等待超时"""
+    
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SessionLimiter:
+    """
+    识别会话准入控制
+    
+    同时进行的讯飞会话不超过 max_sessions；超出的请求排队等待，最多 max_queue 个、
+    最长 queue_timeout 秒。队列已满或等待超时时抛出 ASRBusyError，附带建议的重试秒数。
+    """
+    
+    def __init__(self, max_sessions: int, max_queue: int, queue_timeout: float):
+        self.max_sessions = max(max_sessions, 1)
+        self.max_queue = max(max_queue, 0)
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(self.max_sessions)
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # 会话时长的指数移动平均，用于估算重试时间
+        self._avg_duration: Optional[float] = None
+    
+    def retry_after(self) -> int:
+        """按平均会话时长和排队人数估算多久后重试"""
+        avg = self._avg_duration if self._avg_duration is not None else 5.0
+        return max(1, math.ceil(avg * (self.queued + 1) / self.max_sessions))
+    
+    async def acquire(self):
+        """获取一个会话名额"""
+        if self._semaphore.locked():
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise ASRBusyError("语音识别繁忙，请稍后重试", self.retry_after())
+            
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise ASRBusyError("语音识别排队超时，请稍后重试", self.retry_after())
+            finally:
+                self.queued -= 1
+        else:
+            await self._semaphore.acquire()
+        
+        self.active += 1
+        self.admitted += 1
+    
+    def release(self, duration: float):
+        """释放名额并更新平均会话时长"""
+        self.active -= 1
+        self._semaphore.release()
+        if self._avg_duration is None:
+            self._avg_duration = duration
+        else:
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_sessions": self.max_sessions,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_session_ms": round(self._avg_duration * 1000, 1) if self._avg_duration is not None else None,
+        }
+
+
+class RecognitionCache:
+    """
+    识别结果缓存
+    
+    以 16kHz PCM 内容哈希加语言为键，缓存成功的识别结果。前端重试或用户修改解析结果后
+    重新提交同一段录音时直接返回，不再占用讯飞会话。按 LRU 淘汰，超过 ttl 秒的条目视为失效。
+    存入和取出时都复制一份，调用方修改返回的结果（如批量识别补充片段位置）不会影响缓存。
+    """
+    
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max(max_entries, 0)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+    
+    @staticmethod
+    def make_key(pcm_data: Union[bytes, memoryview], language: str) -> str:
+        digest = hashlib.blake2b(pcm_data, digest_size=16).hexdigest()
+        return f"{language}:{digest}"
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry[1])
+    
+    def put(self, key: str, value: Dict[str, Any]):
+        self._entries[key] = (time.monotonic() + self.ttl, dict(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
 
 class VoiceRecognitionService:
     """科大讯飞语音识别服务"""
@@ -21,7 +244,14 @@ class VoiceRecognitionService:
         self.app_id = settings.XFYUN_APP_ID
         self.api_key = settings.XFYUN_API_KEY
         self.api_secret = settings.XFYUN_API_SECRET
-        self.base_url = "wss://iat-api.xfyun.cn/v2/iat"
+        self.base_url = settings.XFYUN_BASE_URL
+        self.max_pcm_bytes = int(settings.VOICE_MAX_DURATION * PCM_BYTES_PER_SECOND)
+        self.limiter = SessionLimiter(
+            settings.XFYUN_MAX_SESSIONS,
+            settings.XFYUN_MAX_QUEUE,
+            settings.XFYUN_QUEUE_TIMEOUT
+        )
+        self.cache = RecognitionCache(settings.VOICE_CACHE_TTL, settings.VOICE_CACHE_MAX_ENTRIES)
         
         if not all([self.app_id, self.api_key, self.api_secret]):
             logger.warning("科大讯飞语音识别 API 未完全配置")
@@ -32,10 +262,15 @@ class VoiceRecognitionService:
         now = datetime.utcnow()
         date = now.strftime('%a, %d %b %Y %H:%M:%S GMT')
         
+        # 签名中的 host 与请求行取自 XFYUN_BASE_URL，指向其他地址（如本地模拟服务）时签名同样有效
+        parsed = urlparse(self.base_url)
+        host = parsed.netloc
+        path = parsed.path or "/"
+        
         # 拼接字符串
-        signature_origin = f"host: iat-api.xfyun.cn\n"
+        signature_origin = f"host: {host}\n"
         signature_origin += f"date: {date}\n"
-        signature_origin += f"GET /v2/iat HTTP/1.1"
+        signature_origin += f"GET {path} HTTP/1.1"
         
         # 进行hmac-sha256加密
         signature_sha = hmac.new(
@@ -53,62 +288,151 @@ class VoiceRecognitionService:
         params = {
             "authorization": authorization,
             "date": date,
-            "host": "iat-api.xfyun.cn"
+            "host": host
         }
         
         return f"{self.base_url}?{urlencode(params)}"
     
-    def extract_pcm_from_wav(self, wav_data: bytes) -> bytes:
-        """从WAV文件中提取PCM数据"""
-        try:
-            # WAV文件头通常是44字节
-            # 检查是否是有效的WAV文件
-            if len(wav_data) < 44:
-                logger.warning(f"音频数据太短，可能不是有效的WAV文件: {len(wav_data)} bytes")
-                return wav_data
-            
-            # 检查RIFF标识
-            if wav_data[:4] != b'RIFF':
-                logger.warning("不是有效的WAV文件，没有RIFF标识")
-                return wav_data
-            
-            # 检查WAVE标识
-            if wav_data[8:12] != b'WAVE':
-                logger.warning("不是有效的WAV文件，没有WAVE标识")
-                return wav_data
-            
-            # 查找data块
-            data_pos = wav_data.find(b'data')
-            if data_pos == -1:
-                logger.warning("WAV文件中未找到data块")
-                return wav_data
-            
-            # data块后4字节是数据大小，之后是PCM数据
-            pcm_data = wav_data[data_pos + 8:]
-            logger.info(f"从WAV文件中提取PCM数据: 原始{len(wav_data)}字节 -> PCM {len(pcm_data)}字节")
-            return pcm_data
-            
-        except Exception as e:
-            logger.error(f"提取PCM数据失败: {str(e)}")
-            return wav_data
+    def extract_pcm_from_wav(self, wav_data: bytes) -> Union[bytes, memoryview]:
+        """
+        从WAV文件中提取 16kHz 16bit 单声道 PCM
+        
+        已符合要求时直接返回 data 块的 memoryview（不复制）；
+        其他采样率、声道数或位深先重采样再返回
+        
+        Raises:
+            AudioFormatError: WAV 文件损坏或编码不受支持
+        """
+        info, payload = parse_wav(wav_data)
+        if info.is_asr_ready:
+            logger.debug(f"从WAV文件中提取PCM数据: 原始{len(wav_data)}字节 -> PCM {len(payload)}字节")
+            return payload
+        
+        logger.debug(f"WAV 格式为 {info}，重采样为 16kHz 16bit 单声道")
+        return convert_wav(info, payload)
     
     async def recognize_audio(
         self, 
         audio_data: bytes,
         audio_format: str = "audio/L16;rate=16000",
-        language: str = "zh_cn"
+        language: str = "zh_cn",
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        realtime: bool = False
     ) -> Dict[str, Any]:
         """
         识别音频文件
         
         Args:
             audio_data: 音频二进制数据
-            audio_format: 音频格式，默认为 PCM 16k 16bit
+            audio_format: 音频 MIME 类型（如 audio/webm、audio/L16;rate=44100），默认为 PCM 16k 16bit
             language: 语言，zh_cn(中文) 或 en_us(英文)
+            is_disconnected: 可选，检测 HTTP 客户端是否已断开的协程函数；断开后立即取消识别
+            realtime: 是否按实时速度发送（实时音频流）；默认按 XFYUN_UPLOAD_SPEED 加速发送已录制的音频
         
         Returns:
             识别结果字典
         """
+        return await self._recognize(
+            lambda: self.prepare_pcm(audio_data, audio_format),
+            language,
+            is_disconnected,
+            realtime
+        )
+    
+    async def recognize_upload(
+        self,
+        fileobj: BinaryIO,
+        audio_format: Optional[str] = None,
+        language: str = "zh_cn",
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> Dict[str, Any]:
+        """
+        识别上传的音频文件对象
+        
+        按块读取文件，经解码/重采样生成器流水线直接得到 16kHz PCM，
+        不会把原始上传整体读入内存；音频时长超过 VOICE_MAX_DURATION 时立即停止读取
+        """
+        return await self._recognize(
+            lambda: self.read_pcm(fileobj, audio_format),
+            language,
+            is_disconnected
+        )
+    
+    async def recognize_batch(
+        self,
+        clips: List[Tuple[BinaryIO, Optional[str]]],
+        split: bool = False,
+        language: str = "zh_cn",
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        批量识别多段音频
+        
+        每段先转换为 PCM；split=True 时再按长停顿切分成多段。所有片段并发识别，
+        单次批量最多占用 VOICE_BATCH_CONCURRENCY 个会话，整体仍受会话准入控制约束。
+        
+        Args:
+            clips: [(文件对象, 音频 MIME 类型)]
+            split: 是否把每段录音按停顿切分
+        
+        Returns:
+            按顺序排列的识别结果，每项额外带有 clip、start_ms、end_ms
+        """
+        segments: List[Tuple[int, int, int, Any]] = []
+        failures: List[Dict[str, Any]] = []
+        
+        for clip_index, (fileobj, audio_format) in enumerate(clips):
+            try:
+                pcm = await self.read_pcm(fileobj, audio_format)
+            except AudioFormatError as e:
+                failures.append({
+                    "clip": clip_index, "start_ms": 0, "end_ms": 0,
+                    "success": False, "error": str(e), "text": "", "invalid_audio": True
+                })
+                continue
+            
+            duration_ms = len(pcm) * 1000 // PCM_BYTES_PER_SECOND
+            if not split:
+                segments.append((clip_index, 0, duration_ms, pcm))
+                continue
+            
+            loop = asyncio.get_event_loop()
+            parts = await loop.run_in_executor(
+                None,
+                lambda: split_on_pauses(
+                    pcm,
+                    min_pause_ms=settings.VOICE_SPLIT_PAUSE_MS,
+                    margin_db=settings.VAD_MARGIN_DB,
+                    min_speech_db=settings.VAD_MIN_SPEECH_DB,
+                    padding_ms=settings.VAD_PADDING_MS
+                )
+            )
+            logger.info(f"第 {clip_index + 1} 段录音按停顿切分为 {len(parts)} 段")
+            for start_ms, end_ms, part in parts:
+                segments.append((clip_index, start_ms, end_ms, part))
+        
+        semaphore = asyncio.Semaphore(max(settings.VOICE_BATCH_CONCURRENCY, 1))
+        
+        async def run(clip_index: int, start_ms: int, end_ms: int, pcm: Any) -> Dict[str, Any]:
+            async def load():
+                return pcm
+            
+            async with semaphore:
+                result = await self._recognize(load, language, is_disconnected)
+            result.update({"clip": clip_index, "start_ms": start_ms, "end_ms": end_ms})
+            return result
+        
+        results = await asyncio.gather(*(run(*segment) for segment in segments))
+        return sorted(list(results) + failures, key=lambda r: (r["clip"], r["start_ms"]))
+    
+    async def _recognize(
+        self,
+        load_pcm: Callable[[], Awaitable[Union[bytes, memoryview]]],
+        language: str,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        realtime: bool = False
+    ) -> Dict[str, Any]:
+        """识别流程：加载 PCM -> VAD -> 分帧发送给讯飞"""
         if not all([self.app_id, self.api_key, self.api_secret]):
             return {
                 "success": False,
@@ -117,150 +441,81 @@ class VoiceRecognitionService:
             }
         
         try:
-            # 如果是WAV文件，提取PCM数据
-            if audio_data[:4] == b'RIFF':
-                logger.info("检测到WAV文件，提取PCM数据")
-                audio_data = self.extract_pcm_from_wav(audio_data)
-            
-            logger.info(f"准备识别音频: {len(audio_data)} bytes")
-            result_text = ""
+            audio_data = await load_pcm()
+            if len(audio_data) > self.max_pcm_bytes:
+                raise AudioFormatError(f"音频时长超过 {settings.VOICE_MAX_DURATION} 秒")
             
-            # 创建WebSocket连接
-            ws_url = self.create_url()
+            cache_key = None
+            if self.cache.enabled:
+                cache_key = self.cache.make_key(audio_data, language)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"命中识别缓存: {len(audio_data)} bytes")
+                    return {**cached, "cached": True}
             
-            def on_message(ws, message):
-                nonlocal result_text
-                try:
-                    data = json.loads(message)
-                    code = data.get("code", -1)
-                    
-                    logger.info(f"收到消息: code={code}, data={data}")
-                    
-                    if code != 0:
-                        logger.error(f"识别错误: code={code}, message={data.get('message', '未知错误')}")
-                        logger.error(f"完整错误信息: {json.dumps(data, ensure_ascii=False)}")
-                        ws.close()
-                        return
-                    
-                    # 解析识别结果
-                    data_content = data.get("data", {})
-                    result = data_content.get("result", {})
-                    ws_list = result.get("ws", [])
-                    
-                    logger.info(f"解析结果: ws_list长度={len(ws_list)}")
-                    
-                    for ws_item in ws_list:
-                        for cw_item in ws_item.get("cw", []):
-                            word = cw_item.get("w", "")
-                            if word:
-                                result_text += word
-                                logger.info(f"识别到词语: {word}")
-                    
-                    # 判断是否结束
-                    status = data_content.get("status")
-                    logger.info(f"当前状态: status={status}, 已识别文本长度={len(result_text)}")
-                    
-                    if status == 2:
-                        logger.info(f"识别完成: {result_text}")
-                        ws.close()
-                        
-                except Exception as e:
-                    logger.error(f"解析识别结果出错: {str(e)}")
-                    logger.exception(e)
-                    ws.close()
-            
-            def on_error(ws, error):
-                logger.error(f"WebSocket错误: {error}")
+            audio_data, vad_stats = await self.apply_vad(audio_data)
             
-            def on_close(ws, close_status_code, close_msg):
-                logger.info("WebSocket连接关闭")
+            logger.info(f"准备识别音频: {len(audio_data)} bytes")
             
-            def on_open(ws):
-                def run():
-                    try:
-                        # 发送配置信息
-                        common_args = {
-                            "app_id": self.app_id
-                        }
-                        business_args = {
-                            "domain": "iat",
-                            "language": language,
-                            "accent": "mandarin",  # 普通话
-                            "vad_eos": 2000,  # 静音检测时长 2秒
-                            "dwa": "wpgs"  # 动态修正
-                        }
-                        
-                        # 注意：第一帧不发送音频数据，只发送配置
-                        frame = {
-                            "common": common_args,
-                            "business": business_args,
-                            "data": {
-                                "status": 0,
-                                "format": "audio/L16;rate=16000",
-                                "encoding": "raw",
-                                "audio": ""
-                            }
-                        }
-                        logger.info(f"发送配置帧: {json.dumps(frame, ensure_ascii=False)}")
-                        ws.send(json.dumps(frame))
-                        time.sleep(0.04)
-                        
-                        # 分片发送音频数据
-                        chunk_size = 1280  # 40ms 音频数据 (16000 * 2 * 0.04 = 1280)
-                        total_chunks = (len(audio_data) + chunk_size - 1) // chunk_size
-                        logger.info(f"音频数据总大小: {len(audio_data)} bytes, 将分{total_chunks}片发送")
-                        
-                        for i in range(0, len(audio_data), chunk_size):
-                            chunk = audio_data[i:i + chunk_size]
-                            audio_base64 = base64.b64encode(chunk).decode('utf-8')
-                            
-                            # 判断状态
-                            if i + chunk_size >= len(audio_data):
-                                status = 2  # 最后一帧
-                            else:
-                                status = 1  # 中间帧
-                            
-                            frame = {
-                                "data": {
-                                    "status": status,
-                                    "format": "audio/L16;rate=16000",
-                                    "encoding": "raw",
-                                    "audio": audio_base64
-                                }
-                            }
-                            ws.send(json.dumps(frame))
-                            
-                            if i % (chunk_size * 10) == 0:  # 每10片打印一次日志
-                                logger.info(f"已发送 {i // chunk_size + 1}/{total_chunks} 片")
-                            
-                            time.sleep(0.04)  # 模拟音频采集间隔
-                        
-                    except Exception as e:
-                        logger.error(f"发送音频数据出错: {str(e)}")
-                        ws.close()
-                
-                # 在新线程中运行
-                import threading
-                threading.Thread(target=run).start()
+            speed = 1.0 if realtime else settings.XFYUN_UPLOAD_SPEED
+            session = asyncio.ensure_future(self._run_session(audio_data, language, speed))
+            watcher = None
+            if is_disconnected is not None:
+                watcher = asyncio.ensure_future(self._watch_disconnect(is_disconnected, session))
             
-            # 创建WebSocket连接
-            ws = websocket.WebSocketApp(
-                ws_url,
-                on_message=on_message,
-                on_error=on_error,
-                on_close=on_close
-            )
-            ws.on_open = on_open
+            try:
+                result_text = await session
+            except asyncio.CancelledError:
+                session.cancel()
+                # 断开检测取消了识别会话时当前任务本身并未被取消，转为错误结果；
+                # 请求或服务关闭导致的取消在清理后继续向上抛出
+                current = asyncio.current_task()
+                if current is not None and current.cancelling():
+                    raise
+                logger.info("客户端已断开，识别会话已取消")
+                return {
+                    "success": False,
+                    "error": "客户端已断开",
+                    "text": ""
+                }
+            finally:
+                if watcher is not None:
+                    watcher.cancel()
             
-            # 运行WebSocket（会阻塞直到连接关闭）
-            ws.run_forever()
-            
-            return {
+            result = {
                 "success": True,
                 "text": result_text.strip(),
-                "error": None
+                "error": None,
+                "vad": vad_stats
             }
+            if cache_key is not None:
+                self.cache.put(cache_key, result)
+            return result
             
+        except ASRBusyError as e:
+            logger.warning(f"识别会话已满: {str(e)}，建议 {e.retry_after} 秒后重试")
+            return {
+                "success": False,
+                "error": str(e),
+                "text": "",
+                "busy": True,
+                "retry_after": e.retry_after
+            }
+        except AudioFormatError as e:
+            logger.warning(f"音频格式错误: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "text": "",
+                "invalid_audio": True
+            }
+        except asyncio.TimeoutError:
+            logger.error("语音识别超时")
+            return {
+                "success": False,
+                "error": "语音识别超时",
+                "text": ""
+            }
         except Exception as e:
             logger.error(f"语音识别失败: {str(e)}")
             return {
@@ -269,6 +524,151 @@ class VoiceRecognitionService:
                 "text": ""
             }
     
+    async def read_pcm(self, fileobj: BinaryIO, audio_format: Optional[str] = None) -> bytes:
+        """在线程池中按块读取文件并转换为 16kHz PCM"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self._collect_pcm, iter_file_chunks(fileobj), audio_format)
+    
+    def _collect_pcm(self, chunks: Iterable[bytes], audio_format: Optional[str]) -> bytes:
+        """消费 PCM 生成器；超过最大时长立即中止，不再读取剩余上传"""
+        pcm = bytearray()
+        for piece in iter_pcm16k(chunks, audio_format):
+            pcm += piece
+            if len(pcm) > self.max_pcm_bytes:
+                raise AudioFormatError(f"音频时长超过 {settings.VOICE_MAX_DURATION} 秒")
+        # 原始 PCM 和 WAV data 块原样透传，长度可能是奇数
+        del pcm[len(pcm) & ~1:]
+        return bytes(pcm)
+    
+    async def prepare_pcm(self, audio_data: bytes, audio_format: Optional[str] = None) -> Union[bytes, memoryview]:
+        """
+        把上传的音频统一转换为 16kHz 16bit 单声道 PCM
+        
+        - WebM/Opus、OGG、MP3 等压缩音频：PyAV 流式解码并重采样
+        - WAV：解析 fmt/data 块，符合要求时零拷贝返回 data 块，否则重采样
+        - 其他视为原始 PCM，按 audio_format 中的 rate/channels 重采样
+        解码和重采样是 CPU 密集操作，放到线程池中执行，避免阻塞事件循环
+        """
+        loop = asyncio.get_event_loop()
+        
+        if is_compressed(audio_data[:4], audio_format):
+            logger.debug(f"检测到压缩音频（{audio_format}），解码为 16kHz PCM")
+            chunks = iter_chunks(audio_data)
+            return await loop.run_in_executor(None, lambda: b"".join(decode_compressed_chunks(chunks)))
+        
+        if audio_data[:4] == b'RIFF':
+            info, payload = parse_wav(audio_data)
+            if info.is_asr_ready:
+                logger.debug(f"检测到WAV文件，提取PCM数据: {len(payload)} bytes")
+                return whole_samples(payload)
+            logger.debug(f"WAV 格式为 {info}，重采样为 16kHz 16bit 单声道")
+            return await loop.run_in_executor(None, convert_wav, info, payload)
+        
+        rate, channels = parse_raw_format(audio_format)
+        if rate == TARGET_SAMPLE_RATE and channels == 1:
+            return whole_samples(audio_data)
+        
+        logger.debug(f"原始 PCM 为 {rate}Hz {channels} 声道，重采样为 16kHz 单声道")
+        return await loop.run_in_executor(
+            None, lambda: b"".join(resample_pcm_chunks(iter_chunks(audio_data), rate, channels))
+        )
+    
+    async def apply_vad(self, pcm_data: Union[bytes, memoryview]) -> Tuple[Union[bytes, memoryview], Optional[Dict[str, Any]]]:
+        """
+        语音活动检测：裁掉首尾静音、压缩过长停顿，减少发送给讯飞的帧数
+        
+        Returns:
+            (处理后的 PCM, 统计信息)；未启用时统计信息为 None
+        """
+        if not settings.VAD_ENABLED:
+            return pcm_data, None
+        
+        loop = asyncio.get_event_loop()
+        trimmed, stats = await loop.run_in_executor(
+            None,
+            lambda: trim_silence(
+                pcm_data,
+                margin_db=settings.VAD_MARGIN_DB,
+                min_speech_db=settings.VAD_MIN_SPEECH_DB,
+                padding_ms=settings.VAD_PADDING_MS,
+                max_pause_ms=settings.VAD_MAX_PAUSE_MS
+            )
+        )
+        
+        if not stats["speech_detected"]:
+            logger.info(f"VAD 未检测到语音，保留原始音频 {stats['original_ms']}ms")
+        elif stats["removed_ms"]:
+            logger.info(
+                f"VAD 裁剪静音: {stats['original_ms']}ms -> {stats['kept_ms']}ms，"
+                f"减少 {stats['removed_ms']}ms"
+            )
+        return trimmed, stats
+    
+    async def _watch_disconnect(
+        self,
+        is_disconnected: Callable[[], Awaitable[bool]],
+        session: "asyncio.Future"
+    ):
+        """轮询客户端连接状态，断开后取消识别会话"""
+        while not session.done():
+            if await is_disconnected():
+                session.cancel()
+                return
+            await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+    
+    def open_stream(self, language: str = "zh_cn") -> "StreamingRecognitionSession":
+        """打开一个边发送边接收的识别会话（async with 使用）"""
+        return StreamingRecognitionSession(self, language)
+    
+    async def _run_session(self, pcm_data: bytes, language: str, speed: float = 1.0) -> str:
+        """对一段完整的 PCM 音频执行一次识别：发送与接收并发进行"""
+        async with self.open_stream(language) as session:
+            sender = asyncio.ensure_future(self._send_frames(session, pcm_data, speed))
+            
+            try:
+                # 服务端可能因 vad_eos 提前返回最终结果，此时不必等音频发完
+                done, _ = await asyncio.wait(
+                    {sender, session.receiver},
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if session.receiver not in done:
+                    try:
+                        sender.result()
+                    except websockets.ConnectionClosed:
+                        # 服务端返回错误码后会直接断开，发送失败时以接收到的错误信息为准
+                        pass
+                text = await session.wait_final()
+            finally:
+                if not sender.done():
+                    sender.cancel()
+                elif not sender.cancelled():
+                    # 取走异常，避免 "exception was never retrieved" 警告
+                    sender.exception()
+            
+            logger.info(f"识别完成: {len(text)} 字")
+            return text
+    
+    async def _send_frames(self, session: "StreamingRecognitionSession", pcm_data: bytes, speed: float = 1.0):
+        """
+        分帧发送一段完整音频，最后一帧 status=2
+        
+        speed 为相对实时的倍速；ws.send 在发送缓冲区满时会等待，从而形成背压
+        """
+        # 默认每帧 1280 字节即 40ms 音频
+        chunk_size = settings.XFYUN_FRAME_BYTES
+        total_chunks = (len(pcm_data) + chunk_size - 1) // chunk_size
+        pacer = FramePacer(chunk_size / PCM_BYTES_PER_SECOND, speed)
+        logger.debug(f"音频数据总大小: {len(pcm_data)} bytes, 将分{total_chunks}片以 {speed} 倍速发送")
+        
+        if total_chunks == 0:
+            await session.finish()
+            return
+        
+        for index, i in enumerate(range(0, len(pcm_data), chunk_size)):
+            await pacer.wait(index + 1)
+            is_last = i + chunk_size >= len(pcm_data)
+            await session.send_frame(pcm_data[i:i + chunk_size], last=is_last)
+    
     def parse_expense_intent(self, text: str) -> Dict[str, Any]:
         """
         解析费用记录语音意图
@@ -279,141 +679,7 @@ class VoiceRecognitionService:
         Returns:
             解析出的费用信息
         """
-        import re
-        from datetime import datetime
-        
-        result = {
-            "amount": None,
-            "category": None,
-            "description": None,
-            "expense_date": datetime.now().isoformat(),
-            "raw_text": text
-        }
-        
-        # 提取金额（按优先级排序，避免误匹配）
-        amount_patterns = [
-            r"花了?(\d+\.?\d*)元",
-            r"花了?(\d+\.?\d*)块",
-            r"消费了?(\d+\.?\d*)元?",
-            r"支付了?(\d+\.?\d*)元?",
-            r"花费(\d+\.?\d*)元?",
-            r"(\d+\.?\d*)块钱",
-            r"(\d+\.?\d*)rmb",
-            r"(\d+\.?\d*)元",  # 最后匹配纯数字+元，避免过早匹配
-        ]
-        
-        for pattern in amount_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                try:
-                    result["amount"] = float(match.group(1))
-                    break
-                except (ValueError, IndexError):
-                    continue
-        
-        # 识别费用类别和描述
-        category_keywords = {
-            'transport': {
-                'keywords': ['打车', '出租车', '滴滴', '公交', '地铁', '火车', '高铁', '飞机', '机票', '车票', '交通', '油费', '停车'],
-                'description_templates': ['交通费用', '打车', '公共交通']
-            },
-            'accommodation': {
-                'keywords': ['酒店', '住宿', '旅馆', '民宿', '客栈', '宾馆', '房费'],
-                'description_templates': ['住宿费用', '酒店', '民宿']
-            },
-            'food': {
-                'keywords': ['吃饭', '餐厅', '饭店', '美食', '午餐', '晚餐', '早餐', '夜宵', '小吃', '餐费', '喝咖啡', '奶茶'],
-                'description_templates': ['餐饮费用', '就餐', '用餐']
-            },
-            'attraction': {
-                'keywords': ['门票', '景点', '游览', '参观', '博物馆', '公园', '游乐园', '动物园'],
-                'description_templates': ['景点门票', '游览费用', '门票']
-            },
-            'shopping': {
-                'keywords': ['购物', '买', '商场', '超市', '纪念品', '特产', '商店'],
-                'description_templates': ['购物消费', '购买商品', '购物']
-            },
-            'other': {
-                'keywords': ['其他', '杂费', '费用'],
-                'description_templates': ['其他费用', '杂项支出']
-            }
-        }
-        
-        # 匹配类别
-        matched_category = None
-        matched_keywords = []
-        
-        for category, data in category_keywords.items():
-            for keyword in data['keywords']:
-                if keyword in text:
-                    matched_category = category
-                    matched_keywords.append(keyword)
-                    break
-            if matched_category:
-                break
-        
-        if matched_category:
-            result["category"] = matched_category
-            # 生成描述
-            if matched_keywords:
-                result["description"] = f"{matched_keywords[0]}"
-        else:
-            # 默认为其他类别
-            result["category"] = "other"
-        
-        # 尝试提取更详细的描述信息
-        # 提取地点/商家名称
-        location_patterns = [
-            r"在(.{2,10}?)(?:吃饭|消费|购物|花了)",
-            r"(.{2,10}?)(?:餐厅|饭店|商场|超市|店)",
-        ]
-        
-        for pattern in location_patterns:
-            match = re.search(pattern, text)
-            if match:
-                location = match.group(1).strip()
-                if location and len(location) <= 20:
-                    if result["description"]:
-                        result["description"] = f"{location} - {result['description']}"
-                    else:
-                        result["description"] = location
-                break
-        
-        # 如果没有描述，使用原文的简化版本
-        if not result["description"] and result["amount"]:
-            # 去掉金额部分，保留描述性文字
-            desc = re.sub(r'\d+\.?\d*[元块钱rmb]*', '', text).strip()
-            desc = re.sub(r'[花了消费支付]', '', desc).strip()
-            if desc and len(desc) <= 50:
-                result["description"] = desc
-            else:
-                result["description"] = "消费"
-        
-        # 日期识别（如果提到了日期）
-        date_patterns = [
-            r"昨天",
-            r"前天",
-            r"今天",
-            r"刚才",
-            r"(\d{1,2})号",
-            r"(\d{1,2})日"
-        ]
-        
-        date_keywords = {
-            "昨天": -1,
-            "前天": -2,
-            "今天": 0,
-            "刚才": 0
-        }
-        
-        for keyword, offset in date_keywords.items():
-            if keyword in text:
-                from datetime import timedelta
-                target_date = datetime.now() + timedelta(days=offset)
-                result["expense_date"] = target_date.isoformat()
-                break
-        
-        return result
+        return intent_parser.parse_expense(text)
     
     def parse_travel_intent(self, text: str) -> Dict[str, Any]:
         """
@@ -425,89 +691,218 @@ class VoiceRecognitionService:
         Returns:
             解析出的旅行信息
         """
-        import re
-        
-        result = {
-            "destination": None,
-            "days": None,
-            "budget": None,
-            "people_count": 1,
-            "preferences": [],
-            "raw_text": text
-        }
-        
-        # 提取目的地（简单规则，可以用NLP优化）
-        destination_patterns = [
-            r"去([\u4e00-\u9fa5]+)",
-            r"到([\u4e00-\u9fa5]+)",
-            r"想去([\u4e00-\u9fa5]+)",
-            r"([\u4e00-\u9fa5]+)旅游",
-            r"([\u4e00-\u9fa5]+)旅行"
-        ]
-        for pattern in destination_patterns:
-            match = re.search(pattern, text)
-            if match:
-                result["destination"] = match.group(1)
-                break
-        
-        # 提取天数
-        days_patterns = [
-            r"(\d+)天",
-            r"(\d+)日",
-            r"(\d+)个晚上"
-        ]
-        for pattern in days_patterns:
-            match = re.search(pattern, text)
-            if match:
-                result["days"] = int(match.group(1))
-                break
-        
-        # 提取预算
-        budget_patterns = [
-            r"预算(\d+)元",
-            r"预算(\d+)块",
-            r"(\d+)元预算",
-            r"(\d+)块钱",
-            r"预算.*?(\d+)",
-            r"(\d+)万"
-        ]
-        for pattern in budget_patterns:
-            match = re.search(pattern, text)
-            if match:
-                budget = int(match.group(1))
-                if "万" in pattern:
-                    budget *= 10000
-                result["budget"] = budget
-                break
-        
-        # 提取人数
-        people_patterns = [
-            r"(\d+)人",
-            r"(\d+)个人"
-        ]
-        for pattern in people_patterns:
-            match = re.search(pattern, text)
-            if match:
-                result["people_count"] = int(match.group(1))
-                break
-        
-        # 识别偏好关键词
-        preference_keywords = {
-            "美食": ["美食", "吃", "小吃", "餐厅", "美味"],
-            "购物": ["购物", "买东西", "商场", "逛街"],
-            "文化": ["文化", "历史", "博物馆", "古迹", "遗产"],
-            "自然风光": ["风景", "自然", "山水", "海边", "沙滩", "森林"],
-            "亲子": ["亲子", "带孩子", "小孩", "儿童"],
-            "休闲": ["休闲", "放松", "度假"],
-            "冒险": ["冒险", "刺激", "极限"],
-            "摄影": ["拍照", "摄影", "打卡"]
-        }
-        
-        for preference, keywords in preference_keywords.items():
-            if any(keyword in text for keyword in keywords):
-                result["preferences"].append(preference)
-        
-        return result
+        return intent_parser.parse_travel(text)
+
+
+class StreamingRecognitionSession:
+    """
+    一次科大讯飞 IAT 会话
+    
+    连接建立后立即发送参数帧；音频可以一帧帧地随到随发（send_audio），
+    接收任务把中间结果与最终结果放入队列，供调用方通过 updates() 实时读取。
+    """
+    
+    def __init__(self, service: "VoiceRecognitionService", language: str):
+        self.service = service
+        self.language = language
+        self.assembler = TranscriptAssembler()
+        self.receiver: Optional["asyncio.Future"] = None
+        self._ws: Any = None
+        self._buffer = bytearray()
+        self._finished = False
+        self._updates: "asyncio.Queue" = asyncio.Queue()
+        self._started = 0.0
+    
+    async def __aenter__(self) -> "StreamingRecognitionSession":
+        # 先占用会话名额，超出讯飞并发配额的请求在这里排队或被拒绝
+        await self.service.limiter.acquire()
+        self._started = time.monotonic()
+        try:
+            await self._connect()
+        except BaseException:
+            self.service.limiter.release(time.monotonic() - self._started)
+            raise
+        return self
+    
+    async def _connect(self):
+        self._ws = await websockets.connect(
+            self.service.create_url(),
+            open_timeout=settings.XFYUN_CONNECT_TIMEOUT,
+            close_timeout=1
+        )
+        
+        # 第一帧不发送音频数据，只发送配置
+        # 鉴权失败或并发超限时服务端会在握手后直接返回错误码并断开，发送失败时由接收任务读出错误信息
+        try:
+            await self._ws.send(json.dumps({
+                "common": {"app_id": self.service.app_id},
+                "business": {
+                    "domain": "iat",
+                    "language": self.language,
+                    "accent": "mandarin",  # 普通话
+                    "vad_eos": 2000,  # 静音检测时长 2秒
+                    "dwa": "wpgs"  # 动态修正
+                },
+                "data": {
+                    "status": 0,
+                    "format": "audio/L16;rate=16000",
+                    "encoding": "raw",
+                    "audio": ""
+                }
+            }))
+        except websockets.ConnectionClosed:
+            pass
+        
+        self.receiver = asyncio.ensure_future(self._receive())
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if self.receiver is not None:
+                if not self.receiver.done():
+                    self.receiver.cancel()
+                elif not self.receiver.cancelled():
+                    # 取走异常，避免 "exception was never retrieved" 警告
+                    self.receiver.exception()
+            await self._ws.close()
+        finally:
+            self.service.limiter.release(time.monotonic() - self._started)
+    
+    async def send_frame(self, chunk: bytes, last: bool = False):
+        """发送一帧音频（status 1 或最后一帧 status 2）"""
+        if self._finished:
+            return
+        self._finished = last
+        await self._ws.send(json.dumps({
+            "data": {
+                "status": 2 if last else 1,
+                "format": "audio/L16;rate=16000",
+                "encoding": "raw",
+                "audio": base64.b64encode(chunk).decode('utf-8')
+            }
+        }))
+    
+    async def send_audio(self, pcm_data: bytes):
+        """追加任意长度的 PCM 数据，凑满一帧就立即发送"""
+        self._buffer.extend(pcm_data)
+        frame_bytes = settings.XFYUN_FRAME_BYTES
+        while len(self._buffer) >= frame_bytes:
+            chunk = bytes(self._buffer[:frame_bytes])
+            del self._buffer[:frame_bytes]
+            await self.send_frame(chunk)
+    
+    async def finish(self):
+        """发送剩余音频并标记结束"""
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        await self.send_frame(chunk, last=True)
+    
+    async def _receive(self):
+        """接收识别结果，直到服务端返回 status=2"""
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(self._ws.recv(), timeout=settings.XFYUN_RECV_TIMEOUT)
+                except asyncio.TimeoutError:
+                    # 实时音频流中用户停顿时没有结果是正常的；音频发完后仍无结果，
+                    # 或会话已超过音频最长时长仍未发完，才算超时
+                    if self._finished or time.monotonic() - self._started > settings.VOICE_MAX_DURATION:
+                        raise
+                    continue
+                
+                data = json.loads(message)
+                code = data.get("code", -1)
+                if code != 0:
+                    raise Exception(f"识别错误: code={code}, message={data.get('message', '未知错误')}")
+                
+                data_content = data.get("data", {})
+                result = data_content.get("result")
+                if result:
+                    self._updates.put_nowait(("partial", self.assembler.feed(result)))
+                
+                if data_content.get("status") == 2:
+                    self._updates.put_nowait(("final", self.assembler.text))
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._updates.put_nowait(("error", str(e) or "语音识别超时"))
+            raise
+    
+    async def updates(self) -> AsyncIterator[Tuple[str, str]]:
+        """依次产出 ("partial", 文本)、("final", 文本) 或 ("error", 信息)"""
+        while True:
+            kind, text = await self._updates.get()
+            yield kind, text
+            if kind != "partial":
+                return
+    
+    async def wait_final(self) -> str:
+        """等待最终结果；识别出错时抛出异常"""
+        await self.receiver
+        return self.assembler.text
+
+
+class CompressedStreamDecoder:
+    """
+    实时解码客户端陆续发来的 WebM/OGG（Opus）音频块
+    
+    PyAV 解码是同步阻塞的，放在线程中运行：feed() 送入压缩数据块，close() 表示输入结束，
+    解码出的 16kHz PCM 通过 pcm() 异步读取。会话结束时必须调用 aclose() 让解码线程退出。
+    
+    解码线程在整个会话期间一直占用，因此使用独立的线程池，线程数等于讯飞会话上限
+    （解码器只在取得会话名额后创建），不会占满 read_pcm、VAD 等共用的默认线程池。
+    """
+    
+    _executor = ThreadPoolExecutor(
+        max_workers=max(settings.XFYUN_MAX_SESSIONS, 1), thread_name_prefix="stream-decode"
+    )
+    
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._input: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self._output: "asyncio.Queue" = asyncio.Queue()
+        self._closed = False
+        self._worker = self._loop.run_in_executor(self._executor, self._decode)
+    
+    def _chunks(self) -> Iterable[bytes]:
+        while True:
+            chunk = self._input.get()
+            if chunk is None:
+                return
+            yield chunk
+    
+    def _decode(self):
+        try:
+            for pcm in decode_compressed_chunks(self._chunks()):
+                self._loop.call_soon_threadsafe(self._output.put_nowait, pcm)
+        finally:
+            self._loop.call_soon_threadsafe(self._output.put_nowait, None)
+    
+    def feed(self, data: bytes):
+        if not self._closed:
+            self._input.put(data)
+    
+    def close(self):
+        """输入结束，解码线程处理完剩余数据后退出"""
+        if not self._closed:
+            self._closed = True
+            self._input.put(None)
+    
+    async def pcm(self) -> AsyncIterator[bytes]:
+        """依次产出解码后的 PCM；解码失败时抛出 AudioFormatError"""
+        while True:
+            chunk = await self._output.get()
+            if chunk is None:
+                await self._worker
+                return
+            yield chunk
+    
+    async def aclose(self):
+        self.close()
+        try:
+            await self._worker
+        except Exception:
+            pass
 
 
 # 创建服务实例
@@ -1,23 +1,37 @@
-from fastapi import FastAPI, Request, status
+from fastapi import Depends, FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
+from starlette.datastructures import FormData
 from app.core.config import settings
+from app.core.middleware import UploadSizeLimitMiddleware
+from app.core.responses import DefaultJSONResponse
+from app.core.logging_config import setup_logging, truncate_payload
+from app.core.security import configure_password_hashing, password_hasher, token_cache
+from app.api.deps import require_metrics_token
 from app.api.routes import auth, travel_plans, expenses, voice
+from app.services.llm_usage_service import llm_usage_tracker
+from app.services.llm_provider_service import llm_provider_pool
+from app.services.voice_recognition_service import voice_recognition_service
+from app.services.login_throttle_service import login_throttle
+from app.services.user_index_service import user_index
+from app.services.avatar_service import avatar_service, ImmutableStaticFiles, LocalAvatarStorage
+import asyncio
 import logging
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# 配置日志（队列 + 后台线程输出）
+setup_logging()
+# 按配置设置 bcrypt 轮数
+configure_password_hashing()
 
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
-    description="AI旅行规划师后端API"
+    description="AI旅行规划师后端API",
+    # 安装了 orjson 时用它序列化响应
+    default_response_class=DefaultJSONResponse
 )
 
 # 添加请求验证异常处理器
@@ -25,9 +39,11 @@ app = FastAPI(
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """处理请求验证错误，返回详细的错误信息"""
     errors = exc.errors()
-    logger.error(f"请求验证失败: {request.url}")
-    logger.error(f"错误详情: {errors}")
-    logger.error(f"请求体: {await request.body()}")
+    logger.warning(f"请求验证失败: {request.method} {request.url.path}", extra={"errors": errors})
+    # 请求体已被路由读取，这里用 FastAPI 解析后的 exc.body，且仅在开启 LOG_PAYLOADS 时记录；
+    # 上传文件（multipart 表单）不记录内容
+    if settings.LOG_PAYLOADS and exc.body is not None and not isinstance(exc.body, FormData):
+        logger.warning(f"请求体: {truncate_payload(exc.body)}")
     
     return JSONResponse(
         status_code=status.HTTP_400_BAD_REQUEST,
@@ -38,6 +54,19 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         }
     )
 
+# 上传大小限制，multipart 请求体额外预留 64KB 给表单字段和边界；按顺序匹配，
+# 批量语音记账可上传多段音频，必须排在 /api/voice/ 之前
+# 先于 CORS 注册，使 413 响应也带上 CORS 头
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits=(
+        ("/api/voice/recognize-expense-batch",
+         settings.VOICE_BATCH_MAX_CLIPS * settings.VOICE_MAX_UPLOAD_BYTES + 64 * 1024),
+        ("/api/voice/", settings.VOICE_MAX_UPLOAD_BYTES + 64 * 1024),
+        ("/api/auth/avatar", settings.AVATAR_MAX_BYTES + 64 * 1024),
+    ),
+)
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -53,6 +82,15 @@ app.include_router(travel_plans.router, prefix="/api/travel-plans", tags=["行
 app.include_router(expenses.router, prefix="/api/expenses", tags=["费用管理"])
 app.include_router(voice.router, prefix="/api/voice", tags=["语音识别"])
 
+# 本地存储的头像按内容哈希命名，以永久缓存的静态文件提供
+if isinstance(avatar_service.storage, LocalAvatarStorage):
+    app.mount("/media/avatars", ImmutableStaticFiles(directory=avatar_service.storage.directory), name="avatars")
+
+@app.on_event("startup")
+async def build_user_index():
+    """后台重建用户名/邮箱索引，不阻塞启动"""
+    asyncio.ensure_future(user_index.rebuild())
+
 @app.get("/")
 async def root():
     return {"message": "AI旅行规划师API服务正在运行"}
@@ -61,6 +99,20 @@ async def root():
 async def health_check():
     return {"status": "healthy", "version": settings.VERSION}
 
+@app.get("/metrics", dependencies=[Depends(require_metrics_token)], include_in_schema=False)
+async def metrics():
+    """运行指标：大模型用量、语音识别会话、密码哈希线程池等；需要 METRICS_TOKEN"""
+    return {
+        "llm": llm_usage_tracker.snapshot(),
+        "llm_providers": llm_provider_pool.snapshot(),
+        "asr": voice_recognition_service.limiter.snapshot(),
+        "asr_cache": voice_recognition_service.cache.snapshot(),
+        "password_hash": password_hasher.snapshot(),
+        "auth_tokens": token_cache.snapshot(),
+        "login_throttle": login_throttle.snapshot(),
+        "user_index": user_index.snapshot()
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+行程数据修复（一次性）
+行程读取接口直接返回数据库行、不再按 TravelPlanResponse 校验，只有写入时才经过校验。
+本脚本遍历所有行程，把写入校验上线之前保存的、不符合 TravelPlanResponse 的行程
+按 itinerary_validator 修复后写回（缺失的 day/date 按行程起始日期补全，费用重新汇总）
+
+用法:
+    python scripts/backfill_itineraries.py --dry-run
+    python scripts/backfill_itineraries.py --batch-size 200
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from pydantic import ValidationError
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.schemas.travel_plan import TravelPlanResponse  # noqa: E402
+from app.services.database_service import db  # noqa: E402
+from app.services.itinerary_validator import repair_itinerary  # noqa: E402
+
+
+def repair_plan(plan: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    校验一条行程记录
+
+    Returns:
+        符合 TravelPlanResponse 时返回 None，否则返回需要写回的 {"itinerary", "total_cost"}
+    """
+    try:
+        TravelPlanResponse.model_validate(plan)
+        return None
+    except ValidationError:
+        pass
+
+    itinerary = plan.get("itinerary") if isinstance(plan.get("itinerary"), list) else []
+    days, _ = repair_itinerary(itinerary, plan.get("destination") or "")
+
+    start = datetime.fromisoformat(str(plan["start_date"]).replace("Z", "+00:00"))
+    for index, day in enumerate(days):
+        if not isinstance(day.get("day"), int) or day["day"] < 1:
+            day["day"] = index + 1
+        if not isinstance(day.get("date"), str):
+            day["date"] = (start + timedelta(days=day["day"] - 1)).date().isoformat()
+
+    return {"itinerary": days, "total_cost": sum(day["total_cost"] for day in days)}
+
+
+async def backfill(batch_size: int, dry_run: bool):
+    if not db.is_enabled():
+        print("数据库服务不可用，请检查 SUPABASE_URL / SUPABASE_KEY")
+        return
+
+    checked = repaired = skipped = 0
+    after_id = 0
+    while True:
+        plans = await db.get_travel_plans_page(after_id, batch_size)
+        if not plans:
+            break
+
+        for plan in plans:
+            after_id = plan["id"]
+            checked += 1
+            update = repair_plan(plan)
+            if update is None:
+                continue
+
+            try:
+                TravelPlanResponse.model_validate({**plan, **update})
+            except ValidationError as e:
+                skipped += 1
+                print(f"行程 {plan['id']} 无法自动修复: {e.errors()[0]['msg']}")
+                continue
+
+            if dry_run:
+                repaired += 1
+                print(f"行程 {plan['id']} 需要修复")
+                continue
+            # 按版本号写入，期间被用户修改过的行程已经过写入校验，跳过即可
+            written = await db.update_travel_plan(plan["id"], plan["user_id"], update, expected_version=plan.get("version"))
+            if written is None:
+                print(f"行程 {plan['id']} 已被修改，跳过")
+                continue
+            repaired += 1
+            print(f"行程 {plan['id']} 已修复")
+
+    print(f"检查 {checked} 个行程，修复 {repaired} 个，无法修复 {skipped} 个")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="校验并修复写入校验上线前保存的行程")
+    parser.add_argument("--batch-size", type=int, default=200, help="每批处理的行程数")
+    parser.add_argument("--dry-run", action="store_true", help="只检查，不修改数据库")
+    args = parser.parse_args()
+
+    asyncio.run(backfill(args.batch_size, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+意图解析微基准
+测量旅行/费用意图单条解析与批量解析的每条耗时
+
+用法:
+    python scripts/benchmark_intent.py
+    python scripts/benchmark_intent.py --count 50000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.intent_parser import intent_parser  # noqa: E402
+
+TRAVEL_SAMPLES = [
+    "我想去北京玩5天，预算10000元，2个人，喜欢美食和历史文化",
+    "下个月带孩子到杭州旅游3天，想去海边拍照",
+    "成都旅行4天，3人，预算2万，主要吃小吃逛街",
+    "周末去西安看看古迹",
+    "想找个地方放松度假一周",
+]
+
+EXPENSE_SAMPLES = [
+    "午餐花了85元",
+    "昨天打车花了32块",
+    "在宽窄巷子吃饭消费了260元",
+    "买纪念品120块钱",
+    "酒店房费支付了680",
+    "门票两张共150元",
+]
+
+
+def measure(label: str, fn, texts, batch: bool):
+    started = time.perf_counter()
+    if batch:
+        fn(texts)
+    else:
+        for text in texts:
+            fn(text)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<20}{len(texts):>8} 条{elapsed * 1000:>10.1f}ms{elapsed / len(texts) * 1e6:>10.2f}μs/条")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="意图解析微基准")
+    parser.add_argument("--count", type=int, default=20000, help="每项测试的文本条数")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    travel = [rng.choice(TRAVEL_SAMPLES) for _ in range(args.count)]
+    expense = [rng.choice(EXPENSE_SAMPLES) for _ in range(args.count)]
+
+    # 预热
+    intent_parser.parse_batch(travel[:100], "travel")
+    intent_parser.parse_batch(expense[:100], "expense")
+
+    measure("旅行意图（逐条）", intent_parser.parse_travel, travel, batch=False)
+    measure("旅行意图（批量）", lambda t: intent_parser.parse_batch(t, "travel"), travel, batch=True)
+    measure("费用意图（逐条）", intent_parser.parse_expense, expense, batch=False)
+    measure("费用意图（批量）", lambda t: intent_parser.parse_batch(t, "expense"), expense, batch=True)
+
+
+if __name__ == "__main__":
+    main()
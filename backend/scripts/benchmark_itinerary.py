@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+行程列表序列化微基准
+对比 response_model 校验 + 标准库 json、校验 + orjson、直接 orjson 序列化数据库行三种方式的耗时
+
+用法:
+    python scripts/benchmark_itinerary.py
+    python scripts/benchmark_itinerary.py --plans 50 --days 7 --activities 6 --rounds 50
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.responses import ORJSON_AVAILABLE  # noqa: E402
+from app.schemas.travel_plan import TravelPlanListResponse  # noqa: E402
+
+if ORJSON_AVAILABLE:
+    import orjson
+
+ACTIVITY_TYPES = ["attraction", "restaurant", "hotel", "transport", "shopping", "entertainment"]
+
+
+def make_plan(rng: random.Random, plan_id: int, days: int, activities: int) -> dict:
+    """构造一条与 Supabase 返回格式相同的行程记录"""
+    itinerary = []
+    for day in range(1, days + 1):
+        items = [
+            {
+                "type": rng.choice(ACTIVITY_TYPES),
+                "name": f"活动{day}-{index}",
+                "description": "参观当地著名景点，体验风土人情，品尝特色美食" * 2,
+                "location": f"某市某区某路{rng.randint(1, 999)}号",
+                "start_time": f"{8 + index:02d}:00",
+                "end_time": f"{9 + index:02d}:30",
+                "cost": round(rng.uniform(0, 500), 2),
+                "rating": round(rng.uniform(3, 5), 1),
+                "image_url": None,
+            }
+            for index in range(activities)
+        ]
+        itinerary.append({
+            "day": day,
+            "date": f"2025-05-{day:02d}",
+            "activities": items,
+            "total_cost": round(sum(item["cost"] for item in items), 2),
+        })
+
+    return {
+        "id": plan_id,
+        "user_id": 1,
+        "title": "北京之旅",
+        "destination": "北京",
+        "start_date": "2025-05-01T00:00:00",
+        "end_date": f"2025-05-{days:02d}T00:00:00",
+        "budget": 10000.0,
+        "people_count": 2,
+        "preferences": ["美食", "历史文化"],
+        "itinerary": itinerary,
+        "total_cost": round(sum(day["total_cost"] for day in itinerary), 2),
+        "status": "draft",
+        "created_at": "2025-04-20T08:00:00.123456+00:00",
+        "updated_at": "2025-04-20T08:00:00.123456+00:00",
+    }
+
+
+def validated_json(payload: dict) -> bytes:
+    """原方式：按 response_model 校验后转为 JSON 兼容对象，再用标准库 json 编码"""
+    content = TravelPlanListResponse.model_validate(payload).model_dump(mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def validated_orjson(payload: dict) -> bytes:
+    """按 response_model 校验后用 orjson 编码"""
+    return orjson.dumps(TravelPlanListResponse.model_validate(payload).model_dump(mode="json"))
+
+
+def raw_orjson(payload: dict) -> bytes:
+    """新方式：数据库行直接用 orjson 编码"""
+    return orjson.dumps(payload)
+
+
+def measure(label: str, fn, payload: dict, rounds: int, baseline: float = None) -> float:
+    fn(payload)  # 预热
+    started = time.perf_counter()
+    for _ in range(rounds):
+        size = len(fn(payload))
+    elapsed = (time.perf_counter() - started) / rounds
+    speedup = f"{baseline / elapsed:>8.1f}x" if baseline else f"{'':>9}"
+    print(f"{label:<22}{elapsed * 1000:>10.2f}ms/次{speedup}{size / 1024:>10.1f}KB")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="行程列表序列化微基准")
+    parser.add_argument("--plans", type=int, default=20, help="列表中的行程数")
+    parser.add_argument("--days", type=int, default=5, help="每个行程的天数")
+    parser.add_argument("--activities", type=int, default=5, help="每天的活动数")
+    parser.add_argument("--rounds", type=int, default=100, help="每种方式重复次数")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    payload = {
+        "code": 200,
+        "message": "获取成功",
+        "data": [make_plan(rng, plan_id, args.days, args.activities) for plan_id in range(1, args.plans + 1)],
+    }
+    activities = args.plans * args.days * args.activities
+    print(f"{args.plans} 个行程，共 {activities} 个活动，每种方式 {args.rounds} 次\n")
+
+    baseline = measure("校验 + json", validated_json, payload, args.rounds)
+    if not ORJSON_AVAILABLE:
+        print("\norjson 未安装，跳过 orjson 对比（pip install orjson）")
+        return
+    measure("校验 + orjson", validated_orjson, payload, args.rounds, baseline)
+    measure("直通 orjson", raw_orjson, payload, args.rounds, baseline)
+
+
+if __name__ == "__main__":
+    main()
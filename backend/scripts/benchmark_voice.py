@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+语音识别接口并发基准
+向运行中的后端并发上传合成音频，统计成功率、429 次数和延迟分位数
+
+用法（先启动讯飞替身和后端）:
+    python scripts/mock_xfyun_server.py --port 9100 --frame-latency 0.002
+    XFYUN_BASE_URL=ws://127.0.0.1:9100/v2/iat XFYUN_APP_ID=mock XFYUN_API_KEY=mock XFYUN_API_SECRET=mock \\
+        uvicorn main:app --port 8000
+    python scripts/benchmark_voice.py --requests 200 --concurrency 50
+    python scripts/benchmark_voice.py --endpoint recognize-expense --format webm --seconds 5
+"""
+
+import argparse
+import asyncio
+import io
+import math
+import os
+import time
+import wave
+from collections import Counter
+
+import httpx
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def synth_audio(seconds: float, audio_format: str) -> tuple:
+    """生成带首尾静音的类语音信号，返回 (文件名, 内容, MIME 类型)"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voiced = sum(np.sin(2 * np.pi * 160 * k * t) / k for k in range(1, 5))
+    signal = 0.3 * voiced * np.clip(np.sin(2 * np.pi * 4 * t), 0.1, 1.0)
+    silence = 0.002 * rng.standard_normal(SAMPLE_RATE)
+    signal = np.clip(np.concatenate([silence, signal, silence]), -1, 1)
+    pcm = (signal * 32767).astype("<i2")
+
+    if audio_format == "webm":
+        import av
+
+        buffer = io.BytesIO()
+        container = av.open(buffer, "w", format="webm")
+        stream = container.add_stream("libopus", rate=48000)
+        resampled = np.repeat(signal.astype(np.float32), 3)
+        for i in range(0, len(resampled), 960):
+            frame = av.AudioFrame.from_ndarray(resampled[i:i + 960][None, :], format="flt", layout="mono")
+            frame.sample_rate = 48000
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+        container.close()
+        return "recording.webm", buffer.getvalue(), "audio/webm"
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(pcm.tobytes())
+    return "recording.wav", buffer.getvalue(), "audio/wav"
+
+
+def percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(len(ordered) * q) - 1))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="语音识别接口并发基准")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", default="recognize", choices=["recognize", "recognize-expense"])
+    parser.add_argument("--requests", type=int, default=100, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发数")
+    parser.add_argument("--seconds", type=float, default=3.0, help="每段音频的语音时长")
+    parser.add_argument("--format", default="wav", choices=["wav", "webm"])
+    parser.add_argument("--metrics-token", default=os.getenv("METRICS_TOKEN", ""), help="/metrics 访问令牌")
+    args = parser.parse_args()
+
+    filename, content, content_type = synth_audio(args.seconds, args.format)
+    print(f"音频: {filename} {len(content)} bytes，{args.requests} 个请求，并发 {args.concurrency}")
+
+    latencies = []
+    statuses: Counter = Counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    url = f"{args.base_url}/api/voice/{args.endpoint}"
+
+    async with httpx.AsyncClient(timeout=120) as client:
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(url, files={"audio": (filename, content, content_type)})
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                    return
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+        try:
+            response = await client.get(
+                f"{args.base_url}/metrics", headers={"Authorization": f"Bearer {args.metrics_token}"}
+            )
+            asr_metrics = response.json().get("asr") if response.status_code == 200 else None
+        except (httpx.HTTPError, ValueError):
+            asr_metrics = None
+
+    print(f"总耗时 {elapsed:.2f}s，吞吐 {args.requests / elapsed:.1f} req/s")
+    print(f"状态码: {dict(statuses)}")
+    if latencies:
+        print(
+            f"成功请求延迟: p50={percentile(latencies, 0.5) * 1000:.0f}ms "
+            f"p95={percentile(latencies, 0.95) * 1000:.0f}ms p99={percentile(latencies, 0.99) * 1000:.0f}ms"
+        )
+    if asr_metrics:
+        print(f"识别会话指标: {asr_metrics}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
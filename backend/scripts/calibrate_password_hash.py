@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+bcrypt 轮数校准
+在部署机器上测量各轮数验证一次密码的耗时，并给出达到目标耗时的 PASSWORD_HASH_ROUNDS；
+结果写入部署配置，服务启动时不再校准
+
+用法:
+    python scripts/calibrate_password_hash.py                 # 目标 250ms
+    python scripts/calibrate_password_hash.py --target-ms 100
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.security import (  # noqa: E402
+    BCRYPT_DEFAULT_ROUNDS,
+    BCRYPT_MAX_ROUNDS,
+    BCRYPT_MIN_ROUNDS,
+    calibrate_bcrypt_rounds,
+    measure_bcrypt_ms,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bcrypt 轮数校准")
+    parser.add_argument("--target-ms", type=float, default=250, help="验证一次密码的目标耗时（毫秒）")
+    parser.add_argument("--max-ms", type=float, default=2000, help="逐轮测量时超过该耗时即停止")
+    args = parser.parse_args()
+
+    print(f"{'轮数':>6}{'验证耗时(ms)':>14}")
+    for rounds in range(BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS + 1):
+        elapsed_ms = measure_bcrypt_ms(rounds, samples=1)
+        print(f"{rounds:>6}{elapsed_ms:>14.0f}")
+        if elapsed_ms > args.max_ms:
+            break
+
+    rounds, measured_ms = calibrate_bcrypt_rounds(args.target_ms)
+    print(f"\n目标 {args.target_ms:.0f}ms，建议 PASSWORD_HASH_ROUNDS={rounds}（实测 {measured_ms:.0f}ms）")
+    if rounds == BCRYPT_DEFAULT_ROUNDS:
+        print(f"（不低于默认的 {BCRYPT_DEFAULT_ROUNDS} 轮）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+头像迁移（一次性）
+把 users.avatar 中仍以 base64 data URL 保存的旧头像转存到头像存储（AVATAR_STORAGE），
+数据库改为保存图片 URL，之后查询用户资料不再携带整张图片
+
+用法:
+    python scripts/migrate_avatars.py --dry-run
+    python scripts/migrate_avatars.py --batch-size 100
+    python scripts/migrate_avatars.py --clear-invalid      # 无法识别的旧头像直接清空
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.avatar_service import AvatarError, avatar_service, decode_data_url, render_avatar  # noqa: E402
+from app.services.database_service import db  # noqa: E402
+
+
+async def migrate(batch_size: int, dry_run: bool, clear_invalid: bool):
+    if not db.is_enabled():
+        print("数据库服务不可用，请检查 SUPABASE_URL / SUPABASE_KEY")
+        return
+
+    migrated = invalid = 0
+    after_id = 0
+    while True:
+        users = await db.get_users_with_inline_avatar(after_id, batch_size)
+        if not users:
+            break
+
+        for user in users:
+            after_id = user["id"]
+            try:
+                data = decode_data_url(user["avatar"])
+                if dry_run:
+                    await asyncio.get_running_loop().run_in_executor(None, render_avatar, data)
+                else:
+                    url, _ = await avatar_service.store(data)
+            except AvatarError as e:
+                invalid += 1
+                print(f"用户 {user['id']} 的头像无法识别（{e}）{'，已清空' if clear_invalid and not dry_run else ''}")
+                if clear_invalid and not dry_run:
+                    await db.update_user(user["id"], {"avatar": None})
+                continue
+
+            migrated += 1
+            if not dry_run:
+                await db.update_user(user["id"], {"avatar": url})
+
+    action = "可迁移" if dry_run else "已迁移"
+    print(f"{action} {migrated} 个头像，无法识别 {invalid} 个")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把 base64 旧头像转存为图片文件")
+    parser.add_argument("--batch-size", type=int, default=100, help="每批处理的用户数")
+    parser.add_argument("--dry-run", action="store_true", help="只检查和统计，不保存图片也不修改数据库")
+    parser.add_argument("--clear-invalid", action="store_true", help="清空无法识别的旧头像")
+    args = parser.parse_args()
+
+    asyncio.run(migrate(args.batch_size, args.dry_run, args.clear_invalid))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+本地 OpenAI 兼容模型服务替身
+用于在没有真实 API KEY 的情况下测试多服务路由、故障转移和对冲请求
+
+用法:
+    python scripts/mock_llm_server.py --port 9001 --delay 0.5
+    python scripts/mock_llm_server.py --port 9002 --delay 5 --fail-rate 0.3
+
+然后配置:
+    LLM_PROVIDERS='[{"name": "fast", "base_url": "http://127.0.0.1:9001/v1", "model": "mock"},
+                    {"name": "slow", "base_url": "http://127.0.0.1:9002/v1", "model": "mock"}]'
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def build_itinerary(prompt: str) -> str:
+    """根据提示词中的天数和开始日期生成一个固定结构的行程"""
+    days_match = re.search(r"(\d+)天", prompt)
+    date_match = re.search(r"(\d{4}-\d{2}-\d{2})", prompt)
+    days = int(days_match.group(1)) if days_match else 1
+    start = datetime.strptime(date_match.group(1), "%Y-%m-%d") if date_match else datetime.now()
+
+    itinerary = []
+    for day in range(days):
+        activities = [
+            {"type": "attraction", "name": f"测试景点{day + 1}", "description": "替身服务生成", "location": "市中心",
+             "start_time": "09:00", "end_time": "12:00", "cost": 100, "rating": 4.5},
+            {"type": "restaurant", "name": f"测试餐厅{day + 1}", "description": "替身服务生成", "location": "美食街",
+             "start_time": "12:30", "end_time": "14:00", "cost": 80, "rating": 4.3},
+        ]
+        itinerary.append({
+            "day": day + 1,
+            "date": (start + timedelta(days=day)).strftime("%Y-%m-%d"),
+            "activities": activities,
+            "total_cost": 180,
+        })
+    return json.dumps({"itinerary": itinerary}, ensure_ascii=False)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    fail_rate = 0.0
+    chunk_delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        time.sleep(self.delay)
+        if random.random() < self.fail_rate:
+            self._send_json(500, {"error": {"message": "injected failure", "type": "server_error"}})
+            return
+
+        prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+        content = build_itinerary(prompt)
+        usage = {"prompt_tokens": len(prompt), "completion_tokens": len(content) // 2,
+                 "total_tokens": len(prompt) + len(content) // 2}
+        model = body.get("model", "mock")
+
+        if body.get("stream"):
+            self._send_stream(model, content, usage, body.get("stream_options") or {})
+        else:
+            self._send_json(200, {
+                "id": "mock-1", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            })
+
+    def _send_json(self, code: int, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model: str, content: str, usage: dict, stream_options: dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        def emit(chunk: dict):
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        base = {"id": "mock-1", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        for i in range(0, len(content), 32):
+            emit({**base, "choices": [{"index": 0, "delta": {"content": content[i:i + 32]}, "finish_reason": None}]})
+            time.sleep(self.chunk_delay)
+        emit({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if stream_options.get("include_usage"):
+            emit({**base, "choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI 兼容模型服务替身")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--delay", type=float, default=0.0, help="首字节前的延迟（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="流式输出每块之间的延迟（秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="返回 500 的概率")
+    args = parser.parse_args()
+
+    MockHandler.delay = args.delay
+    MockHandler.chunk_delay = args.chunk_delay
+    MockHandler.fail_rate = args.fail_rate
+
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    print(f"模型服务替身已启动: http://{args.host}:{args.port}/v1 (delay={args.delay}s, fail_rate={args.fail_rate})")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
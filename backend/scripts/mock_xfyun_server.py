@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+本地科大讯飞 IAT v2 语音听写服务替身
+实现鉴权参数校验、status 0/1/2 帧协议、ws/cw 结果结构和 wpgs 动态修正，
+用于在没有讯飞账号的情况下测试识别流程的延迟、并发和错误处理
+
+用法:
+    python scripts/mock_xfyun_server.py --port 9100
+    python scripts/mock_xfyun_server.py --port 9100 --frame-latency 0.005 --error-rate 0.1
+    python scripts/mock_xfyun_server.py --transcripts samples.txt --max-sessions 5
+
+然后配置:
+    XFYUN_BASE_URL=ws://127.0.0.1:9100/v2/iat
+    XFYUN_APP_ID=mock XFYUN_API_KEY=mock XFYUN_API_SECRET=mock
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import itertools
+import json
+import random
+import uuid
+from urllib.parse import parse_qs, urlparse
+
+import websockets
+
+DEFAULT_TRANSCRIPTS = [
+    "我想去北京玩三天，预算五千元",
+    "午餐花了85元",
+    "打车花了32块",
+    "带孩子去杭州旅游，喜欢自然风光",
+    "酒店房费支付了680元",
+]
+
+# 讯飞错误码
+ERROR_AUTH = 10313
+ERROR_PARAMS = 10106
+ERROR_ENGINE = 10800
+ERROR_LIMIT = 11202
+# 16kHz 16bit 单声道每秒字节数
+PCM_BYTES_PER_SECOND = 32000
+
+
+class MockIATServer:
+    """IAT 协议替身：按音频进度逐步吐出剧本文本，并按概率用 rpl 修正上一片段"""
+
+    def __init__(self, args):
+        self.args = args
+        self.transcripts = itertools.cycle(self._load_transcripts(args.transcripts))
+        self.active = 0
+        self.total = 0
+
+    @staticmethod
+    def _load_transcripts(path):
+        if not path:
+            return DEFAULT_TRANSCRIPTS
+        with open(path, encoding="utf-8") as f:
+            lines = [line.strip() for line in f if line.strip()]
+        return lines or DEFAULT_TRANSCRIPTS
+
+    def _check_auth(self, path: str) -> bool:
+        """校验 authorization/date/host；指定了 --api-secret 时同时校验签名"""
+        query = parse_qs(urlparse(path).query)
+        if not all(query.get(k) for k in ("authorization", "date", "host")):
+            return False
+        if not self.args.api_secret:
+            return True
+
+        try:
+            authorization = base64.b64decode(query["authorization"][0]).decode("utf-8")
+        except (ValueError, UnicodeDecodeError):
+            return False
+        signature_origin = (
+            f"host: {query['host'][0]}\n"
+            f"date: {query['date'][0]}\n"
+            f"GET /v2/iat HTTP/1.1"
+        )
+        expected = base64.b64encode(hmac.new(
+            self.args.api_secret.encode("utf-8"),
+            signature_origin.encode("utf-8"),
+            digestmod=hashlib.sha256
+        ).digest()).decode("utf-8")
+        return f'signature="{expected}"' in authorization
+
+    async def _send_error(self, ws, sid: str, code: int, message: str):
+        await ws.send(json.dumps({"code": code, "message": message, "sid": sid}))
+        await ws.close()
+
+    @staticmethod
+    def _result(sn: int, text: str, pgs: str, rg=None, last: bool = False) -> dict:
+        result = {
+            "sn": sn,
+            "ls": last,
+            "bg": 0,
+            "ed": 0,
+            "pgs": pgs,
+            "ws": [{"bg": 0, "cw": [{"sc": 0, "w": ch}]} for ch in text],
+        }
+        if rg:
+            result["rg"] = rg
+        return result
+
+    async def handle(self, ws):
+        path = ws.request.path
+        sid = f"iat{uuid.uuid4().hex[:16]}"
+
+        if not self._check_auth(path):
+            await self._send_error(ws, sid, ERROR_AUTH, "authorization failed")
+            return
+        if self.args.max_sessions and self.active >= self.args.max_sessions:
+            await self._send_error(ws, sid, ERROR_LIMIT, "licc limit")
+            return
+
+        self.active += 1
+        self.total += 1
+        try:
+            await self._session(ws, sid)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.active -= 1
+
+    async def _session(self, ws, sid: str):
+        args = self.args
+        first = json.loads(await ws.recv())
+        data = first.get("data", {})
+        if data.get("status") != 0 or not first.get("common", {}).get("app_id") or "business" not in first:
+            await self._send_error(ws, sid, ERROR_PARAMS, "invalid first frame")
+            return
+
+        transcript = next(self.transcripts)
+        fail_at = None
+        if random.random() < args.error_rate:
+            fail_at = random.randint(1, 20)
+
+        wpgs = first["business"].get("dwa") == "wpgs"
+        received_bytes = 0
+        emitted = 0
+        # 上一片段在剧本中的起始位置，rpl 修正时从这里重新输出
+        segment_start = 0
+        sn = 0
+        frame_index = 0
+        chars_per_second = args.chars_per_second
+
+        while True:
+            frame = json.loads(await ws.recv())
+            frame_data = frame.get("data", {})
+            status = frame_data.get("status")
+            if status not in (1, 2):
+                await self._send_error(ws, sid, ERROR_PARAMS, f"invalid status {status}")
+                return
+
+            frame_index += 1
+            received_bytes += len(base64.b64decode(frame_data.get("audio", "")))
+            if args.frame_latency:
+                await asyncio.sleep(args.frame_latency)
+
+            if fail_at is not None and frame_index >= fail_at:
+                if random.random() < 0.5:
+                    await self._send_error(ws, sid, ERROR_ENGINE, "engine error (injected)")
+                else:
+                    # 模拟网络中断：不发送任何结果直接断开
+                    await ws.close(code=1011)
+                return
+
+            if status == 2:
+                break
+
+            # 按已收到的音频时长吐出对应比例的剧本文本
+            target = min(len(transcript), int(received_bytes / PCM_BYTES_PER_SECOND * chars_per_second))
+            if wpgs and target - emitted >= args.chunk_chars:
+                sn += 1
+                if sn > 1 and random.random() < args.correction_rate:
+                    # 用 rpl 把上一片段替换为“上一片段 + 新文本”
+                    previous = sn - 1
+                    await ws.send(json.dumps({
+                        "code": 0, "message": "success", "sid": sid,
+                        "data": {"status": 1, "result": self._result(sn, transcript[segment_start:target], "rpl", [previous, previous])}
+                    }, ensure_ascii=False))
+                else:
+                    segment_start = emitted
+                    await ws.send(json.dumps({
+                        "code": 0, "message": "success", "sid": sid,
+                        "data": {"status": 1, "result": self._result(sn, transcript[emitted:target], "apd")}
+                    }, ensure_ascii=False))
+                emitted = target
+
+        if args.final_latency:
+            await asyncio.sleep(args.final_latency)
+
+        sn += 1
+        await ws.send(json.dumps({
+            "code": 0, "message": "success", "sid": sid,
+            "data": {"status": 2, "result": self._result(sn, transcript[emitted:], "apd", last=True)}
+        }, ensure_ascii=False))
+        await ws.close()
+
+
+async def serve(args):
+    server = MockIATServer(args)
+    async with websockets.serve(server.handle, args.host, args.port, max_size=None):
+        print(
+            f"讯飞 IAT 替身已启动: ws://{args.host}:{args.port}/v2/iat "
+            f"(frame_latency={args.frame_latency}s, final_latency={args.final_latency}s, "
+            f"error_rate={args.error_rate}, max_sessions={args.max_sessions or '不限'})"
+        )
+        await asyncio.Future()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="科大讯飞 IAT v2 服务替身")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--transcripts", help="剧本文件，每行一条识别结果，按顺序循环使用")
+    parser.add_argument("--frame-latency", type=float, default=0.0, help="处理每个音频帧的延迟（秒）")
+    parser.add_argument("--final-latency", type=float, default=0.1, help="收到最后一帧到返回最终结果的延迟（秒）")
+    parser.add_argument("--chars-per-second", type=float, default=4.0, help="每秒音频对应的文字数")
+    parser.add_argument("--chunk-chars", type=int, default=2, help="每条中间结果至少包含的新字数")
+    parser.add_argument("--correction-rate", type=float, default=0.3, help="中间结果使用 rpl 修正上一片段的概率")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="会话中途返回错误或断开的概率")
+    parser.add_argument("--max-sessions", type=int, default=0, help="并发会话上限，超出返回 11202（0 为不限）")
+    parser.add_argument("--api-secret", default="", help="指定后校验请求签名")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
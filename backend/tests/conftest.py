@@ -0,0 +1,81 @@
+"""
+测试公共配置
+不连接 Supabase、讯飞和大模型服务；需要数据库的用例用 monkeypatch 替换 db 的方法
+"""
+
+import os
+import tempfile
+
+# 在导入应用之前设置，避免读取本地 .env 中的云服务配置
+os.environ.setdefault("LOG_FORMAT", "text")
+os.environ.setdefault("AVATAR_STORAGE_DIR", tempfile.mkdtemp(prefix="avatars-"))
+os.environ["SUPABASE_URL"] = ""
+os.environ["SUPABASE_KEY"] = ""
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.security import create_access_token  # noqa: E402
+from app.services.database_service import db  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers():
+    return {"Authorization": f"Bearer {create_access_token(1)}"}
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """让 db.is_enabled() 返回 True；用例再按需替换具体的查询方法"""
+    monkeypatch.setattr(db, "is_enabled", lambda: True)
+    return db
+
+
+@pytest.fixture
+def plan():
+    """一条两天行程的数据库记录"""
+    itinerary = [
+        {
+            "day": day,
+            "date": f"2025-05-0{day}",
+            "activities": [
+                {
+                    "type": "attraction",
+                    "name": f"景点{day}-{index}",
+                    "description": "简介",
+                    "location": "北京",
+                    "start_time": f"{9 + index * 3:02d}:00",
+                    "end_time": f"{11 + index * 3:02d}:00",
+                    "cost": 100,
+                    "rating": 4.5,
+                }
+                for index in range(2)
+            ],
+            "total_cost": 200,
+        }
+        for day in (1, 2)
+    ]
+    return {
+        "id": 7,
+        "user_id": 1,
+        "title": "北京之旅",
+        "destination": "北京",
+        "start_date": "2025-05-01T00:00:00",
+        "end_date": "2025-05-02T00:00:00",
+        "budget": 1000,
+        "people_count": 2,
+        "preferences": [],
+        "itinerary": itinerary,
+        "total_cost": 400,
+        "status": "draft",
+        "created_at": "2025-04-20T08:00:00+00:00",
+        "updated_at": "2025-04-20T08:00:00+00:00",
+    }
@@ -0,0 +1,204 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+
+from app.services.audio_pipeline import (
+    TARGET_SAMPLE_RATE,
+    AudioFormatError,
+    StreamingResampler,
+    parse_raw_format,
+    parse_wav_header,
+    iter_chunks,
+    iter_pcm16k,
+    resample_pcm_chunks,
+    split_on_pauses,
+    trim_silence,
+)
+from app.services.voice_recognition_service import VoiceRecognitionService
+
+
+def _tone(seconds: float, rate: int = TARGET_SAMPLE_RATE, freq: float = 300) -> np.ndarray:
+    t = np.arange(int(seconds * rate)) / rate
+    return 0.5 * np.sin(2 * np.pi * freq * t)
+
+
+def _pcm(*parts: np.ndarray) -> bytes:
+    return (np.concatenate(parts) * 32767).astype("<i2").tobytes()
+
+
+def _silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * TARGET_SAMPLE_RATE))
+
+
+def test_odd_length_raw_pcm_is_trimmed():
+    pcm = _pcm(_tone(0.5)) + b"\x01"
+    collected = VoiceRecognitionService()._collect_pcm(iter_chunks(pcm, 333), "audio/L16;rate=16000")
+
+    assert collected == pcm[:-1]
+
+
+async def test_odd_length_wav_payload_is_trimmed():
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(TARGET_SAMPLE_RATE)
+        w.writeframes(_pcm(_tone(0.2)))
+    data = bytearray(buffer.getvalue())
+    data += b"\x07"
+    data[40:44] = (len(data) - 44).to_bytes(4, "little")
+
+    pcm = await VoiceRecognitionService().prepare_pcm(bytes(data), "audio/wav")
+
+    assert len(pcm) % 2 == 0
+    assert len(pcm) == int(0.2 * TARGET_SAMPLE_RATE) * 2
+
+
+def test_vad_accepts_odd_length_pcm():
+    pcm = _pcm(_silence(1), _tone(1), _silence(1)) + b"\x00"
+
+    kept, stats = trim_silence(pcm)
+    segments = split_on_pauses(pcm)
+
+    assert stats["speech_detected"]
+    assert stats["removed_ms"] > 1000
+    assert len(kept) % 2 == 0
+    assert len(segments) == 1
+
+
+def test_trim_silence_keeps_padding_around_speech():
+    pcm = _pcm(_silence(1), _tone(1), _silence(1))
+
+    kept, stats = trim_silence(pcm, padding_ms=200)
+
+    assert stats["original_ms"] == 3000
+    assert 1300 <= stats["kept_ms"] <= 1500
+
+
+def test_split_on_pauses_splits_long_pauses_only():
+    pcm = _pcm(_tone(0.8), _silence(0.3), _tone(0.8), _silence(1.5), _tone(0.8))
+
+    segments = split_on_pauses(pcm, min_pause_ms=800)
+
+    assert len(segments) == 2
+    assert segments[0][0] == 0
+    assert segments[1][0] > 1900
+
+
+def test_resampler_streaming_matches_one_shot():
+    source = (_tone(1.0, rate=48000) * 32767).astype("<i2").tobytes()
+
+    one_shot = b"".join(resample_pcm_chunks([source], 48000))
+    chunked = b"".join(resample_pcm_chunks(iter_chunks(source, 1001), 48000))
+
+    assert one_shot == chunked
+    assert abs(len(one_shot) // 2 - TARGET_SAMPLE_RATE) <= 64
+
+
+def test_iter_pcm16k_downmixes_stereo():
+    mono = (_tone(0.5) * 32767).astype("<i2")
+    stereo = np.repeat(mono, 2).tobytes()
+
+    pcm = b"".join(iter_pcm16k(iter_chunks(stereo, 500), "audio/L16;rate=16000;channels=2"))
+
+    assert len(pcm) == len(mono) * 2
+
+
+def _wav(rate: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\x00\x00" * 100)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("rate", [1, 7999, 192001])
+def test_raw_rate_out_of_range_is_rejected(rate):
+    with pytest.raises(AudioFormatError):
+        parse_raw_format(f"audio/L16;rate={rate}")
+    with pytest.raises(AudioFormatError):
+        StreamingResampler(rate)
+
+
+def test_raw_rate_bounds_are_inclusive():
+    assert parse_raw_format("audio/L16;rate=8000;channels=2") == (8000, 2)
+    assert parse_raw_format("audio/L16;rate=192000") == (192000, 1)
+
+
+@pytest.mark.parametrize("rate", [1, 200000])
+def test_wav_rate_out_of_range_is_rejected(rate):
+    with pytest.raises(AudioFormatError):
+        parse_wav_header(_wav(rate))
+
+
+async def test_tiny_rate_upload_fails_before_resampling():
+    with pytest.raises(AudioFormatError):
+        await VoiceRecognitionService().prepare_pcm(b"\x00" * 400, "audio/L16;rate=1")
+
+
+def test_long_padding_keeps_speech_frames():
+    # padding 1400ms = 70 帧，窗口 141 帧，持续语音时窗口和超过 int8 上限；
+    # 前后静音都短于 padding，应整段保留
+    pcm = _pcm(_silence(1), _tone(4), _silence(1))
+
+    kept, stats = trim_silence(pcm, padding_ms=1400)
+
+    assert stats["speech_detected"]
+    assert stats["removed_ms"] == 0
+
+
+def _chunk(chunk_id: bytes, body: bytes) -> bytes:
+    # 奇数长度的块后补一个填充字节
+    return chunk_id + len(body).to_bytes(4, "little") + body + (b"\x00" if len(body) % 2 else b"")
+
+
+def _fmt(rate=TARGET_SAMPLE_RATE, channels=1, bits=16, tag=1) -> bytes:
+    block = channels * bits // 8
+    return (tag.to_bytes(2, "little") + channels.to_bytes(2, "little") + rate.to_bytes(4, "little")
+            + (rate * block).to_bytes(4, "little") + block.to_bytes(2, "little") + bits.to_bytes(2, "little"))
+
+
+def _riff(*chunks: bytes) -> bytes:
+    body = b"WAVE" + b"".join(chunks)
+    return b"RIFF" + len(body).to_bytes(4, "little") + body
+
+
+def test_riff_walker_skips_list_and_odd_sized_chunks():
+    pcm = b"\x01\x00\x02\x00"
+    data = _riff(_chunk(b"LIST", b"INFOabc"), _chunk(b"fmt ", _fmt()), _chunk(b"junk", b"x"), _chunk(b"data", pcm))
+
+    info, offset, size = parse_wav_header(data)
+
+    assert info.is_asr_ready
+    assert data[offset:offset + size] == pcm
+
+
+def test_riff_walker_waits_for_more_header():
+    data = _riff(_chunk(b"LIST", b"x" * 100), _chunk(b"fmt ", _fmt()), _chunk(b"data", b"\x00\x00"))
+
+    assert parse_wav_header(data[:60]) is None
+    assert parse_wav_header(data) is not None
+
+
+def test_streaming_data_length_means_until_end():
+    data = _riff(_chunk(b"fmt ", _fmt()), b"data" + (0xFFFFFFFF).to_bytes(4, "little") + b"\x00\x00" * 8)
+
+    info, offset, size = parse_wav_header(data)
+    assert size is None
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"RIFF\x00\x00\x00\x00AVI ", "有效"),
+    (_riff(_chunk(b"fmt ", _fmt()[:14]), _chunk(b"data", b"")), "fmt"),
+    (_riff(_chunk(b"data", b"\x00\x00")), "fmt"),
+    (_riff(_chunk(b"fmt ", _fmt(tag=0x55)), _chunk(b"data", b"\x00\x00")), "编码"),
+    (_riff(_chunk(b"fmt ", _fmt(bits=12)), _chunk(b"data", b"\x00\x00")), "参数"),
+    (_riff(_chunk(b"fmt ", _fmt(channels=0)), _chunk(b"data", b"\x00\x00")), "参数"),
+])
+def test_riff_walker_rejects_bad_headers(data, message):
+    with pytest.raises(AudioFormatError, match=message):
+        parse_wav_header(data)
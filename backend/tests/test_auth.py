@@ -0,0 +1,95 @@
+import time
+
+import pytest
+from jose import jwt
+
+from app.api.deps import UserProfileCache, user_profile_cache
+from app.core.config import settings
+from app.core.security import TokenCache, pwd_context
+
+
+@pytest.fixture
+def user():
+    return {
+        "id": 1,
+        "email": "a@example.com",
+        "username": "旅行者",
+        "phone": None,
+        "avatar": None,
+        "created_at": "2025-04-20T08:00:00+00:00",
+        "updated_at": "2025-04-20T08:00:00+00:00",
+        "hashed_password": pwd_context.hash("secret123", rounds=4),
+    }
+
+
+@pytest.fixture(autouse=True)
+def clean_caches():
+    user_profile_cache._entries.clear()
+    yield
+    user_profile_cache._entries.clear()
+
+
+def _login(client, fake_db, monkeypatch, user):
+    async def get_user_by_email(email, with_password=False):
+        return dict(user)
+
+    async def update_user(user_id, data):
+        user.update(data)
+        return dict(user)
+
+    monkeypatch.setattr(fake_db, "get_user_by_email", get_user_by_email)
+    monkeypatch.setattr(fake_db, "update_user", update_user)
+    response = client.post("/api/auth/login", json={"email": user["email"], "password": "secret123"})
+    assert response.status_code == 200
+    return response.json()["data"]["token"]
+
+
+def test_token_carries_only_user_id(client, fake_db, monkeypatch, user):
+    token = _login(client, fake_db, monkeypatch, user)
+
+    claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    assert set(claims) == {"sub", "exp"}
+
+
+def test_me_reflects_update_without_new_token(client, fake_db, monkeypatch, user):
+    token = _login(client, fake_db, monkeypatch, user)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.put("/api/auth/update", json={"username": "新名字"}, headers=headers)
+    assert response.status_code == 200
+
+    async def no_query(user_id):
+        raise AssertionError("资料应从缓存读取")
+
+    monkeypatch.setattr(fake_db, "get_user_by_id", no_query)
+    profile = client.get("/api/auth/me", headers=headers).json()["data"]
+    assert profile["username"] == "新名字"
+    assert "hashed_password" not in profile
+
+
+def test_token_cache_expires_with_token():
+    cache = TokenCache(max_entries=2)
+    now = time.time()
+    cache.put("a", {"sub": "1", "exp": now + 60})
+    cache.put("b", {"sub": "2", "exp": now - 1})
+
+    assert cache.get("a") == {"sub": "1", "exp": now + 60}
+    assert cache.get("b") is None
+
+    cache.put("c", {"sub": "3", "exp": now + 60})
+    cache.put("d", {"sub": "4", "exp": now + 60})
+    assert cache.get("a") is None
+    assert cache.get("d")["sub"] == "4"
+
+
+def test_profile_cache_ttl_and_invalidate(monkeypatch):
+    cache = UserProfileCache(ttl=10, max_entries=10)
+    cache.put(1, {"id": 1})
+    assert cache.get(1) == {"id": 1}
+
+    cache.invalidate(1)
+    assert cache.get(1) is None
+
+    cache.put(1, {"id": 1})
+    monkeypatch.setattr(time, "monotonic", lambda: 1e12)
+    assert cache.get(1) is None
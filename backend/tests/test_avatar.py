@@ -0,0 +1,61 @@
+import base64
+import importlib.util
+import io
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from app.services.avatar_service import AvatarError, avatar_service
+
+
+def _data_url(color=(200, 30, 30)) -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 30), color).save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+async def test_data_url_is_stored_and_its_url_accepted():
+    url = await avatar_service.normalize(_data_url())
+
+    assert url.startswith(settings.AVATAR_BASE_URL.rstrip("/") + "/")
+    assert await avatar_service.normalize(url) == url
+
+
+@pytest.mark.parametrize("url", [
+    "https://evil.example.com/a.jpg",
+    "/media/avatars/../../etc/passwd",
+    f"{settings.AVATAR_BASE_URL}/ab/../../secret.jpg",
+    f"{settings.AVATAR_BASE_URL}.evil.com/ab/{'a' * 64}/256.jpg",
+])
+async def test_foreign_urls_are_rejected(url):
+    with pytest.raises(AvatarError):
+        await avatar_service.normalize(url)
+
+
+async def test_backfill_rewrites_inline_avatars(fake_db, monkeypatch):
+    spec = importlib.util.spec_from_file_location(
+        "migrate_avatars", Path(__file__).resolve().parent.parent / "scripts" / "migrate_avatars.py"
+    )
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+
+    users = {1: _data_url(), 2: "data:image/png;base64,bm90IGFuIGltYWdl", 3: _data_url((0, 0, 255))}
+
+    async def get_users_with_inline_avatar(after_id, limit):
+        rows = [{"id": i, "avatar": a} for i, a in sorted(users.items()) if i > after_id and a.startswith("data:")]
+        return rows[:limit]
+
+    async def update_user(user_id, data):
+        users[user_id] = data["avatar"]
+        return {"id": user_id, **data}
+
+    monkeypatch.setattr(fake_db, "get_users_with_inline_avatar", get_users_with_inline_avatar)
+    monkeypatch.setattr(fake_db, "update_user", update_user)
+
+    await script.migrate(batch_size=2, dry_run=False, clear_invalid=True)
+
+    assert avatar_service.is_stored_url(users[1])
+    assert avatar_service.is_stored_url(users[3])
+    assert users[2] is None
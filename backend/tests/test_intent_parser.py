@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from app.services.intent_parser import IntentParser, KeywordMatcher
+
+parser = IntentParser()
+
+
+def test_matcher_finds_overlapping_keywords():
+    matcher = KeywordMatcher([("he", 1), ("she", 2), ("his", 3), ("hers", 4)])
+
+    assert matcher.find_all("ushers") == [("she", 2), ("he", 1), ("hers", 4)]
+
+
+def test_matcher_follows_failure_links():
+    matcher = KeywordMatcher([("博物馆", "文化"), ("物", "购物")])
+
+    assert matcher.find_all("去博物馆") == [("物", "购物"), ("博物馆", "文化")]
+    assert matcher.find_all("没有命中") == []
+
+
+def test_matcher_keeps_every_payload_of_a_keyword():
+    matcher = KeywordMatcher([("小吃", "food"), ("小吃", "美食")])
+
+    assert matcher.find_all("小吃街") == [("小吃", "food"), ("小吃", "美食")]
+
+
+def test_expense_amount_category_and_date():
+    result = parser.parse_expense("昨天打车花了35.5元")
+
+    assert result["amount"] == 35.5
+    assert result["category"] == "transport"
+    assert result["description"] == "打车"
+    expected = (datetime.now() - timedelta(days=1)).date()
+    assert datetime.fromisoformat(result["expense_date"]).date() == expected
+
+
+def test_expense_category_priority_ignores_position():
+    # “门票”排在前面，但交通类别优先级更高
+    result = parser.parse_expense("门票和地铁一共80块钱")
+
+    assert result["category"] == "transport"
+    assert result["amount"] == 80
+
+
+def test_expense_without_keywords_falls_back_to_other():
+    result = parser.parse_expense("花了20元")
+
+    assert result["category"] == "other"
+    assert result["amount"] == 20
+    assert result["description"]
+
+
+def test_travel_fields_and_preferences_in_declared_order():
+    result = parser.parse_travel("想去成都玩5天，预算5000元，2人，喜欢博物馆和美食")
+
+    assert result["destination"].startswith("成都")
+    assert result["days"] == 5
+    assert result["budget"] == 5000
+    assert result["people_count"] == 2
+    assert result["preferences"] == ["美食", "文化"]
+
+
+def test_parse_batch_uses_mode():
+    results = parser.parse_batch(["午饭花了50元", "晚餐30元"], mode="expense")
+
+    assert [r["amount"] for r in results] == [50, 30]
+
+
+def test_travel_budget_in_ten_thousands():
+    assert parser.parse_travel("去三亚带2万")["budget"] == 20000
@@ -0,0 +1,72 @@
+import copy
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+from app.schemas.travel_plan import TravelPlanResponse
+
+
+@pytest.fixture(scope="module")
+def script():
+    spec = importlib.util.spec_from_file_location(
+        "backfill_itineraries", Path(__file__).resolve().parent.parent / "scripts" / "backfill_itineraries.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def legacy_plan(plan):
+    """校验上线前由 AI 直接写入的行程：费用是带单位的字符串、缺少日期、类型不在枚举内"""
+    legacy = copy.deepcopy(plan)
+    day = legacy["itinerary"][1]
+    del day["date"]
+    day["activities"][0].update(cost="120元", type="Museum", start_time="9点")
+    day["activities"].append({"name": "", "start_time": "x"})
+    return legacy
+
+
+def test_valid_plan_is_left_alone(script, plan):
+    assert script.repair_plan(plan) is None
+
+
+def test_legacy_plan_is_repaired(script, legacy_plan):
+    update = script.repair_plan(legacy_plan)
+
+    day = update["itinerary"][1]
+    assert day["date"] == "2025-05-02"
+    assert day["activities"][0]["cost"] == 120
+    assert day["activities"][0]["start_time"] == "09:00"
+    assert len(day["activities"]) == 2
+    assert update["total_cost"] == 420
+    TravelPlanResponse.model_validate({**legacy_plan, **update})
+
+
+async def test_backfill_writes_with_version_check(script, fake_db, monkeypatch, plan, legacy_plan):
+    legacy_plan.update(id=8, version=3)
+    rows = [plan, legacy_plan]
+    writes = []
+
+    async def get_travel_plans_page(after_id, limit):
+        return [row for row in rows if row["id"] > after_id][:limit]
+
+    async def update_travel_plan(plan_id, user_id, update_data, expected_version=None):
+        writes.append((plan_id, expected_version))
+        return {"id": plan_id}
+
+    monkeypatch.setattr(fake_db, "get_travel_plans_page", get_travel_plans_page)
+    monkeypatch.setattr(fake_db, "update_travel_plan", update_travel_plan)
+
+    await script.backfill(batch_size=1, dry_run=False)
+
+    assert writes == [(8, 3)]
+
+
+def test_money_fields_are_documented_as_numbers(client):
+    schemas = client.get("/openapi.json").json()["components"]["schemas"]
+
+    assert schemas["TravelPlanResponse"]["properties"]["budget"]["type"] == "number"
+    assert schemas["TravelPlanResponse"]["properties"]["total_cost"]["type"] == "number"
+    assert schemas["ActivityResponse"]["properties"]["cost"]["type"] == "number"
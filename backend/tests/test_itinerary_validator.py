@@ -0,0 +1,103 @@
+import json
+import random
+
+from app.services.itinerary_validator import (
+    MAX_DESCRIPTION_LENGTH,
+    StreamingActivityValidator,
+    normalize_cost,
+    normalize_time,
+    repair_activity,
+    repair_itinerary,
+)
+
+
+def _activity(**overrides):
+    activity = {
+        "type": "attraction",
+        "name": "故宫",
+        "description": "明清皇宫",
+        "location": "东城区",
+        "start_time": "09:00",
+        "end_time": "12:00",
+        "cost": 60,
+        "rating": 4.8,
+    }
+    activity.update(overrides)
+    return activity
+
+
+def test_normalize_time_and_cost():
+    assert normalize_time("9:00") == "09:00"
+    assert normalize_time("9点30") == "09:30"
+    assert normalize_time("25:00") is None
+    assert normalize_cost("约80-120元") == 100
+    assert normalize_cost(None) == 0
+    assert normalize_cost(-1) is None
+
+
+def test_repair_activity_fixes_type_time_and_cost():
+    activity, fixes = repair_activity(_activity(type="美食", start_time="9点", cost="50元"))
+
+    assert activity["type"] == "restaurant"
+    assert activity["start_time"] == "09:00"
+    assert activity["cost"] == 50
+    assert len(fixes) == 3
+
+
+def test_repair_activity_rejects_unrecoverable():
+    assert repair_activity(_activity(name=""))[0] is None
+    assert repair_activity(_activity(start_time="上午"))[0] is None
+    assert repair_activity("故宫")[0] is None
+
+
+def test_repair_activity_truncates_long_text_fields():
+    activity, fixes = repair_activity(_activity(
+        name="名" * 300,
+        location="址" * 300,
+        description="长" * (MAX_DESCRIPTION_LENGTH + 500),
+    ))
+
+    assert activity is not None
+    assert len(activity["name"]) == 255
+    assert len(activity["location"]) == 255
+    assert len(activity["description"]) == MAX_DESCRIPTION_LENGTH
+    assert "截断 description" in fixes
+
+
+def test_streaming_validator_matches_full_repair():
+    itinerary = [
+        {
+            "day": day,
+            "date": f"2025-05-0{day}",
+            "activities": [
+                _activity(name=f"活动{day}", cost="30元"),
+                _activity(name="", description='含 "引号" 和 {括号}'),
+                _activity(name=f"餐厅{day}", type="food", start_time="12点"),
+            ],
+            "total_cost": 999,
+        }
+        for day in (1, 2, 3)
+    ]
+    text = json.dumps({"itinerary": itinerary}, ensure_ascii=False)
+
+    validator = StreamingActivityValidator("北京")
+    rng = random.Random(1)
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 7)
+        validator.feed(text[position:position + size])
+        position += size
+
+    expected, rejected = repair_itinerary(itinerary, "北京")
+    assert validator.text == text
+    assert validator.days == expected
+    assert validator.rejected == rejected == 3
+    assert len(validator.accepted) == 6
+
+
+def test_streaming_validator_aborts_on_mostly_invalid_output():
+    validator = StreamingActivityValidator()
+    bad = json.dumps({"itinerary": [{"day": 1, "activities": [_activity(name="")] * 5 + [_activity()]}]})
+    validator.feed(bad)
+
+    assert validator.should_abort()
@@ -0,0 +1,211 @@
+import json
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services.ai_travel_service import ai_travel_service
+from app.services.llm_provider_service import LLMProvider, LLMProviderPool, LLMRequestCancelled
+
+
+def _providers(count):
+    return [
+        LLMProvider(f"p{i}", "http://127.0.0.1:9/v1", "key", "model", order=i)
+        for i in range(count)
+    ]
+
+
+async def test_pool_tries_each_provider_once():
+    pool = LLMProviderPool(_providers(3))
+    calls = []
+
+    def fn(provider, cancelled):
+        calls.append(provider.name)
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await pool.run(fn)
+    assert calls == ["p0", "p1", "p2"]
+
+
+async def test_pool_fails_over_to_next_provider():
+    pool = LLMProviderPool(_providers(2))
+
+    def fn(provider, cancelled):
+        if provider.name == "p0":
+            raise RuntimeError("down")
+        return "ok"
+
+    assert await pool.run(fn) == "ok"
+    assert pool.providers[0].error_rate() == 1.0
+
+
+async def test_hedged_loser_is_cancelled_without_counting_as_failure(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_DEFAULT_DELAY", 0.05)
+    pool = LLMProviderPool(_providers(2), hedge_enabled=True)
+    loser_stopped = threading.Event()
+
+    def fn(provider, cancelled):
+        if provider.name == "p0":
+            # 模拟流式请求：每收到一块检查一次是否被取消
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                if cancelled.is_set():
+                    loser_stopped.set()
+                    raise LLMRequestCancelled()
+                time.sleep(0.01)
+            return "slow"
+        return "fast"
+
+    assert await pool.run(fn) == "fast"
+    assert loser_stopped.wait(1)
+    assert pool.providers[0].error_rate() == 0.0
+
+
+async def test_call_does_not_retry_around_the_pool(monkeypatch):
+    calls = []
+
+    class FailingPool:
+        async def run(self, fn):
+            calls.append(fn)
+            raise RuntimeError("timeout")
+
+    monkeypatch.setattr(ai_travel_service, "providers", FailingPool())
+
+    with pytest.raises(Exception, match="超时"):
+        await ai_travel_service._call_qianwen_api("prompt")
+    assert len(calls) == 1
+
+
+async def test_always_failing_provider_is_ranked_last():
+    pool = LLMProviderPool(_providers(2))
+    calls = []
+
+    def fn(provider, cancelled):
+        calls.append(provider.name)
+        if provider.name == "p0":
+            raise RuntimeError("down")
+        return "ok"
+
+    # 冷却前的两次失败也不能让 p0 继续排在健康的 p1 前面
+    for _ in range(2):
+        assert await pool.run(fn) == "ok"
+
+    assert calls == ["p0", "p1", "p1"]
+    assert pool.ranked()[-1].name == "p0"
+    assert not pool.providers[0].in_cooldown()
+
+
+def test_untried_provider_ranks_after_healthy_one():
+    healthy, untried = _providers(2)
+    untried.order = -1
+    healthy.record_success(0.5)
+
+    assert LLMProviderPool([untried, healthy]).ranked() == [healthy, untried]
+
+
+def _day(day):
+    return {
+        "day": day,
+        "date": f"2025-05-0{day}",
+        "activities": [{
+            "type": "attraction", "name": f"景点{day}", "description": "", "location": "成都",
+            "start_time": "09:00", "end_time": "12:00", "cost": 100, "rating": 4.5,
+        }],
+        "total_cost": 100,
+    }
+
+
+class _FakeStream:
+    def __init__(self, text, finish_reason):
+        self._chunks = [
+            SimpleNamespace(usage=None, choices=[SimpleNamespace(finish_reason=None, delta=SimpleNamespace(content=text[i:i + 40]))])
+            for i in range(0, len(text), 40)
+        ]
+        self._chunks.append(SimpleNamespace(usage=None, choices=[SimpleNamespace(finish_reason=finish_reason, delta=SimpleNamespace(content=None))]))
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_provider(monkeypatch):
+    """把服务池替换为一个返回固定流式输出的服务，记录请求参数"""
+    provider = LLMProvider("fake", "http://127.0.0.1:9/v1", "key", "model", response_format="off")
+    requests = []
+    reply = {"text": "", "finish_reason": "stop"}
+
+    def create(**kwargs):
+        requests.append(kwargs)
+        return _FakeStream(reply["text"], reply["finish_reason"])
+
+    monkeypatch.setattr(provider.client.chat.completions, "create", create)
+    monkeypatch.setattr(ai_travel_service, "providers", LLMProviderPool([provider]))
+    return provider, requests, reply
+
+
+async def _generate(days=2):
+    return await ai_travel_service.generate_travel_plan(
+        "成都", datetime(2025, 5, 1), datetime(2025, 5, days), 3000, 2, []
+    )
+
+
+async def test_complete_stream_is_ai_generated(fake_provider):
+    _, requests, reply = fake_provider
+    reply["text"] = json.dumps({"itinerary": [_day(1), _day(2)]}, ensure_ascii=False)
+
+    result = await _generate()
+
+    assert result["ai_generated"] is True
+    assert [d["day"] for d in result["itinerary"]] == [1, 2]
+    assert "response_format" not in requests[0]
+
+
+async def test_truncated_stream_falls_back_to_template(fake_provider):
+    _, _, reply = fake_provider
+    reply["text"] = json.dumps({"itinerary": [_day(1), _day(2)]}, ensure_ascii=False)[:-40]
+    reply["finish_reason"] = "length"
+
+    result = await _generate()
+
+    assert result["ai_generated"] is False
+    assert "截断" in result["error"]
+
+
+async def test_missing_days_fall_back_to_template(fake_provider):
+    _, _, reply = fake_provider
+    reply["text"] = json.dumps({"itinerary": [_day(1)]}, ensure_ascii=False)
+
+    result = await _generate(days=2)
+
+    assert result["ai_generated"] is False
+    assert len(result["itinerary"]) == 2
+
+
+@pytest.mark.parametrize("mode, expected", [("json_object", "json_object"), ("json_schema", "json_schema"), ("off", None)])
+async def test_response_format_is_per_provider(fake_provider, mode, expected):
+    provider, requests, reply = fake_provider
+    provider.response_format = mode
+    reply["text"] = json.dumps({"itinerary": [_day(1), _day(2)]}, ensure_ascii=False)
+
+    await _generate()
+
+    assert requests[0].get("response_format", {}).get("type") == expected
+
+
+def test_provider_config_reads_response_format(monkeypatch):
+    from app.services import llm_provider_service
+
+    monkeypatch.setattr(settings, "LLM_PROVIDERS", json.dumps([
+        {"name": "a", "base_url": "http://a/v1", "model": "m", "response_format": "json_schema"},
+        {"name": "b", "base_url": "http://b/v1", "model": "m"},
+    ]))
+
+    providers = llm_provider_service._load_providers()
+    assert [p.response_format for p in providers] == ["json_schema", "json_object"]
@@ -0,0 +1,94 @@
+import json
+import logging
+
+import pytest
+
+from app.core import logging_config
+from app.core.config import settings
+from app.core.logging_config import CallSiteRateLimitFilter, JsonFormatter, setup_logging, shutdown_logging
+
+
+def _record(lineno=10, level=logging.INFO, pathname="app/x.py", **extra):
+    record = logging.LogRecord("app", level, pathname, lineno, "msg %s", ("a",), None)
+    record.__dict__.update(extra)
+    return record
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(logging_config.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_rate_limit_is_per_call_site(clock):
+    limiter = CallSiteRateLimitFilter(limit=2, window=10)
+
+    assert [limiter.filter(_record()) for _ in range(3)] == [True, True, False]
+    assert limiter.filter(_record(lineno=11))
+    assert limiter.filter(_record(level=logging.WARNING))
+
+
+def test_suppressed_count_rides_on_next_record(clock):
+    limiter = CallSiteRateLimitFilter(limit=1, window=10)
+    limiter.filter(_record())
+    for _ in range(4):
+        limiter.filter(_record())
+
+    clock[0] += 10
+    record = _record()
+    assert limiter.filter(record)
+    assert record.suppressed == 4
+
+    clock[0] += 10
+    record = _record()
+    assert limiter.filter(record)
+    assert not hasattr(record, "suppressed")
+
+
+def test_zero_limit_disables_rate_limiting(clock):
+    limiter = CallSiteRateLimitFilter(limit=0, window=10)
+
+    assert all(limiter.filter(_record()) for _ in range(100))
+
+
+def test_json_formatter_carries_extra_fields():
+    entry = json.loads(JsonFormatter().format(_record(user_id=7)))
+
+    assert entry["message"] == "msg a"
+    assert entry["level"] == "INFO"
+    assert entry["user_id"] == 7
+
+
+@pytest.fixture
+def fresh_logging():
+    """停掉应用已启动的日志线程，用例结束后恢复"""
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    previous = logging_config._listener
+    if previous is not None:
+        previous.stop()
+    logging_config._listener = None
+    yield
+    shutdown_logging()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+    if previous is not None:
+        previous.start()
+    logging_config._listener = previous
+
+
+def test_shutdown_flushes_queued_records(fresh_logging, capsys, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_FORMAT", "json")
+    monkeypatch.setattr(settings, "LOG_SAMPLE_LIMIT", 0)
+    setup_logging()
+    setup_logging()  # 重复调用不重复配置
+
+    logger = logging.getLogger("app.test")
+    for i in range(200):
+        logger.warning(f"第 {i} 条")
+    shutdown_logging()
+
+    lines = capsys.readouterr().err.splitlines()
+    assert [json.loads(line)["message"] for line in lines] == [f"第 {i} 条" for i in range(200)]
+    shutdown_logging()  # 已停止时再次调用无副作用
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from app.api.deps import client_ip
+from app.core.config import settings
+from app.services import login_throttle_service
+from app.services.login_throttle_service import LoginThrottle, MemoryThrottleBackend, ThrottleBackend
+
+
+def _request(peer: str, **headers) -> Request:
+    return Request({
+        "type": "http",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+        "client": (peer, 50000),
+    })
+
+
+@pytest.fixture
+def behind_proxy(monkeypatch):
+    monkeypatch.setattr(settings, "TRUST_PROXY_HEADERS", True)
+    monkeypatch.setattr(settings, "TRUSTED_PROXIES", "127.0.0.1,::1,10.0.0.0/8")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(login_throttle_service.time, "time", lambda: now[0])
+    return now
+
+
+def _throttle(**overrides) -> LoginThrottle:
+    options = dict(window=60, max_ip_failures=3, max_email_failures=2, base_lockout=30, max_lockout=100)
+    options.update(overrides)
+    return LoginThrottle(MemoryThrottleBackend(1000), **options)
+
+
+def test_proxy_headers_ignored_by_default():
+    request = _request("203.0.113.5", x_real_ip="1.1.1.1", x_forwarded_for="1.1.1.1")
+
+    assert client_ip(request) == "203.0.113.5"
+
+
+def test_real_ip_from_trusted_proxy(behind_proxy):
+    request = _request("127.0.0.1", x_real_ip="198.51.100.7", x_forwarded_for="6.6.6.6, 198.51.100.7")
+
+    assert client_ip(request) == "198.51.100.7"
+
+
+def test_forwarded_for_uses_hop_added_by_proxy(behind_proxy):
+    request = _request("10.1.2.3", x_forwarded_for="6.6.6.6, 198.51.100.7")
+
+    assert client_ip(request) == "198.51.100.7"
+
+
+def test_headers_from_untrusted_peer_are_ignored(behind_proxy):
+    request = _request("203.0.113.5", x_real_ip="6.6.6.6", x_forwarded_for="6.6.6.6")
+
+    assert client_ip(request) == "203.0.113.5"
+
+
+async def test_loopback_ip_is_never_a_throttle_key(clock):
+    throttle = _throttle(max_ip_failures=1, max_email_failures=1)
+
+    await throttle.record_failure("127.0.0.1", "attacker@example.com")
+
+    assert await throttle.check("127.0.0.1", "victim@example.com") == 0
+    assert await throttle.check("127.0.0.1", "attacker@example.com") == 30
+
+
+async def test_lockout_doubles_and_caps(clock):
+    throttle = _throttle()
+    waits = []
+    for _ in range(4):
+        for _ in range(2):
+            await throttle.record_failure(None, "a@example.com")
+        waits.append(await throttle.check(None, "a@example.com"))
+        clock[0] += waits[-1]
+
+    assert waits == [30, 60, 100, 100]
+    assert throttle.lockouts == 4
+
+
+async def test_failures_outside_window_do_not_count(clock):
+    throttle = _throttle()
+
+    await throttle.record_failure("198.51.100.7", "a@example.com")
+    clock[0] += 61
+    await throttle.record_failure("198.51.100.7", "a@example.com")
+
+    assert await throttle.check("198.51.100.7", "a@example.com") == 0
+
+
+async def test_success_clears_email_but_not_ip(clock):
+    throttle = _throttle()
+    for _ in range(2):
+        await throttle.record_failure("198.51.100.7", "a@example.com")
+    await throttle.record_success("a@example.com")
+    await throttle.record_failure("198.51.100.7", "b@example.com")
+
+    assert await throttle.check(None, "a@example.com") == 0
+    assert await throttle.check("198.51.100.7", None) == 30
+
+
+async def test_concurrent_failures_are_all_counted(clock):
+    class SlowBackend(MemoryThrottleBackend):
+        """读写之间让出事件循环，模拟网络存储；update 仍须保证原子性"""
+
+        async def update(self, key, func):
+            await asyncio.sleep(0)
+            return await super().update(key, func)
+
+    throttle = LoginThrottle(SlowBackend(100), window=60, max_ip_failures=100,
+                             max_email_failures=5, base_lockout=30, max_lockout=100)
+
+    await asyncio.gather(*(throttle.record_failure(None, "a@example.com") for _ in range(5)))
+
+    assert await throttle.check(None, "a@example.com") == 30
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        ThrottleBackend()
@@ -0,0 +1,30 @@
+from app.core.config import settings
+from app.services.llm_usage_service import LLMUsageTracker
+
+
+def test_metrics_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "")
+
+    assert client.get("/metrics").status_code == 404
+
+
+def test_metrics_requires_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "s3cret")
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert "by_user" not in response.json()["llm"]
+    assert all("base_url" not in p for p in response.json()["llm_providers"])
+
+
+def test_usage_tracker_bounds_tracked_users():
+    tracker = LLMUsageTracker(max_users=3)
+    for user_id in range(10):
+        tracker.record("generate", user_id=user_id, completion_tokens=100)
+
+    snapshot = tracker.snapshot()
+    assert snapshot["tracked_users"] == 3
+    assert snapshot["by_endpoint"]["generate"]["calls"] == 10
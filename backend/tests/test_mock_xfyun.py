@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import importlib.util
+from pathlib import Path
+
+import pytest
+import websockets
+
+from app.core.config import settings
+from app.services.voice_recognition_service import VoiceRecognitionService
+
+
+@pytest.fixture(scope="module")
+def script():
+    spec = importlib.util.spec_from_file_location(
+        "mock_xfyun_server", Path(__file__).resolve().parent.parent / "scripts" / "mock_xfyun_server.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _args(**overrides):
+    options = dict(
+        transcripts=None, frame_latency=0.0, final_latency=0.0, chars_per_second=40.0, chunk_chars=2,
+        correction_rate=0.5, error_rate=0.0, max_sessions=0, api_secret="secret",
+    )
+    options.update(overrides)
+    return argparse.Namespace(**options)
+
+
+@pytest.fixture
+async def mock_server(script):
+    """在随机端口启动讯飞替身，返回启动函数；用例结束后关闭"""
+    servers = []
+
+    async def start(**overrides):
+        server = script.MockIATServer(_args(**overrides))
+        ws_server = await websockets.serve(server.handle, "127.0.0.1", 0, max_size=None)
+        servers.append(ws_server)
+        port = ws_server.sockets[0].getsockname()[1]
+        return server, f"ws://127.0.0.1:{port}/v2/iat"
+
+    yield start
+    for ws_server in servers:
+        ws_server.close()
+        await ws_server.wait_closed()
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(settings, "XFYUN_UPLOAD_SPEED", 0)
+    service = VoiceRecognitionService()
+    service.app_id, service.api_key, service.api_secret = "app", "key", "secret"
+    service.cache.ttl = 0
+
+    async def no_vad(pcm):
+        return pcm, None
+
+    monkeypatch.setattr(service, "apply_vad", no_vad)
+    return service
+
+
+async def _pcm():
+    return b"\x00\x00" * 16000 * 2
+
+
+async def test_client_transcribes_through_mock_server(service, mock_server, script):
+    server, service.base_url = await mock_server()
+
+    result = await service._recognize(_pcm, "zh_cn")
+
+    # wpgs 的 rpl 修正随机出现，拼接后的文本仍应等于剧本
+    assert result["success"], result["error"]
+    assert result["text"] == script.DEFAULT_TRANSCRIPTS[0]
+    assert server.total == 1
+
+
+async def test_mock_server_checks_signature(service, mock_server):
+    _, service.base_url = await mock_server(api_secret="other")
+
+    result = await service._recognize(_pcm, "zh_cn")
+
+    assert result["success"] is False
+    assert "code=10313" in result["error"]
+
+
+async def test_injected_engine_errors_fail_the_session(service, mock_server, monkeypatch, script):
+    monkeypatch.setattr(script.random, "random", lambda: 0.0)
+    monkeypatch.setattr(script.random, "randint", lambda a, b: 1)
+    _, service.base_url = await mock_server(error_rate=1.0)
+
+    result = await service._recognize(_pcm, "zh_cn")
+
+    assert result["success"] is False
+
+
+async def test_mock_server_session_limit(service, mock_server):
+    _, service.base_url = await mock_server(max_sessions=1, frame_latency=0.005)
+
+    results = await asyncio.gather(service._recognize(_pcm, "zh_cn"), service._recognize(_pcm, "zh_cn"))
+
+    assert sorted(r["success"] for r in results) == [False, True]
+    assert any("code=11202" in (r["error"] or "") for r in results)
@@ -0,0 +1,124 @@
+import pytest
+
+from app.core import security
+from app.core.config import settings
+from app.core.security import (
+    BCRYPT_DEFAULT_ROUNDS,
+    calibrate_bcrypt_rounds,
+    configure_password_hashing,
+    pwd_context,
+    verify_and_update_password,
+)
+
+
+def _rounds(hashed: str) -> int:
+    return int(hashed.split("$")[2])
+
+
+@pytest.fixture
+def configured_rounds(monkeypatch):
+    """修改 PASSWORD_HASH_ROUNDS 后重新配置，用例结束后恢复默认"""
+    def configure(rounds: int):
+        monkeypatch.setattr(settings, "PASSWORD_HASH_ROUNDS", rounds)
+        configure_password_hashing()
+
+    yield configure
+    monkeypatch.setattr(settings, "PASSWORD_HASH_ROUNDS", BCRYPT_DEFAULT_ROUNDS)
+    configure_password_hashing()
+
+
+def test_weaker_hash_is_upgraded_on_login():
+    old = pwd_context.hash("secret123", rounds=10)
+
+    verified, new_hash = verify_and_update_password("secret123", old)
+
+    assert verified
+    assert _rounds(new_hash) == BCRYPT_DEFAULT_ROUNDS
+
+
+def test_stronger_hash_is_not_downgraded():
+    strong = pwd_context.hash("secret123", rounds=BCRYPT_DEFAULT_ROUNDS + 1)
+
+    assert verify_and_update_password("secret123", strong) == (True, None)
+
+
+def test_configured_rounds_never_go_below_default(configured_rounds):
+    configured_rounds(8)
+
+    assert security.password_hasher.rounds == BCRYPT_DEFAULT_ROUNDS
+    assert _rounds(pwd_context.hash("secret123")) == BCRYPT_DEFAULT_ROUNDS
+
+
+def test_lowering_config_keeps_existing_hashes(configured_rounds):
+    configured_rounds(BCRYPT_DEFAULT_ROUNDS + 1)
+    strong = pwd_context.hash("secret123")
+    configured_rounds(BCRYPT_DEFAULT_ROUNDS)
+
+    assert verify_and_update_password("secret123", strong) == (True, None)
+
+
+def test_calibration_floor_is_default_rounds():
+    rounds, _ = calibrate_bcrypt_rounds(target_ms=1)
+
+    assert rounds == BCRYPT_DEFAULT_ROUNDS
+
+
+async def test_hasher_runs_on_dedicated_threads_and_rejects_when_full():
+    import asyncio
+    import threading
+
+    from app.core.security import PasswordHashBusyError, PasswordHasher
+
+    hasher = PasswordHasher(workers=1, max_queue=1)
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return threading.current_thread().name
+
+    running = [asyncio.ensure_future(hasher.run(slow)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+    assert hasher.snapshot()["active"] == 1 and hasher.snapshot()["queued"] == 1
+
+    with pytest.raises(PasswordHashBusyError) as exc:
+        await hasher.run(slow)
+    assert exc.value.retry_after >= 1
+    assert hasher.rejected == 1
+
+    release.set()
+    names = await asyncio.gather(*running)
+    assert all(name.startswith("password-hash") for name in names)
+    assert hasher.pending == 0 and hasher.completed == 2
+
+
+def _login(client, fake_db, monkeypatch, hashed):
+    user = {"id": 1, "email": "a@example.com", "username": "旅行者", "hashed_password": hashed,
+            "created_at": "2025-04-20T08:00:00+00:00", "updated_at": "2025-04-20T08:00:00+00:00"}
+    updates = []
+
+    async def get_user_by_email(email, with_password=False):
+        return dict(user)
+
+    async def update_user(user_id, data):
+        updates.append(data)
+        return {**user, **data}
+
+    monkeypatch.setattr(fake_db, "get_user_by_email", get_user_by_email)
+    monkeypatch.setattr(fake_db, "update_user", update_user)
+    response = client.post("/api/auth/login", json={"email": user["email"], "password": "secret123"})
+    assert response.status_code == 200
+    return updates
+
+
+def test_login_rehashes_weaker_hash(client, fake_db, monkeypatch):
+    updates = _login(client, fake_db, monkeypatch, pwd_context.hash("secret123", rounds=10))
+
+    [update] = [u for u in updates if "hashed_password" in u]
+    assert _rounds(update["hashed_password"]) == BCRYPT_DEFAULT_ROUNDS
+    assert pwd_context.verify("secret123", update["hashed_password"])
+
+
+def test_login_keeps_stronger_hash(client, fake_db, monkeypatch):
+    updates = _login(client, fake_db, monkeypatch, pwd_context.hash("secret123", rounds=BCRYPT_DEFAULT_ROUNDS + 1))
+
+    assert not any("hashed_password" in u for u in updates)
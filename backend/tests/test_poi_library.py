@@ -0,0 +1,77 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from app.services.poi_library_service import LAST_ATTRACTION_START, POILibraryService
+
+
+def _attraction(name, open_="08:00", close="18:00", hours=2, rating=4.0, tags=()):
+    return {"type": "attraction", "name": name, "open": open_, "close": close,
+            "duration_hours": hours, "cost": 50, "rating": rating, "tags": list(tags)}
+
+
+def _restaurant(name, rating=4.0, tags=()):
+    return {"type": "restaurant", "name": name, "cost": 80, "rating": rating, "tags": list(tags)}
+
+
+@pytest.fixture
+def library(tmp_path):
+    city = {
+        "aliases": ["测试市", "testcity"],
+        "attractions": [
+            _attraction("博物馆", tags=["文化"], rating=4.0),
+            _attraction("公园", rating=4.9),
+            _attraction("夜市", open_="17:00", close="23:00", rating=5.0),
+        ],
+        "restaurants": [_restaurant("面馆"), _restaurant("火锅", rating=4.8, tags=["美食"])],
+    }
+    (tmp_path / "测试.json").write_text(json.dumps(city, ensure_ascii=False), encoding="utf-8")
+    (tmp_path / "broken.json").write_text("{", encoding="utf-8")
+    return POILibraryService(tmp_path)
+
+
+def test_unknown_destination_has_no_draft(library):
+    assert library.build_draft_itinerary("火星", datetime(2025, 5, 1), 2) is None
+
+
+@pytest.mark.parametrize("destination", ["测试", "TestCity", "测试市人民公园"])
+def test_city_matches_aliases_and_containing_names(library, destination):
+    assert library.find_city(destination) == "测试"
+
+
+def test_draft_covers_every_day_with_ordered_slots(library):
+    itinerary = library.build_draft_itinerary("测试", datetime(2025, 5, 1), 3, people_count=2)
+
+    assert [d["day"] for d in itinerary] == [1, 2, 3]
+    assert [d["date"] for d in itinerary] == ["2025-05-01", "2025-05-02", "2025-05-03"]
+    for day in itinerary:
+        activities = day["activities"]
+        assert activities
+        for prev, cur in zip(activities, activities[1:]):
+            assert prev["end_time"] <= cur["start_time"]
+        assert day["total_cost"] == sum(a["cost"] for a in activities)
+
+
+def test_draft_respects_opening_hours_and_people(library):
+    itinerary = library.build_draft_itinerary("测试", datetime(2025, 5, 1), 2, people_count=3)
+
+    for activity in (a for day in itinerary for a in day["activities"]):
+        if activity["type"] == "attraction":
+            # 夜市 17:00 才开门，下午 16:00 之后不再安排景点
+            assert activity["name"] != "夜市"
+            assert activity["start_time"] < LAST_ATTRACTION_START
+            assert activity["cost"] == 150
+        else:
+            assert activity["cost"] == 240
+
+
+def test_draft_ranks_by_preferences_then_rating(library):
+    first_day = library.build_draft_itinerary("测试", datetime(2025, 5, 1), 1, preferences=["文化", "美食"])[0]
+    names = [a["name"] for a in first_day["activities"]]
+
+    assert names[0] == "博物馆"
+    assert names[1] == "火锅"
+
+    first_day = library.build_draft_itinerary("测试", datetime(2025, 5, 1), 1)[0]
+    assert first_day["activities"][0]["name"] == "公园"
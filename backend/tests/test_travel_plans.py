@@ -0,0 +1,213 @@
+from app.services.ai_travel_service import ai_travel_service
+from app.services.llm_provider_service import LLMProviderPool
+from app.services.llm_usage_service import MIN_MAX_TOKENS, LLMUsageTracker
+
+
+def test_regenerate_without_ai_service_returns_503(client, auth_headers, fake_db, plan, monkeypatch):
+    async def get_plan(plan_id, user_id):
+        return plan
+
+    monkeypatch.setattr(fake_db, "get_travel_plan_by_id", get_plan)
+    monkeypatch.setattr(ai_travel_service, "providers", LLMProviderPool([]))
+
+    response = client.post("/api/travel-plans/7/days/1/regenerate", headers=auth_headers)
+    assert response.status_code == 503
+
+    response = client.post("/api/travel-plans/7/days/1/activities/0/regenerate", headers=auth_headers)
+    assert response.status_code == 503
+
+
+def test_regenerate_unknown_day_returns_400(client, auth_headers, fake_db, plan, monkeypatch):
+    async def get_plan(plan_id, user_id):
+        return plan
+
+    monkeypatch.setattr(fake_db, "get_travel_plan_by_id", get_plan)
+
+    response = client.post("/api/travel-plans/7/days/9/regenerate", headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_suggest_max_tokens_scales_with_fractional_days():
+    tracker = LLMUsageTracker()
+    for _ in range(10):
+        tracker.record("generate", completion_tokens=4000, days=2)
+
+    assert tracker.suggest_max_tokens(1) > tracker.suggest_max_tokens(0.5) > MIN_MAX_TOKENS
+    assert tracker.suggest_max_tokens(0.1) == MIN_MAX_TOKENS
+
+
+class PlanStore:
+    """按乐观锁语义模拟 travel_plans 表"""
+
+    def __init__(self, plan):
+        self.plan = dict(plan)
+
+    async def get_travel_plan_by_id(self, plan_id, user_id):
+        return dict(self.plan)
+
+    async def update_travel_plan(self, plan_id, user_id, update_data, expected_version=None):
+        if expected_version is not None:
+            if self.plan["version"] != expected_version:
+                return None
+            update_data = {**update_data, "version": expected_version + 1}
+        self.plan.update({k: v for k, v in update_data.items() if v is not None})
+        return dict(self.plan)
+
+
+def _use_store(monkeypatch, fake_db, plan):
+    store = PlanStore({**plan, "version": 1, "refinement_status": "pending"})
+    monkeypatch.setattr(fake_db, "get_travel_plan_by_id", store.get_travel_plan_by_id)
+    monkeypatch.setattr(fake_db, "update_travel_plan", store.update_travel_plan)
+    return store
+
+
+def _refined_itinerary():
+    return [{"day": 1, "date": "2025-05-01", "activities": [], "total_cost": 0}]
+
+
+def _generate_request():
+    from app.schemas.travel_plan import TravelPlanGenerateRequest
+
+    return TravelPlanGenerateRequest(
+        destination="北京",
+        start_date="2025-05-01T00:00:00",
+        end_date="2025-05-02T00:00:00",
+        budget=1000,
+        people_count=2,
+        draft_first=True
+    )
+
+
+async def test_refinement_replaces_untouched_draft(fake_db, plan, monkeypatch):
+    from app.api.routes import travel_plans
+
+    store = _use_store(monkeypatch, fake_db, plan)
+
+    async def generate(**kwargs):
+        return {"ai_generated": True, "itinerary": _refined_itinerary(), "estimated_cost": 0}
+
+    monkeypatch.setattr(ai_travel_service, "generate_travel_plan", generate)
+    await travel_plans._refine_draft_plan(7, 1, 1, _generate_request())
+
+    assert store.plan["itinerary"] == _refined_itinerary()
+    assert store.plan["refinement_status"] == "done"
+    assert store.plan["version"] == 2
+
+
+async def test_refinement_keeps_user_edits_made_while_running(client, auth_headers, fake_db, plan, monkeypatch):
+    from app.api.routes import travel_plans
+
+    store = _use_store(monkeypatch, fake_db, plan)
+    new_day = {**plan["itinerary"][0], "activities": [], "total_cost": 0}
+
+    async def regenerate_day(plan, day, instructions=None, user_id=None):
+        return new_day
+
+    monkeypatch.setattr(ai_travel_service, "regenerate_day", regenerate_day)
+
+    # 用户在后台优化完成前重新生成了第 1 天
+    response = client.post("/api/travel-plans/7/days/1/regenerate", headers=auth_headers)
+    assert response.status_code == 200
+    user_itinerary = store.plan["itinerary"]
+
+    async def generate(**kwargs):
+        return {"ai_generated": True, "itinerary": _refined_itinerary(), "estimated_cost": 0}
+
+    monkeypatch.setattr(ai_travel_service, "generate_travel_plan", generate)
+    await travel_plans._refine_draft_plan(7, 1, 1, _generate_request())
+
+    assert store.plan["itinerary"] == user_itinerary
+    assert store.plan["refinement_status"] == "superseded"
+
+
+def test_regenerate_conflicts_with_refinement_finished_meanwhile(client, auth_headers, fake_db, plan, monkeypatch):
+    store = _use_store(monkeypatch, fake_db, plan)
+
+    async def regenerate_day(plan, day, instructions=None, user_id=None):
+        # 重新生成期间后台优化写入了新版本
+        store.plan.update(itinerary=_refined_itinerary(), version=2, refinement_status="done")
+        return {**plan["itinerary"][0], "activities": []}
+
+    monkeypatch.setattr(ai_travel_service, "regenerate_day", regenerate_day)
+
+    response = client.post("/api/travel-plans/7/days/1/regenerate", headers=auth_headers)
+    assert response.status_code == 409
+    assert store.plan["itinerary"] == _refined_itinerary()
+
+
+def _generate_payload(**overrides):
+    payload = {
+        "destination": "北京",
+        "start_date": "2025-05-01T00:00:00",
+        "end_date": "2025-05-02T00:00:00",
+        "budget": 1000,
+        "people_count": 2,
+    }
+    payload.update(overrides)
+    return payload
+
+
+def _use_create(monkeypatch, fake_db, plan):
+    """create_travel_plan 写入 PlanStore，后续更新按版本号生效"""
+    store = PlanStore({})
+
+    async def create_travel_plan(user_id, plan_data):
+        store.plan = {**plan, **plan_data, "id": 7, "user_id": user_id, "version": 1}
+        return dict(store.plan)
+
+    monkeypatch.setattr(fake_db, "create_travel_plan", create_travel_plan)
+    monkeypatch.setattr(fake_db, "update_travel_plan", store.update_travel_plan)
+    return store
+
+
+def test_generate_returns_draft_first_by_default(client, auth_headers, fake_db, plan, monkeypatch):
+    store = _use_create(monkeypatch, fake_db, plan)
+    calls = []
+
+    async def generate(**kwargs):
+        calls.append(kwargs)
+        return {"ai_generated": True, "itinerary": _refined_itinerary(), "estimated_cost": 0}
+
+    monkeypatch.setattr(ai_travel_service, "generate_travel_plan", generate)
+
+    response = client.post("/api/travel-plans/generate", json=_generate_payload(), headers=auth_headers)
+
+    assert response.status_code == 200
+    draft = response.json()["data"]
+    assert draft["refinement_status"] == "pending"
+    assert len(draft["itinerary"]) == 2
+    # TestClient 在返回前执行后台任务：AI 结果按草稿的版本号写回
+    assert len(calls) == 1
+    assert store.plan["itinerary"] == _refined_itinerary()
+    assert store.plan["refinement_status"] == "done"
+    assert store.plan["version"] == 2
+
+
+def test_generate_can_wait_for_ai(client, auth_headers, fake_db, plan, monkeypatch):
+    _use_create(monkeypatch, fake_db, plan)
+
+    async def generate(**kwargs):
+        return {"ai_generated": True, "itinerary": _refined_itinerary(), "estimated_cost": 0}
+
+    monkeypatch.setattr(ai_travel_service, "generate_travel_plan", generate)
+
+    response = client.post("/api/travel-plans/generate", json=_generate_payload(draft_first=False), headers=auth_headers)
+
+    assert response.json()["data"]["itinerary"] == _refined_itinerary()
+    assert response.json()["data"]["refinement_status"] is None
+
+
+async def test_failed_refinement_keeps_draft(fake_db, plan, monkeypatch):
+    from app.api.routes import travel_plans
+
+    store = _use_store(monkeypatch, fake_db, plan)
+
+    async def generate(**kwargs):
+        return {"ai_generated": False, "itinerary": _refined_itinerary(), "estimated_cost": 0}
+
+    monkeypatch.setattr(ai_travel_service, "generate_travel_plan", generate)
+    await travel_plans._refine_draft_plan(7, 1, 1, _generate_request())
+
+    assert store.plan["itinerary"] == plan["itinerary"]
+    assert store.plan["refinement_status"] == "failed"
+    assert store.plan["version"] == 1
@@ -0,0 +1,40 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.middleware import UploadSizeLimitMiddleware
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+
+    @app.post("/{path:path}")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    app.add_middleware(
+        UploadSizeLimitMiddleware,
+        limits=(("/api/voice/batch", 300), ("/api/voice/", 100)),
+    )
+    return TestClient(app)
+
+
+def test_first_matching_prefix_wins():
+    client = _client()
+
+    assert client.post("/api/voice/batch", content=b"x" * 200).json() == {"size": 200}
+    assert client.post("/api/voice/batch", content=b"x" * 400).status_code == 413
+    assert client.post("/api/voice/single", content=b"x" * 200).status_code == 413
+    assert client.post("/api/other", content=b"x" * 1000).json() == {"size": 1000}
+
+
+def test_batch_route_allows_several_clips(client):
+    size = settings.VOICE_MAX_UPLOAD_BYTES + 1024 * 1024
+    headers = {"Content-Length": str(size), "Content-Type": "multipart/form-data; boundary=x"}
+
+    single = client.post("/api/voice/recognize-expense", content=b"--x--\r\n", headers=headers)
+    batch = client.post("/api/voice/recognize-expense-batch", content=b"--x--\r\n", headers=headers)
+
+    assert single.status_code == 413
+    assert batch.status_code != 413
+
@@ -0,0 +1,82 @@
+import random
+import string
+
+from app.services.user_index_service import BloomFilter, UserIndex
+
+
+def _words(count: int, seed: int):
+    rng = random.Random(seed)
+    return ["".join(rng.choices(string.ascii_lowercase, k=12)) for _ in range(count)]
+
+
+def test_bloom_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    words = _words(1000, seed=1)
+    for word in words:
+        bloom.add(word)
+
+    assert all(word in bloom for word in words)
+    assert bloom.count == 1000
+
+
+def test_bloom_false_positive_rate_within_bound():
+    bloom = BloomFilter(1000, 0.01)
+    for word in _words(1000, seed=1):
+        bloom.add(word)
+
+    # 另一批随机串与已加入的不重叠，命中即为误判；留出统计波动余量
+    probes = _words(10000, seed=2)
+    false_positives = sum(word in bloom for word in probes)
+    assert false_positives / len(probes) < 0.02
+
+
+def test_bloom_sizing():
+    bloom = BloomFilter(1000, 0.01)
+
+    assert 9000 < bloom.size < 10000
+    assert bloom.hash_count == 7
+
+
+def test_index_not_ready_treats_everything_as_taken():
+    index = UserIndex(100, 0.01)
+
+    assert index.probably_taken("email", "new@example.com")
+
+
+def test_index_normalizes_and_separates_columns():
+    index = UserIndex(100, 0.01)
+    index.ready = True
+    index.add(email="Alice@Example.com ", username="Alice")
+
+    assert index.probably_taken("email", "alice@example.com")
+    assert index.probably_taken("username", " ALICE")
+    assert not index.probably_taken("email", "bob@example.com")
+    assert index.snapshot()["emails"] == 1
+
+
+async def test_definite_miss_skips_database(fake_db, monkeypatch):
+    index = UserIndex(100, 0.01)
+    index.ready = True
+    index.add(email="taken@example.com")
+
+    async def user_exists(column, value):
+        return value == "taken@example.com"
+
+    monkeypatch.setattr(fake_db, "user_exists", user_exists)
+
+    assert await index.is_available("email", "free@example.com")
+    assert not await index.is_available("email", "taken@example.com")
+    assert index.definite_misses == 1
+    assert index.db_lookups == 1
+
+
+def test_availability_answers_usernames_only(client, fake_db, monkeypatch):
+    async def user_exists(column, value):
+        return True
+
+    monkeypatch.setattr(fake_db, "user_exists", user_exists)
+
+    response = client.get("/api/auth/availability", params={"username": "旅行者"})
+    assert response.json()["data"] == {"username": False}
+
+    assert client.get("/api/auth/availability", params={"email": "a@example.com"}).status_code == 400
@@ -0,0 +1,262 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import re
+import time
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.services.voice_recognition_service import VoiceRecognitionService
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = VoiceRecognitionService()
+    service.app_id, service.api_key, service.api_secret = "app", "key", "secret"
+    service.cache.ttl = 0
+
+    async def no_vad(pcm):
+        return pcm, {}
+
+    monkeypatch.setattr(service, "apply_vad", no_vad)
+    return service
+
+
+def _hang(service, monkeypatch):
+    """让识别会话一直等待，直到被取消"""
+    cancelled = asyncio.Event()
+
+    async def run_session(pcm, language, speed=1.0):
+        try:
+            await asyncio.sleep(3600)
+        finally:
+            cancelled.set()
+
+    monkeypatch.setattr(service, "_run_session", run_session)
+    return cancelled
+
+
+async def _pcm():
+    return b"\x00\x00" * 16000
+
+
+def test_create_url_signs_configured_host(service):
+    service.base_url = "ws://127.0.0.1:8765/v2/iat"
+    query = parse_qs(urlparse(service.create_url()).query)
+
+    assert query["host"] == ["127.0.0.1:8765"]
+    authorization = base64.b64decode(query["authorization"][0]).decode()
+    signature = re.search(r'signature="([^"]+)"', authorization).group(1)
+    origin = f"host: 127.0.0.1:8765\ndate: {query['date'][0]}\nGET /v2/iat HTTP/1.1"
+    expected = base64.b64encode(hmac.new(b"secret", origin.encode(), hashlib.sha256).digest()).decode()
+    assert signature == expected
+
+
+async def test_client_disconnect_returns_error_result(service, monkeypatch):
+    session_cancelled = _hang(service, monkeypatch)
+
+    async def disconnected():
+        return True
+
+    result = await service._recognize(_pcm, "zh_cn", disconnected)
+
+    assert result["success"] is False
+    assert result["error"] == "客户端已断开"
+    assert session_cancelled.is_set()
+
+
+async def test_outer_cancellation_propagates(service, monkeypatch):
+    session_cancelled = _hang(service, monkeypatch)
+
+    task = asyncio.ensure_future(service._recognize(_pcm, "zh_cn"))
+    await asyncio.sleep(0.05)
+    task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(0)
+    assert session_cancelled.is_set()
+
+
+async def test_stream_receive_gives_up_after_max_duration(service, monkeypatch):
+    from app.core.config import settings
+    from app.services.voice_recognition_service import StreamingRecognitionSession
+
+    class SilentServer:
+        async def recv(self):
+            await asyncio.sleep(3600)
+
+    monkeypatch.setattr(settings, "XFYUN_RECV_TIMEOUT", 0.05)
+    monkeypatch.setattr(settings, "VOICE_MAX_DURATION", 0.1)
+    session = StreamingRecognitionSession(service, "zh_cn")
+    session._ws = SilentServer()
+    session._started = time.monotonic()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(session._receive(), timeout=2)
+    assert session._updates.get_nowait() == ("error", "语音识别超时")
+
+
+def test_recognition_cache_hit_miss_and_eviction(monkeypatch):
+    from app.services.voice_recognition_service import RecognitionCache
+
+    cache = RecognitionCache(ttl=10, max_entries=2)
+    a, b, c = (RecognitionCache.make_key(pcm, "zh_cn") for pcm in (b"a", b"b", b"c"))
+    assert a != RecognitionCache.make_key(b"a", "en_us")
+
+    assert cache.get(a) is None
+    cache.put(a, {"text": "a"})
+    cache.put(b, {"text": "b"})
+    assert cache.get(a) == {"text": "a"}
+
+    # a 刚被访问过，写入 c 时淘汰最久未用的 b
+    cache.put(c, {"text": "c"})
+    assert cache.get(b) is None
+    assert cache.get(c) == {"text": "c"}
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get(a) is None
+    assert cache.snapshot()["entries"] == 1
+
+
+async def test_batch_result_fields_do_not_leak_into_cache(service, monkeypatch):
+    service.cache.ttl = 60
+
+    async def run_session(pcm, language, speed=1.0):
+        return "午饭50元"
+
+    async def read_pcm(fileobj, audio_format):
+        return b"\x00\x00" * 16000
+
+    monkeypatch.setattr(service, "_run_session", run_session)
+    monkeypatch.setattr(service, "read_pcm", read_pcm)
+
+    [batch] = await service.recognize_batch([(None, "audio/L16;rate=16000")])
+    assert batch["clip"] == 0
+    batch["text"] = "被调用方改掉"
+
+    result = await service._recognize(_pcm, "zh_cn")
+    assert result["cached"] is True
+    assert result["text"] == "午饭50元"
+    assert "clip" not in result
+
+
+class _FakeClock:
+    """替换 FramePacer 使用的事件循环时间和 sleep，记录每次等待"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def get_event_loop(self):
+        return self
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    from types import SimpleNamespace
+
+    from app.services import voice_recognition_service as module
+
+    clock = _FakeClock()
+    monkeypatch.setattr(module, "asyncio", SimpleNamespace(get_event_loop=clock.get_event_loop, sleep=clock.sleep))
+    return clock
+
+
+async def test_pacer_follows_absolute_schedule(clock):
+    from app.services.voice_recognition_service import FramePacer
+
+    pacer = FramePacer(0.04, speed=2)
+    await pacer.wait(0)
+    for index in range(1, 5):
+        clock.now += 0.005  # 模拟发送耗时，不应累积到后续帧
+        await pacer.wait(index)
+
+    assert clock.sleeps == pytest.approx([0.015] * 4)
+    assert clock.now == pytest.approx(100 + 4 * 0.02)
+
+
+async def test_pacer_skips_wait_when_behind(clock):
+    from app.services.voice_recognition_service import FramePacer
+
+    pacer = FramePacer(0.04, speed=1)
+    await pacer.wait(0)
+    clock.now += 0.2
+
+    await pacer.wait(3)
+    assert clock.sleeps == []
+    await pacer.wait(6)
+    assert clock.sleeps == pytest.approx([0.04])
+
+
+async def test_unpaced_upload_only_yields(clock):
+    from app.services.voice_recognition_service import FramePacer
+
+    pacer = FramePacer(0.04, speed=0)
+    for index in range(3):
+        await pacer.wait(index)
+
+    assert clock.sleeps == [0, 0, 0]
+    assert clock.now == 100.0
+
+
+async def test_session_limiter_admits_up_to_capacity_then_queues():
+    from app.services.voice_recognition_service import SessionLimiter
+
+    limiter = SessionLimiter(max_sessions=2, max_queue=1, queue_timeout=5)
+    await limiter.acquire()
+    await limiter.acquire()
+
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.queued == 1 and not waiter.done()
+
+    limiter.release(2.0)
+    await asyncio.wait_for(waiter, 1)
+    assert limiter.snapshot()["active"] == 2
+    assert limiter.admitted == 3
+
+
+async def test_session_limiter_rejects_when_queue_full():
+    from app.services.voice_recognition_service import ASRBusyError, SessionLimiter
+
+    limiter = SessionLimiter(max_sessions=1, max_queue=1, queue_timeout=5)
+    await limiter.acquire()
+    limiter.release(4.0)
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+
+    with pytest.raises(ASRBusyError) as exc:
+        await limiter.acquire()
+    # 平均会话 4 秒，前面已有 1 人排队
+    assert exc.value.retry_after == 8
+    assert limiter.rejected == 1
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter.queued == 0
+
+
+async def test_session_limiter_queue_timeout():
+    from app.services.voice_recognition_service import ASRBusyError, SessionLimiter
+
+    limiter = SessionLimiter(max_sessions=1, max_queue=5, queue_timeout=0.05)
+    await limiter.acquire()
+
+    with pytest.raises(ASRBusyError, match="超时"):
+        await limiter.acquire()
+    assert limiter.timed_out == 1
+    assert limiter.queued == 0
@@ -0,0 +1,150 @@
+import asyncio
+import io
+import json
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.services.voice_recognition_service import voice_recognition_service
+
+
+class FakeSession:
+    """记录收到的音频，finish() 后返回固定的最终结果"""
+
+    def __init__(self):
+        self.audio = bytearray()
+        self.finished = False
+        self.exited = False
+
+    async def __aenter__(self):
+        self._updates = asyncio.Queue()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.exited = True
+
+    async def send_audio(self, pcm):
+        self.audio.extend(pcm)
+
+    async def finish(self):
+        self.finished = True
+        self._updates.put_nowait(("final", "午饭花了50元"))
+
+    async def updates(self):
+        while True:
+            kind, text = await self._updates.get()
+            yield kind, text
+            if kind != "partial":
+                return
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(voice_recognition_service, "app_id", "app")
+    monkeypatch.setattr(voice_recognition_service, "api_key", "key")
+    monkeypatch.setattr(voice_recognition_service, "api_secret", "secret")
+    monkeypatch.setattr(voice_recognition_service, "open_stream", lambda language: session)
+    return session
+
+
+def _auth(ws):
+    ws.send_text(json.dumps({"token": create_access_token(1)}))
+
+
+def _webm(seconds: float) -> bytes:
+    av = pytest.importorskip("av")
+    buffer = io.BytesIO()
+    container = av.open(buffer, "w", format="webm")
+    stream = container.add_stream("libopus", rate=48000)
+    t = np.arange(int(seconds * 48000)) / 48000
+    signal = (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    for i in range(0, len(signal), 960):
+        frame = av.AudioFrame.from_ndarray(signal[i:i + 960][None, :], format="flt", layout="mono")
+        frame.sample_rate = 48000
+        for packet in stream.encode(frame):
+            container.mux(packet)
+    for packet in stream.encode(None):
+        container.mux(packet)
+    container.close()
+    return buffer.getvalue()
+
+
+def test_stream_requires_token(client, session):
+    with client.websocket_connect("/api/voice/stream") as ws:
+        ws.send_text(json.dumps({"token": "invalid"}))
+        assert ws.receive_json() == {"type": "error", "message": "无效的访问令牌"}
+        assert ws.receive()["code"] == 1008
+    assert not session.exited
+
+
+def test_stream_pcm(client, session):
+    with client.websocket_connect("/api/voice/stream?mode=expense") as ws:
+        _auth(ws)
+        ws.send_bytes(b"\x01\x00" * 800)
+        ws.send_text("end")
+        result = ws.receive_json()
+        assert ws.receive()["type"] == "websocket.close"
+
+    assert result["type"] == "final"
+    assert result["intent"]["amount"] == 50
+    assert len(session.audio) == 1600
+    assert session.exited
+
+
+def test_stream_decodes_webm_opus(client, session):
+    data = _webm(1.0)
+    with client.websocket_connect("/api/voice/stream?format=webm") as ws:
+        _auth(ws)
+        for i in range(0, len(data), 1000):
+            ws.send_bytes(data[i:i + 1000])
+        ws.send_text("end")
+        assert ws.receive_json()["type"] == "final"
+
+    assert session.finished
+    # 1 秒 16kHz 16bit 单声道 PCM，编码器首尾填充允许少量误差
+    assert abs(len(session.audio) - 32000) < 3200
+
+
+def test_stream_upload_limit_releases_session(client, session, monkeypatch):
+    monkeypatch.setattr(settings, "VOICE_MAX_UPLOAD_BYTES", 1000)
+    with client.websocket_connect("/api/voice/stream") as ws:
+        _auth(ws)
+        ws.send_bytes(b"\x00" * 1200)
+        assert "音频数据过大" in ws.receive_json()["message"]
+        assert ws.receive()["code"] == 1008
+    assert session.exited
+    assert not session.finished
+
+
+def test_stream_idle_timeout_releases_session(client, session, monkeypatch):
+    monkeypatch.setattr(settings, "VOICE_STREAM_IDLE_TIMEOUT", 0.1)
+    with client.websocket_connect("/api/voice/stream") as ws:
+        _auth(ws)
+        assert ws.receive_json()["message"] == "长时间未收到音频"
+        assert ws.receive()["code"] == 1008
+    assert session.exited
+
+
+async def test_decoder_uses_dedicated_bounded_pool(monkeypatch):
+    import threading
+
+    from app.services import voice_recognition_service as module
+
+    threads = []
+
+    def decode(chunks):
+        threads.append(threading.current_thread().name)
+        for chunk in chunks:
+            yield chunk
+
+    monkeypatch.setattr(module, "decode_compressed_chunks", decode)
+    decoder = module.CompressedStreamDecoder()
+    decoder.feed(b"\x00\x00")
+    decoder.close()
+
+    assert [pcm async for pcm in decoder.pcm()] == [b"\x00\x00"]
+    assert threads[0].startswith("stream-decode")
+    assert module.CompressedStreamDecoder._executor._max_workers == max(settings.XFYUN_MAX_SESSIONS, 1)
@@ -4,5 +4,7 @@
 service nginx start
 
 # 启动后端服务
+# nginx 在本机反向代理 /api，按它写入的 X-Real-IP 识别客户端（登录限流按 IP 计数）
+export TRUST_PROXY_HEADERS=${TRUST_PROXY_HEADERS:-true}
 cd /app/backend
 exec uvicorn main:app --host 0.0.0.0 --port 8000
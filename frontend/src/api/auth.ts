@@ -12,11 +12,27 @@ export const authApi = {
     return api.post('/auth/register', data)
   },
 
+  // 检查用户名是否可用
+  checkUsernameAvailability: (username: string): Promise<ApiResponse<{ username: boolean }>> => {
+    return api.get('/auth/availability', { params: { username } })
+  },
+
   // 获取当前用户信息
   getCurrentUser: (): Promise<ApiResponse<User>> => {
     return api.get('/auth/me')
   },
 
+  // 上传头像
+  uploadAvatar: (file: File): Promise<ApiResponse<User>> => {
+    const formData = new FormData()
+    formData.append('file', file)
+    return api.post('/auth/avatar', formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data'
+      }
+    })
+  },
+
   // 刷新token
   refreshToken: (): Promise<ApiResponse<{ token: string }>> => {
     return api.post('/auth/refresh')
@@ -11,6 +11,11 @@ export const expenseApi = {
     return api.post('/expenses', data)
   },
 
+  // 批量创建费用记录（如语音批量记账确认后一次写入）
+  createExpensesBatch: (expenses: Omit<Expense, 'id' | 'created_at'>[]): Promise<ApiResponse<Expense[]>> => {
+    return api.post('/expenses/batch', { expenses })
+  },
+
   // 获取指定行程的费用记录
   getExpensesByTravelPlan: (
     travelPlanId: number, 
@@ -30,11 +30,35 @@ export interface ExpenseRecognitionResult {
   }
 }
 
+export interface ExpenseBatchItem {
+  clip: number
+  start_ms: number
+  end_ms: number
+  text: string
+  expense: ExpenseRecognitionResult['expense'] | null
+  error: string | null
+  retry_after: number | null
+}
+
+export interface ExpenseBatchResult {
+  items: ExpenseBatchItem[]
+}
+
+// 根据录音的 MIME 类型生成文件名，服务端按文件头和类型解码 WebM/Opus、OGG 等格式
+const audioFilename = (audioBlob: Blob): string => {
+  const type = audioBlob.type || ''
+  if (type.includes('webm')) return 'recording.webm'
+  if (type.includes('ogg')) return 'recording.ogg'
+  if (type.includes('mp4')) return 'recording.m4a'
+  if (type.includes('mpeg')) return 'recording.mp3'
+  return 'recording.wav'
+}
+
 export const voiceApi = {
   // 语音识别（行程规划）
   recognizeAudio: (audioBlob: Blob, language: string = 'zh_cn'): Promise<ApiResponse<VoiceRecognitionResult>> => {
     const formData = new FormData()
-    formData.append('audio', audioBlob, 'recording.wav')
+    formData.append('audio', audioBlob, audioFilename(audioBlob))
     formData.append('language', language)
     
     return api.post('/voice/recognize', formData, {
@@ -48,7 +72,7 @@ export const voiceApi = {
   // 费用记录语音识别
   recognizeExpense: (audioBlob: Blob, language: string = 'zh_cn'): Promise<ApiResponse<ExpenseRecognitionResult>> => {
     const formData = new FormData()
-    formData.append('audio', audioBlob, 'recording.wav')
+    formData.append('audio', audioBlob, audioFilename(audioBlob))
     formData.append('language', language)
     
     return api.post('/voice/recognize-expense', formData, {
@@ -59,6 +83,27 @@ export const voiceApi = {
     })
   },
 
+  // 批量语音记账：多段录音，或一段长录音按停顿切分（split）
+  // 只返回识别结果，用户确认后通过 expenseApi.createExpensesBatch 保存
+  recognizeExpenseBatch: (
+    audioBlobs: Blob[],
+    options: { split?: boolean; language?: string } = {}
+  ): Promise<ApiResponse<ExpenseBatchResult>> => {
+    const formData = new FormData()
+    audioBlobs.forEach((blob) => formData.append('audios', blob, audioFilename(blob)))
+    
+    return api.post('/voice/recognize-expense-batch', formData, {
+      params: {
+        language: options.language || 'zh_cn',
+        split: options.split || false
+      },
+      headers: {
+        'Content-Type': 'multipart/form-data'
+      },
+      timeout: 120000
+    })
+  },
+
   // 解析旅行意图
   parseIntent: (text: string): Promise<ApiResponse<any>> => {
     return api.post('/voice/parse-intent', null, {
@@ -35,6 +35,10 @@ export interface TravelPlan {
   itinerary: DayItinerary[]
   total_cost: number
   status: 'draft' | 'published' | 'completed'
+  // 版本号，每次修改加 1
+  version: number
+  // 后台 AI 优化状态，pending 时需要轮询刷新
+  refinement_status?: 'pending' | 'done' | 'failed' | 'superseded' | null
   created_at: string
   updated_at: string
 }
@@ -94,6 +98,8 @@ export interface TravelPlanRequest {
   people_count: number
   preferences: string[]
   special_requirements?: string
+  // 先返回本地景点库生成的草稿，AI 优化结果在后台写回（默认开启）
+  draft_first?: boolean
 }
 
 // API响应类型